@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import create_engine, engine_from_config, pool
 import sys
 import os
 from logging.config import fileConfig
@@ -47,6 +47,15 @@ def get_url() -> str:
     return config.get_main_option("sqlalchemy.url")
 
 
+def get_shard_urls() -> list[str]:
+    """
+    Extra calculation shards (see app/db/sharding.py). They hold only the
+    calculation tables, so they are brought up to date with
+    app.db.schema.prepare_shard rather than the migration chain.
+    """
+    return [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+
+
 def run_migrations_offline() -> None:
     """Run migrations in offline mode."""
     url = get_url()
@@ -62,7 +71,7 @@ def run_migrations_offline() -> None:
 
 
 def run_migrations_online() -> None:
-    """Run migrations in online mode."""
+    """Run migrations in online mode on the primary, then prepare every shard."""
     configuration = config.get_section(config.config_ini_section, {}) or {}
     configuration["sqlalchemy.url"] = get_url()
 
@@ -81,6 +90,11 @@ def run_migrations_online() -> None:
         with context.begin_transaction():
             context.run_migrations()
 
+    from app.db.schema import prepare_shard
+
+    for shard, url in enumerate(get_shard_urls(), start=1):
+        prepare_shard(create_engine(url, poolclass=pool.NullPool), shard)
+
 
 if context.is_offline_mode():
     run_migrations_offline()
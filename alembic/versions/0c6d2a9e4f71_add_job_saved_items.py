@@ -0,0 +1,27 @@
+"""add job saved items
+
+Revision ID: 0c6d2a9e4f71
+Revises: f17a2c9d5e30
+Create Date: 2026-10-19 21:14:08.306517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6d2a9e4f71'
+down_revision: Union[str, None] = 'f17a2c9d5e30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('saved_items', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('saved_items')
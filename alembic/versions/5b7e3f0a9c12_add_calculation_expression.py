@@ -0,0 +1,30 @@
+"""add calculation expression
+
+Revision ID: 5b7e3f0a9c12
+Revises: 8c41d2e6a913
+Create Date: 2026-10-19 13:05:27.640218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e3f0a9c12'
+down_revision: Union[str, None] = '8c41d2e6a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('calculations', sa.Column('expression', sa.String(length=1000), nullable=True))
+    op.add_column('calculations_archive', sa.Column('expression', sa.String(length=1000), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('calculations_archive') as batch_op:
+        batch_op.drop_column('expression')
+    with op.batch_alter_table('calculations') as batch_op:
+        batch_op.drop_column('expression')
@@ -0,0 +1,51 @@
+"""add calculation archive
+
+Revision ID: 8c41d2e6a913
+Revises: 3f2a9c1d7b40
+Create Date: 2026-10-19 11:37:05.208114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d2e6a913'
+down_revision: Union[str, None] = '3f2a9c1d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('calculations_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=20), nullable=False),
+    sa.Column('operand_a', sa.Float(), nullable=False),
+    sa.Column('operand_b', sa.Float(), nullable=False),
+    sa.Column('result', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_calculations_archive_user_created', 'calculations_archive', ['user_id', 'created_at'], unique=False)
+    op.create_table('calculation_archive_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum_a', sa.Float(), nullable=False),
+    sa.Column('sum_b', sa.Float(), nullable=False),
+    sa.Column('sum_result', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'operation')
+    )
+    op.create_index(op.f('ix_calculations_created_at'), 'calculations', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_calculations_created_at'), table_name='calculations')
+    op.drop_table('calculation_archive_rollups')
+    op.drop_index('ix_calculations_archive_user_created', table_name='calculations_archive')
+    op.drop_table('calculations_archive')
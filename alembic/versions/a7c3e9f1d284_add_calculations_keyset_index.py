@@ -0,0 +1,25 @@
+"""add calculations keyset index
+
+Revision ID: a7c3e9f1d284
+Revises: d41a7c58e2b6
+Create Date: 2026-10-19 16:12:48.201937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f1d284'
+down_revision: Union[str, None] = 'd41a7c58e2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_calculations_user_created_id', 'calculations', ['user_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_calculations_user_created_id', table_name='calculations')
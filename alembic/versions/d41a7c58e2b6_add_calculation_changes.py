@@ -0,0 +1,38 @@
+"""add calculation changes
+
+Revision ID: d41a7c58e2b6
+Revises: 5b7e3f0a9c12
+Create Date: 2026-10-19 16:41:12.903155
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7c58e2b6'
+down_revision: Union[str, None] = '5b7e3f0a9c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('calculation_changes',
+    sa.Column('seq', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('calculation_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=6), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_calculation_changes_user_seq', 'calculation_changes', ['user_id', 'seq'], unique=False)
+    op.create_index(op.f('ix_calculation_changes_changed_at'), 'calculation_changes', ['changed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_calculation_changes_changed_at'), table_name='calculation_changes')
+    op.drop_index('ix_calculation_changes_user_seq', table_name='calculation_changes')
+    op.drop_table('calculation_changes')
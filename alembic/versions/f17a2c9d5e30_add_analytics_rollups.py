@@ -0,0 +1,46 @@
+"""add analytics rollups
+
+Revision ID: f17a2c9d5e30
+Revises: b62f0d4e8a17
+Create Date: 2026-10-19 19:05:42.881204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f17a2c9d5e30'
+down_revision: Union[str, None] = 'b62f0d4e8a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analytics_daily_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.String(length=20), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('sum_result', sa.Float(), nullable=False),
+        sa.Column('sum_sq_result', sa.Float(), nullable=False),
+        sa.Column('min_result', sa.Float(), nullable=True),
+        sa.Column('max_result', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('day', 'user_id', 'operation'),
+    )
+    op.create_table(
+        'analytics_result_histogram',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('operation', sa.String(length=20), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'operation', 'bucket'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('analytics_result_histogram')
+    op.drop_table('analytics_daily_rollups')
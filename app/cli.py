@@ -0,0 +1,255 @@
+"""Command line maintenance tools.
+
+Usage::
+
+    python -m app.cli snapshot --out snapshots/ [--format parquet|arrow] [--full] [--database-url URL]
+    python -m app.cli shard-pin
+    python -m app.cli shard-move --user-id 42 --to 2
+    python -m app.cli archive [--days 90]
+    python -m app.cli static-build
+    python -m app.cli recompute [--fix] [--workers 8] [--checkpoint recompute.json]
+    python -m app.cli import history.csv [--user-id 42] [--rejects rejects.jsonl]
+    python -m app.cli analytics-rollup [--since 2024-01-01]
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+from sqlalchemy import create_engine
+
+
+def cmd_snapshot(args: argparse.Namespace) -> int:
+    from app.db import shard_map
+    from app.services.snapshot_service import export_snapshot
+
+    stats = export_snapshot(
+        [create_engine(args.database_url)] if args.database_url else shard_map.engines,
+        args.out,
+        fmt=args.format,
+        chunk_size=args.chunk_size,
+        buckets=args.buckets,
+        full=args.full,
+    )
+    print(json.dumps(stats))
+    return 0
+
+
+def cmd_shard_pin(args: argparse.Namespace) -> int:
+    from app.db import shard_map
+    from app.services.shard_rebalance import pin_all_users
+
+    print(json.dumps({"pinned": pin_all_users(shard_map)}))
+    return 0
+
+
+def cmd_shard_move(args: argparse.Namespace) -> int:
+    from app.db import shard_map
+    from app.services.shard_rebalance import move_user
+
+    stats = move_user(
+        shard_map,
+        args.user_id,
+        args.to,
+        chunk_size=args.chunk_size,
+        settle_seconds=args.settle_seconds,
+        log=lambda msg: print(msg, file=sys.stderr),
+    )
+    print(json.dumps(stats))
+    return 0
+
+
+def cmd_archive(args: argparse.Namespace) -> int:
+    from app.db import shard_map
+    from app.services.archive_service import archive_cutoff, archive_old_calculations
+
+    cutoff = archive_cutoff(days=args.days) if args.days is not None else archive_cutoff()
+    if cutoff is None:
+        print("Archival is disabled: set ARCHIVE_AFTER_DAYS or pass --days", file=sys.stderr)
+        return 1
+    moved = archive_old_calculations(
+        shard_map.sessionmakers, cutoff, batch_size=args.batch_size, pause=args.pause
+    )
+    print(json.dumps({"archived": moved, "cutoff": cutoff.isoformat()}))
+    return 0
+
+
+def cmd_changes_prune(args: argparse.Namespace) -> int:
+    from datetime import datetime, timedelta
+
+    from app.db import shard_map
+    from app.services.change_log import prune_changes
+
+    before = datetime.utcnow() - timedelta(days=args.days)
+    pruned = 0
+    for factory in shard_map.sessionmakers:
+        db = factory()
+        try:
+            pruned += prune_changes(db, before)
+        finally:
+            db.close()
+    print(json.dumps({"pruned": pruned, "before": before.isoformat()}))
+    return 0
+
+
+def cmd_tokens_prune(args: argparse.Namespace) -> int:
+    from app.db import SessionLocal
+    from app.services.refresh_tokens import prune_refresh_tokens
+    from app.services.token_revocation import revocations
+
+    db = SessionLocal()
+    try:
+        refresh = prune_refresh_tokens(db)
+    finally:
+        db.close()
+    print(json.dumps({"refresh_tokens": refresh, "revoked_tokens": revocations.prune()}))
+    return 0
+
+
+def cmd_static_build(args: argparse.Namespace) -> int:
+    from app.services.static_assets import AssetManifest
+
+    manifest = AssetManifest(args.directory).build(precompress_assets=True)
+    print(json.dumps({"assets": manifest.fingerprinted, "precompressed": sorted(manifest.encoded)}))
+    return 0
+
+
+def cmd_recompute(args: argparse.Namespace) -> int:
+    from app.db import shard_map
+    from app.services.recompute_service import recompute_calculations
+
+    if args.restart and args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    report = open(args.report, "a") if args.report else None
+    try:
+        stats = recompute_calculations(
+            shard_map.sessionmakers,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            fix=args.fix,
+            checkpoint=args.checkpoint,
+            max_rows_per_second=args.max_rows_per_second,
+            report=report,
+            log=lambda msg: print(msg, file=sys.stderr),
+        )
+    finally:
+        if report is not None:
+            report.close()
+    print(json.dumps(stats))
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    from app.db import shard_map
+    from app.services.import_service import detect_format, import_calculations
+
+    fmt = args.format or detect_format(args.file)
+    source = sys.stdin if args.file == "-" else open(args.file, newline="")
+    rejects = open(args.rejects, "w") if args.rejects else None
+    try:
+        stats = import_calculations(
+            source,
+            fmt,
+            shard_map,
+            default_user_id=args.user_id,
+            batch_size=args.batch_size,
+            transaction_rows=args.transaction_rows,
+            rejects=rejects,
+            log=lambda msg: print(msg, file=sys.stderr),
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if rejects is not None:
+            rejects.close()
+    print(json.dumps(stats))
+    return 0 if not stats["rejected"] else 2
+
+
+def cmd_analytics_rollup(args: argparse.Namespace) -> int:
+    from datetime import date
+
+    from app.db import SessionLocal, shard_map
+    from app.services.analytics import refresh_rollups
+
+    since = date.fromisoformat(args.since) if args.since else None
+    print(json.dumps({"days": refresh_rollups(shard_map.sessionmakers, SessionLocal, since=since)}))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    snap = sub.add_parser("snapshot", help="export every shard's calculations to Parquet/Arrow files")
+    snap.add_argument("--out", required=True, help="output directory")
+    snap.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    snap.add_argument("--chunk-size", type=int, default=50_000)
+    snap.add_argument("--buckets", type=int, default=16, help="number of user hash partitions")
+    snap.add_argument("--full", action="store_true", help="ignore the watermark and export everything")
+    snap.add_argument("--database-url", help="export this database alone instead of the app's shards")
+    snap.set_defaults(func=cmd_snapshot)
+
+    pin = sub.add_parser("shard-pin", help="pin every user to their current hash shard")
+    pin.set_defaults(func=cmd_shard_pin)
+
+    move = sub.add_parser("shard-move", help="move a user's calculations to another shard online")
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--to", type=int, required=True, help="target shard index")
+    move.add_argument("--chunk-size", type=int, default=1000)
+    move.add_argument("--settle-seconds", type=float, default=None,
+                      help="wait after re-routing before the catch-up pass (default: directory TTL + 1s)")
+    move.set_defaults(func=cmd_shard_move)
+
+    arch = sub.add_parser("archive", help="move calculations older than the retention window to the archive")
+    arch.add_argument("--days", type=int, default=None, help="defaults to $ARCHIVE_AFTER_DAYS")
+    arch.add_argument("--batch-size", type=int, default=1000)
+    arch.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between batches")
+    arch.set_defaults(func=cmd_archive)
+
+    prune = sub.add_parser("changes-prune", help="drop change-log entries older than --days (stale clients resync)")
+    prune.add_argument("--days", type=int, default=30)
+    prune.set_defaults(func=cmd_changes_prune)
+
+    tokens = sub.add_parser("tokens-prune", help="delete expired refresh tokens and revocations")
+    tokens.set_defaults(func=cmd_tokens_prune)
+
+    static = sub.add_parser("static-build", help="fingerprint static files and write .gz/.br siblings")
+    static.add_argument("--directory", default="app/static")
+    static.set_defaults(func=cmd_static_build)
+
+    rec = sub.add_parser("recompute", help="recompute stored results and report (or fix) mismatches")
+    rec.add_argument("--fix", action="store_true", help="correct mismatched results in place")
+    rec.add_argument("--chunk-size", type=int, default=10_000)
+    rec.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="recompute processes")
+    rec.add_argument("--checkpoint", default=None,
+                     help="progress file; an interrupted run resumes from it, a finished run deletes it")
+    rec.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    rec.add_argument("--max-rows-per-second", type=float, default=0, help="throttle the scan (0 = unlimited)")
+    rec.add_argument("--report", help="append one JSON line per mismatch to this file")
+    rec.set_defaults(func=cmd_recompute)
+
+    imp = sub.add_parser("import", help="bulk-load calculations from a CSV or JSON Lines file")
+    imp.add_argument("file", help="input file, or - for stdin")
+    imp.add_argument("--format", choices=["csv", "jsonl"], default=None, help="default: from the file extension")
+    imp.add_argument("--user-id", type=int, default=None, help="owner for records without a user_id")
+    imp.add_argument("--batch-size", type=int, default=5000, help="records validated and inserted together")
+    imp.add_argument("--transaction-rows", type=int, default=100_000, help="rows per committed transaction")
+    imp.add_argument("--rejects", help="write rejected records here as JSON lines")
+    imp.set_defaults(func=cmd_import)
+
+    rollup = sub.add_parser("analytics-rollup", help="rebuild the daily rollups behind /admin/analytics")
+    rollup.add_argument("--since", help="first day to rebuild (YYYY-MM-DD); default: where the last pass stopped")
+    rollup.set_defaults(func=cmd_analytics_rollup)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,23 +4,7 @@ from app.models.calculation import Calculation
 from app.schemas.calculation import CalculationCreate, CalculationUpdate
 from typing import List, Optional
 from sqlalchemy.exc import NoResultFound
-
-def compute_result(operation: str, a: float, b: float) -> float:
-    # Normalize if an Enum member was passed
-    if hasattr(operation, 'value'):
-        operation = operation.value
-
-    if operation == "add":
-        return a + b
-    if operation == "sub":
-        return a - b
-    if operation == "mul":
-        return a * b
-    if operation == "div":
-        if b == 0:
-            raise ValueError("Division by zero")
-        return a / b
-    raise ValueError("Unknown operation")
+from app.services.calculation_math import compute_result
 
 def create_calculation(db: Session, user_id: int, obj_in: CalculationCreate) -> Calculation:
     # Support both old schema (operation, operand_a, operand_b) and new (type, a, b)
@@ -36,13 +20,15 @@ def create_calculation(db: Session, user_id: int, obj_in: CalculationCreate) ->
         a = getattr(obj_in, 'a', None)
         b = getattr(obj_in, 'b', None)
 
-    result = compute_result(op, a, b)
+    expression = getattr(obj_in, 'expression', None)
+    result = compute_result(op, a, b, expression)
     db_obj = Calculation(
         user_id=user_id,
         operation=op,
         operand_a=a,
         operand_b=b,
-        result=result
+        result=result,
+        expression=expression
     )
     db.add(db_obj)
     db.commit()
@@ -66,7 +52,7 @@ def update_calculation(db: Session, id: int, user_id: int, obj_in: CalculationUp
     if obj_in.operand_b is not None:
         db_obj.operand_b = obj_in.operand_b
     # recompute result
-    db_obj.result = compute_result(db_obj.operation, db_obj.operand_a, db_obj.operand_b)
+    db_obj.result = compute_result(db_obj.operation, db_obj.operand_a, db_obj.operand_b, db_obj.expression)
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
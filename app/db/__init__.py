@@ -1,10 +1,22 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.models.base_class import Base
+from app.db.routing import read_router, track_writes
+from app.db.sharding import ShardMap
+from app.services import change_log
 
 engine = create_engine("sqlite:///./test.db", connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Keep users on the primary for a moment after they write (see app/db/routing.py)
+track_writes(SessionLocal)
+
+# Every session logs calculation changes for GET /calculations/changes
+change_log.install()
+
+# user_id -> calculation shard; a single shard (the primary) unless configured
+shard_map = ShardMap.from_env(engine, SessionLocal)
+
 def get_db():
     db = SessionLocal()
     try:
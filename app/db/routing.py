@@ -0,0 +1,101 @@
+"""Read-replica routing.
+
+Set ``DATABASE_REPLICA_URLS`` to a comma separated list of replica URLs
+(for local testing a second SQLite file or a Postgres hot standby) and
+read-only endpoints will run their queries on a replica, picked round-robin.
+
+Writes always use the primary. After a user commits a write their reads stay
+on the primary for ``READ_STICKINESS_SECONDS`` so they always see their own
+changes despite replication lag. Stickiness is tracked per worker process.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.calculation import Calculation
+
+REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+READ_STICKINESS_SECONDS = float(os.getenv("READ_STICKINESS_SECONDS", "5"))
+
+
+def connect_args_for(url: str) -> dict:
+    # SQLite connections are shared across FastAPI's threadpool
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+
+class ReadRouter:
+    """Decide per user whether a read may go to a replica."""
+
+    def __init__(self, replica_engines: Iterable[Engine] = (), stickiness: float = READ_STICKINESS_SECONDS):
+        self._replicas = [
+            sessionmaker(autocommit=False, autoflush=False, bind=e) for e in replica_engines
+        ]
+        self._cycle = itertools.cycle(range(len(self._replicas))) if self._replicas else None
+        self.stickiness = stickiness
+        self._lock = threading.Lock()
+        # user_id -> monotonic time until which reads stay on the primary,
+        # kept in expiry order so stale entries are dropped from the front.
+        self._sticky: "OrderedDict[int, float]" = OrderedDict()
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self._replicas)
+
+    def note_write(self, user_id: int) -> None:
+        if not self._replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._sticky.pop(user_id, None)
+            self._sticky[user_id] = now + self.stickiness
+            while self._sticky:
+                oldest, until = next(iter(self._sticky.items()))
+                if until > now:
+                    break
+                del self._sticky[oldest]
+
+    def is_sticky(self, user_id: int) -> bool:
+        with self._lock:
+            until = self._sticky.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def replica_session(self, user_id: Optional[int]) -> Optional[Session]:
+        """A replica session for this user's reads, or None to use the primary."""
+        if not self._replicas or (user_id is not None and self.is_sticky(user_id)):
+            return None
+        with self._lock:
+            index = next(self._cycle)
+        return self._replicas[index]()
+
+
+read_router = ReadRouter(
+    create_engine(url, connect_args=connect_args_for(url), pool_pre_ping=True)
+    for url in REPLICA_URLS
+)
+
+
+def track_writes(session_factory) -> None:
+    """Mark users whose calculations were written through ``session_factory``."""
+
+    @event.listens_for(session_factory, "after_flush")
+    def _collect(session, flush_context):
+        users = session.info.setdefault("written_user_ids", set())
+        for obj in itertools.chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, Calculation) and obj.user_id is not None:
+                users.add(obj.user_id)
+
+    @event.listens_for(session_factory, "after_commit")
+    def _mark(session):
+        for user_id in session.info.pop("written_user_ids", ()):
+            read_router.note_write(user_id)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _discard(session):
+        session.info.pop("written_user_ids", None)
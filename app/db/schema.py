@@ -0,0 +1,109 @@
+"""Bring a database created by an older version of the app up to the models.
+
+The app builds its schema with ``create_all`` at startup, which only creates
+missing tables. A database created before a column or index was added to an
+existing table (the checked-in test.db, a dev database) would then fail on
+the first query that touches it. ``upgrade_schema`` also adds:
+
+- every missing nullable column (``ALTER TABLE ... ADD COLUMN``);
+- every missing index.
+
+Anything else, such as a new NOT NULL column or a changed type, needs its
+alembic migration (``alembic upgrade head``), and startup stops with an
+error naming the column.
+
+``prepare_shard`` builds a secondary calculation shard the same way, from
+``shard_metadata``.
+"""
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.engine import Engine
+
+from app.db.sharding import SHARD_ID_RANGE, SHARD_TABLES
+from app.models.base_class import Base
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema(
+    engine: Engine,
+    metadata: MetaData = Base.metadata,
+    tables: Optional[Sequence[Table]] = None,
+) -> None:
+    """Create missing tables, then add missing nullable columns and indexes."""
+    metadata.create_all(bind=engine, tables=tables)
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in tables if tables is not None else metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(
+                        f"{table.name}.{column.name} is missing and NOT NULL: run `alembic upgrade head`"
+                    )
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                    f"{preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+                ))
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(bind=conn)
+
+
+def shard_metadata(metadata: MetaData = Base.metadata) -> MetaData:
+    """The ``SHARD_TABLES`` as a secondary shard holds them.
+
+    ``users`` lives on the primary only, so the copies drop their foreign
+    keys to it. SQLite copies use AUTOINCREMENT so their id range can be set.
+    """
+    shard = MetaData()
+    for name in SHARD_TABLES:
+        table = metadata.tables[name].to_metadata(shard)
+        for constraint in list(table.foreign_key_constraints):
+            table.constraints.discard(constraint)
+            for element in constraint.elements:
+                element.parent.foreign_keys.discard(element)
+                table.foreign_keys.discard(element)
+        table.dialect_options["sqlite"]["autoincrement"] = True
+    return shard
+
+
+def reserve_id_range(engine: Engine, shard: int) -> None:
+    """Make shard ``shard`` allocate calculation ids from ``shard * SHARD_ID_RANGE`` up."""
+    start = shard * SHARD_ID_RANGE
+    if start == 0:
+        return
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            ddl = conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'calculations'"
+            )).scalar() or ""
+            if "AUTOINCREMENT" not in ddl.upper():
+                logger.warning("Shard %d's calculations table predates id ranges; recreate it", shard)
+                return
+            seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'calculations'")).scalar()
+            if seq is None:
+                conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('calculations', :s)"),
+                             {"s": start})
+            elif seq < start:
+                conn.execute(text("UPDATE sqlite_sequence SET seq = :s WHERE name = 'calculations'"),
+                             {"s": start})
+        elif engine.dialect.name == "postgresql":
+            sequence = conn.execute(text("SELECT pg_get_serial_sequence('calculations', 'id')")).scalar()
+            last = conn.execute(text(f"SELECT last_value FROM {sequence}")).scalar()
+            if last < start:
+                conn.execute(text("SELECT setval(:seq, :s)"), {"seq": sequence, "s": start})
+        else:  # pragma: no cover - other dialects are not supported as shards
+            raise RuntimeError(f"Cannot reserve an id range on {engine.dialect.name}")
+
+
+def prepare_shard(engine: Engine, shard: int) -> None:
+    """Create or upgrade a secondary shard's calculation tables and reserve its id range."""
+    upgrade_schema(engine, shard_metadata())
+    reserve_id_range(engine, shard)
@@ -0,0 +1,137 @@
+"""Horizontal sharding of calculation storage by ``user_id``.
+
+Shard 0 is always the primary database (``app.db.engine``), which also holds
+``users`` and the ``shard_directory`` table. ``DATABASE_SHARD_URLS`` adds more
+shards, e.g. ``sqlite:///./shard1.db,sqlite:///./shard2.db``.
+
+Secondary shards hold only the calculation tables (``SHARD_TABLES``),
+without a foreign key to ``users``, and allocate calculation ids from their
+own range (``SHARD_ID_RANGE``); see ``app.db.schema.prepare_shard``.
+
+A user's calculations live on the shard named by their ``shard_directory``
+row if there is one, otherwise on ``crc32(user_id) % shard_count``. Because
+the hash depends on the shard count, pin existing users
+(``python -m app.cli shard-pin``) before adding shards, then move users with
+``python -m app.cli shard-move``.
+
+Each worker caches the directory and refreshes it every
+``SHARD_DIRECTORY_TTL`` seconds with one incremental query.
+"""
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.routing import connect_args_for
+from app.models.shard_directory import ShardAssignment
+
+SHARD_URLS = [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+SHARD_DIRECTORY_TTL = float(os.getenv("SHARD_DIRECTORY_TTL", "5"))
+
+# Tables every shard holds; users and everything else stay on the primary
+SHARD_TABLES = ("calculations", "calculations_archive", "calculation_archive_rollups", "calculation_changes")
+# Shard N allocates new calculation ids from N * SHARD_ID_RANGE up, so ids are
+# unique across shards and a moved user's calculations keep theirs
+SHARD_ID_RANGE = 2 ** 40
+
+
+class ShardMap:
+    """Resolve a ``user_id`` to the engine that stores their calculations."""
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        directory_session: Callable[[], Session],
+        directory_ttl: float = SHARD_DIRECTORY_TTL,
+    ):
+        self.engines = engines
+        self.sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=e) for e in engines
+        ]
+        self.directory_session = directory_session
+        self.directory_ttl = directory_ttl
+        self._directory: Dict[int, int] = {}
+        self._directory_seen: Optional[datetime] = None
+        self._directory_checked = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, primary: Engine, primary_sessionmaker: sessionmaker) -> "ShardMap":
+        engines = [primary] + [
+            create_engine(url, connect_args=connect_args_for(url)) for url in SHARD_URLS
+        ]
+        shard_map = cls(engines, primary_sessionmaker)
+        # Shard 0 shares the primary's sessionmaker (and its event listeners)
+        shard_map.sessionmakers[0] = primary_sessionmaker
+        return shard_map
+
+    @property
+    def count(self) -> int:
+        return len(self.engines)
+
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1
+
+    def hash_shard(self, user_id: int) -> int:
+        return zlib.crc32(str(user_id).encode()) % self.count
+
+    def shard_for(self, user_id: int) -> int:
+        if not self.sharded:
+            return 0
+        self._refresh_directory()
+        shard = self._directory.get(user_id)
+        return shard if shard is not None else self.hash_shard(user_id)
+
+    def pinned_shard(self, user_id: int) -> Optional[int]:
+        """The directory entry for a user, if any (as of the last refresh)."""
+        return self._directory.get(user_id)
+
+    def session_for(self, user_id: int) -> Session:
+        return self.sessionmakers[self.shard_for(user_id)]()
+
+    def assign(self, user_id: int, shard: int) -> None:
+        """Persist a directory entry and apply it to this worker immediately."""
+        if not 0 <= shard < self.count:
+            raise ValueError(f"No shard {shard}; configured shards: 0..{self.count - 1}")
+        db = self.directory_session()
+        try:
+            row = db.get(ShardAssignment, user_id)
+            if row is None:
+                db.add(ShardAssignment(user_id=user_id, shard=shard))
+            else:
+                row.shard = shard
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._directory[user_id] = shard
+
+    def _refresh_directory(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._directory_checked < self.directory_ttl:
+            return
+        with self._lock:
+            if not force and now - self._directory_checked < self.directory_ttl:
+                return
+            self._directory_checked = now
+            db = self.directory_session()
+            try:
+                query = db.query(ShardAssignment.user_id, ShardAssignment.shard, ShardAssignment.updated_at)
+                if self._directory_seen is not None:
+                    query = query.filter(ShardAssignment.updated_at >= self._directory_seen)
+                for user_id, shard, updated_at in query:
+                    self._directory[user_id] = shard
+                    if updated_at and (self._directory_seen is None or updated_at > self._directory_seen):
+                        self._directory_seen = updated_at
+            finally:
+                db.close()
+
+    def reload_directory(self) -> None:
+        self._refresh_directory(force=True)
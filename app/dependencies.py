@@ -1,24 +1,25 @@
 # app/dependencies.py
+import hmac
+import os
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 
-from app.db import get_db
+from app.db import get_db, read_router, shard_map
 from app.models.user import User
 from app.auth import SECRET_KEY, ALGORITHM
+from app.services.token_revocation import revocations
 
+# Comma-separated emails of the operators allowed on /admin
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+# Bearer token a metrics scraper presents on GET /metrics; unset, only admins may read it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
-def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db),
-):
-    """
-    Resolve the current user from either:
-    - Authorization: Bearer <token> header (used by integration tests)
-    - access_token cookie (set by the /login form flow)
 
-    Raises 401 if no valid token is found.
-    """
+def token_from_request(request: Request) -> Optional[str]:
+    """The access token from the Authorization header, else the access_token cookie."""
     token = None
 
     # 1. Try Authorization header
@@ -35,6 +36,21 @@ def get_current_user(
             else:
                 token = cookie_val.strip()
 
+    return token
+
+
+def get_current_user(
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    Resolve the current user from either:
+    - Authorization: Bearer <token> header (used by integration tests)
+    - access_token cookie (set by the /login form flow)
+
+    Raises 401 if no valid token is found.
+    """
+    token = token_from_request(request)
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -58,6 +74,15 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Logged-out tokens; a valid token is answered from memory
+    jti = payload.get("jti")
+    if jti is not None and revocations.is_revoked(jti):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     user = db.query(User).filter(User.email == email).first()
     if user is None:
         raise HTTPException(
@@ -67,3 +92,64 @@ def get_current_user(
         )
 
     return user
+
+
+def get_admin_user(current_user: User = Depends(get_current_user)):
+    """The current user, who must be listed in ``ADMIN_EMAILS``; 403 otherwise."""
+    if (current_user.email or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
+def require_metrics_access(request: Request, db: Session = Depends(get_db)) -> None:
+    """Let a scraper with ``METRICS_TOKEN``, or an admin, read ``/metrics``; 401/403 otherwise."""
+    token = token_from_request(request)
+    if METRICS_TOKEN and token is not None and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    get_admin_user(get_current_user(request, db))
+
+
+def get_shard_db(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Session on the shard that stores the current user's calculations.
+
+    Without sharding (or for users on shard 0) this is the request's primary
+    session.
+    """
+    shard = shard_map.shard_for(current_user.user_id)
+    if shard == 0:
+        yield db
+        return
+    shard_db = shard_map.sessionmakers[shard]()
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+def get_read_db(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Session for read-only endpoints.
+
+    Users on a secondary shard read from that shard. Otherwise a read
+    replica is used when one is configured and the user has not written
+    recently, falling back to the request's primary session.
+    """
+    shard = shard_map.shard_for(current_user.user_id)
+    if shard != 0:
+        session = shard_map.sessionmakers[shard]()
+    else:
+        session = read_router.replica_session(current_user.user_id)
+    if session is None:
+        yield db
+        return
+    try:
+        yield session
+    finally:
+        session.close()
@@ -1,24 +1,46 @@
 # app/main.py
-from fastapi import FastAPI, Request, Form
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import Depends, FastAPI, Request, Form
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from sqlalchemy.orm import Session
 
-from app.db import engine, SessionLocal
-from app.models.base_class import Base
+from app.db import engine, SessionLocal, shard_map
+from app.db.schema import prepare_shard, upgrade_schema
 from app.routers.users import router as users_api_router
-from app.routers.auth import router as auth_router
+from app.routers.auth import router as auth_router, expired_session_redirect, set_auth_cookies
 from app.routers.calculations import router as calculations_router
 from app.routers.reports import router as reports_router
+from app.routers.jobs import router as jobs_router
+from app.routers.admin import router as admin_router
+from app.routers.diagnostics import router as diagnostics_router
 from app.models.user import User
-from app.auth import hash_password, authenticate_user, create_access_token
+from app.auth import hash_password, authenticate_user
+from app.dependencies import require_metrics_access
+from app.services.refresh_tokens import issue_tokens
+from app.services.ingest_queue import ingest_queue
+from app.services.archive_service import ArchiveWorker
+from app.services.analytics import AnalyticsWorker
+from app.services.token_revocation import revocations
+from app.services.jobs import job_runner
+from app.services.live_updates import live_updates
+from app.services.metrics import metrics
+from app.services.single_flight import single_flight
+from app.services import warmup
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.memory_accounting import MemoryAccountingMiddleware
+from app.services.static_assets import FingerprintedStaticFiles, static_assets
+from app.templating import StreamingTemplateResponse, templates
 
 # -----------------------------
 # Create the database tables automatically
 # -----------------------------
-Base.metadata.create_all(bind=engine)
+# Also adds columns and indexes that older databases are missing
+upgrade_schema(engine)
+for shard, shard_engine in enumerate(shard_map.engines[1:], start=1):
+    prepare_shard(shard_engine, shard)
 
 # -----------------------------
 # Initialize FastAPI app
@@ -26,22 +48,53 @@ Base.metadata.create_all(bind=engine)
 app = FastAPI()
 
 # -----------------------------
-# Mount Static Files
+# Middleware
 # -----------------------------
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Innermost, so it files each request under the route that served it
+app.add_middleware(MemoryAccountingMiddleware)
+app.add_middleware(RateLimitMiddleware)
+# Added last so it wraps everything, including 429s and static files
+app.add_middleware(CompressionMiddleware)
+
+# Push committed calculation changes to /calculations/stream subscribers
+live_updates.install()
+# Requests arriving after a user's write never share a computation started before it
+single_flight.install()
+
+# Moves calculations past the retention window to the archive (off unless configured)
+archive_worker = ArchiveWorker(lambda: shard_map.sessionmakers)
+# Keeps the system-wide daily rollups behind /admin/analytics up to date
+analytics_worker = AnalyticsWorker(lambda: shard_map.sessionmakers, SessionLocal)
 
 # -----------------------------
-# Setup Templates
+# Mount Static Files
 # -----------------------------
-templates = Jinja2Templates(directory="app/templates")
+# Fingerprints (and precompresses) everything under app/static once at startup;
+# templates link assets through static_url() so they can be cached for a year
+static_assets.build()
+app.mount("/static", FingerprintedStaticFiles(manifest=static_assets), name="static")
 
 # -----------------------------
 # Include Routers
 # -----------------------------
 app.include_router(auth_router)
 app.include_router(users_api_router)
-app.include_router(calculations_router)
+# reports_router goes first so /calculations/history is not captured by /calculations/{calc_id}
 app.include_router(reports_router)
+app.include_router(calculations_router)
+app.include_router(jobs_router)
+app.include_router(admin_router)
+app.include_router(diagnostics_router)
+
+
+@app.exception_handler(StarletteHTTPException)
+async def refresh_expired_sessions(request: Request, exc: StarletteHTTPException):
+    """Send a browser whose access cookie expired through /auth/refresh instead of a bare 401."""
+    if exc.status_code == 401:
+        redirect = expired_session_redirect(request)
+        if redirect is not None:
+            return redirect
+    return await http_exception_handler(request, exc)
 
 
 @app.on_event("startup")
@@ -69,6 +122,60 @@ def seed_default_user():
         db.close()
 
 
+@app.on_event("startup")
+def start_archive_worker():
+    archive_worker.start()
+    analytics_worker.start()
+
+
+@app.on_event("startup")
+def start_revocation_sync():
+    """Load the token deny-list and follow revocations made by other workers."""
+    revocations.start()
+
+
+@app.on_event("startup")
+def start_job_runner():
+    """Run queued /jobs in the local process pool; jobs orphaned by a crash are requeued."""
+    job_runner.start()
+
+
+@app.on_event("startup")
+def warm_up():
+    """Compile templates, fill the pool and run the hot paths once, off the startup path."""
+    warmup.state.start()
+
+
+@app.on_event("shutdown")
+def drain_ingest_queue():
+    """
+    Commit any calculations still waiting in the ingestion queue.
+    """
+    ingest_queue.stop()
+    archive_worker.stop()
+    analytics_worker.stop()
+    revocations.stop()
+    job_runner.stop()
+    warmup.state.stop()
+
+
+@app.get("/ready")
+def readiness():
+    """Readiness probe: 503 until this worker's background warmup has finished."""
+    return JSONResponse(warmup.state.as_dict(), status_code=200 if warmup.state.ready else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+def metrics_endpoint():
+    """
+    Process metrics in the Prometheus text format.
+
+    They describe the deployment (queues, caches, per-route memory), so only
+    a scraper holding ``METRICS_TOKEN`` or an admin may read them.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # -----------------------------
 # Auth UI routes for E2E tests
 # -----------------------------
@@ -95,26 +202,22 @@ def login_submit(
     db: Session = SessionLocal()
     try:
         user = authenticate_user(db, username=username, password=password)
+        if not user:
+            # Stay on login with error if credentials invalid
+            return templates.TemplateResponse(
+                "login.html",
+                {"request": request, "error": "Invalid email or password"},
+                status_code=400,
+            )
+
+        # Short-lived JWT plus a refresh token, both in cookies; /auth/refresh
+        # renews the pair without going through Argon2 again
+        tokens = issue_tokens(db, user)
     finally:
         db.close()
 
-    if not user:
-        # Stay on login with error if credentials invalid
-        return templates.TemplateResponse(
-            "login.html",
-            {"request": request, "error": "Invalid email or password"},
-            status_code=400,
-        )
-
-    # Create JWT and store it in a cookie
-    token = create_access_token({"sub": user.email})
     response = RedirectResponse(url="/calculations", status_code=303)
-    response.set_cookie(
-        key="access_token",
-        value=f"Bearer {token}",
-        httponly=True,
-        samesite="lax",
-    )
+    set_auth_cookies(response, tokens)
     return response
 
 
@@ -169,9 +272,8 @@ def report_page_root(request: Request):
         "op_counts": {},
         "recent": [],
     }
-    return templates.TemplateResponse(
-        "calculations/report.html",
-        {"request": request, "report": dummy_report},
+    return StreamingTemplateResponse(
+        request, "calculations/report.html", {"load_report": lambda: dummy_report}
     )
 
 
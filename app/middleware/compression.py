@@ -0,0 +1,255 @@
+"""Response compression with gzip, brotli and zstd.
+
+The encoding is negotiated from ``Accept-Encoding`` (honouring q-values),
+preferring brotli, then zstd, then gzip among the codecs installed; gzip is
+always available, brotli and zstd need the ``brotli`` / ``zstandard``
+packages.
+
+- Bodies smaller than ``COMPRESSION_MIN_SIZE`` bytes are sent as they are.
+- Responses that already carry a ``Content-Encoding`` (e.g. precompressed
+  static files) or have an incompressible media type are passed through.
+- Streaming responses are compressed chunk by chunk, flushing after each
+  chunk so the client can start rendering before the stream ends.
+- Bodies of ``COMPRESSION_THREAD_THRESHOLD`` bytes or more are compressed
+  in a worker thread to keep the event loop free.
+
+Levels: ``COMPRESSION_GZIP_LEVEL`` (6), ``COMPRESSION_BROTLI_QUALITY`` (4),
+``COMPRESSION_ZSTD_LEVEL`` (3).
+"""
+import gzip
+import os
+import zlib
+from typing import Dict, List, Optional
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+COMPRESSION_THREAD_THRESHOLD = int(os.getenv("COMPRESSION_THREAD_THRESHOLD", str(256 * 1024)))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+INCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+INCOMPRESSIBLE_TYPES = frozenset({
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/octet-stream",
+    "application/vnd.apache.parquet",
+    "application/vnd.apache.arrow.file",
+    "text/event-stream",  # server-sent events must never be buffered
+})
+
+
+class GzipCodec:
+    name = "gzip"
+
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self) -> "_Stream":
+        obj = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return _Stream(
+            lambda d: obj.compress(d) + obj.flush(zlib.Z_SYNC_FLUSH),
+            lambda: obj.flush(zlib.Z_FINISH),
+        )
+
+
+class BrotliCodec:
+    name = "br"
+
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.quality = quality
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.quality)
+
+    def stream(self) -> "_Stream":
+        obj = brotli.Compressor(quality=self.quality)
+        return _Stream(lambda d: obj.process(d) + obj.flush(), obj.finish)
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int = COMPRESSION_ZSTD_LEVEL):
+        self.level = level
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def stream(self) -> "_Stream":
+        obj = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return _Stream(
+            lambda d: obj.compress(d) + obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            obj.flush,
+        )
+
+
+class _Stream:
+    def __init__(self, chunk, finish):
+        self.chunk = chunk
+        self.finish = finish
+
+
+def available_codecs() -> List[object]:
+    """Installed codecs in server preference order."""
+    codecs: List[object] = []
+    if brotli is not None:
+        codecs.append(BrotliCodec())
+    if zstandard is not None:
+        codecs.append(ZstdCodec())
+    codecs.append(GzipCodec())
+    return codecs
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """``"gzip;q=0.5, br"`` -> ``{"gzip": 0.5, "br": 1.0}``."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def choose_codec(header: str, codecs: List[object]) -> Optional[object]:
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for codec in codecs:
+        q = accepted.get(codec.name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = codec, q
+    return best
+
+
+def _compressible(headers: Dict[bytes, bytes]) -> bool:
+    if b"content-encoding" in headers:
+        return False
+    media_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+    if media_type in INCOMPRESSIBLE_TYPES or media_type.startswith(INCOMPRESSIBLE_PREFIXES):
+        return False
+    return True
+
+
+def _with_encoding(raw_headers, codec, length: Optional[int]):
+    headers = [
+        (k, v) for k, v in raw_headers
+        if k.lower() not in (b"content-length", b"content-encoding")
+    ]
+    headers.append((b"content-encoding", codec.name.encode()))
+    if length is not None:
+        headers.append((b"content-length", str(length).encode()))
+    vary = [v for k, v in headers if k.lower() == b"vary"]
+    if not any(b"accept-encoding" in v.lower() for v in vary):
+        headers.append((b"vary", b"Accept-Encoding"))
+    return headers
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        thread_threshold: int = COMPRESSION_THREAD_THRESHOLD,
+        codecs: Optional[List[object]] = None,
+        enabled: bool = COMPRESSION_ENABLED,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_threshold = thread_threshold
+        self.codecs = codecs if codecs is not None else available_codecs()
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        codec = choose_codec(headers.get(b"accept-encoding", b"").decode("latin-1"), self.codecs)
+        if codec is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, codec, self))
+
+
+class _CompressingSend:
+    """Wraps ``send`` for one response, deciding on the first body message."""
+
+    def __init__(self, send, codec, middleware: CompressionMiddleware):
+        self.send = send
+        self.codec = codec
+        self.mw = middleware
+        self.start = None
+        self.passthrough = False
+        self.stream = None
+
+    async def __call__(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            self.passthrough = not _compressible(dict(
+                (k.lower(), v) for k, v in message.get("headers", [])
+            ))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+
+        if self.stream is not None:
+            data = self.stream.chunk(body) if body else b""
+            if not more:
+                data += self.stream.finish()
+            await self.send({"type": "http.response.body", "body": data, "more_body": more})
+            return
+
+        if not more:
+            # Whole body in one message
+            if len(body) < self.mw.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            if len(body) >= self.mw.thread_threshold:
+                compressed = await anyio.to_thread.run_sync(self.codec.compress, body)
+            else:
+                compressed = self.codec.compress(body)
+            start = dict(self.start, headers=_with_encoding(self.start.get("headers", []), self.codec, len(compressed)))
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        # First chunk of a streaming body: switch to incremental compression
+        self.stream = self.codec.stream()
+        start = dict(self.start, headers=_with_encoding(self.start.get("headers", []), self.codec, None))
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": self.stream.chunk(body), "more_body": True})
@@ -0,0 +1,29 @@
+"""Per-route memory accounting while memory profiling is running.
+
+Wraps each request in a ``RequestRecord`` of ``app.services.memory_profiler``
+and files it under the route template that served it (``GET
+/calculations/{calc_id}``), once the response has been fully sent. Costs
+one attribute check per request while profiling is off.
+"""
+from app.services.memory_profiler import memory_profiler
+
+
+class MemoryAccountingMiddleware:
+    def __init__(self, app, profiler=memory_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.active:
+            await self.app(scope, receive, send)
+            return
+
+        record = self.profiler.begin_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if record is not None:
+                # The router stores the matched route in the (shared) scope
+                route = scope.get("route")
+                path = getattr(route, "path", None) or "(unmatched)"
+                self.profiler.end_request(record, f"{scope['method']} {path}")
@@ -0,0 +1,248 @@
+"""Per-client token-bucket rate limiting and concurrency caps.
+
+Off unless ``RATE_LIMIT_ENABLED=1``: the login/register limit would turn
+away a browser test suite driving a live server from one address, so
+deployments opt in (and CI leaves it unset).
+
+Clients are identified by the ``sub`` of a valid access token (header or
+cookie) and fall back to their IP address. Each client has one bucket for
+ordinary routes and a separate, stricter one for expensive routes
+(submitting login/register, report, export). A request that finds its bucket
+empty, or its client already at ``RATE_LIMIT_MAX_CONCURRENT`` in-flight
+requests, gets ``429 Too Many Requests`` with a ``Retry-After`` header; a
+request turned away by the concurrency cap gets its token back.
+
+Limits are written as ``"<tokens per second>/<burst>"``:
+
+- ``RATE_LIMIT_DEFAULT`` (default ``20/40``)
+- ``RATE_LIMIT_EXPENSIVE`` (default ``0.5/10``)
+
+Buckets live in process memory unless ``RATE_LIMIT_REDIS_URL`` is set, in
+which case they are shared by every worker through Redis (this needs the
+``redis`` package).
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # pragma: no cover - depends on the environment
+    redis = None
+
+from app.auth import decode_access_token
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "20/40")
+RATE_LIMIT_EXPENSIVE = os.getenv("RATE_LIMIT_EXPENSIVE", "0.5/10")
+RATE_LIMIT_MAX_CONCURRENT = int(os.getenv("RATE_LIMIT_MAX_CONCURRENT", "8"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# (method, path) pairs; the login and register pages themselves are cheap
+EXPENSIVE_ROUTES = frozenset({
+    ("POST", "/login"),
+    ("POST", "/register"),
+    ("POST", "/users/login"),
+    ("POST", "/users/register"),
+    ("GET", "/calculations/report"),
+    ("GET", "/calculations/export"),
+})
+# Static files and the orchestrator's probes (/metrics is authenticated and limited like any route)
+EXEMPT_PREFIXES = ("/static", "/ready")
+# Long-lived streams are rate limited when they open but not held against the in-flight cap
+STREAMING_PATHS = frozenset({"/calculations/stream"})
+
+
+def parse_limit(spec: str) -> Tuple[float, float]:
+    """``"20/40"`` -> (20.0 tokens per second, burst of 40.0)."""
+    rate, burst = spec.split("/", 1)
+    return float(rate), float(burst)
+
+
+class MemoryBucketStore:
+    """In-process token buckets.
+
+    Buckets refill lazily when touched, and idle buckets are dropped lazily
+    from the front of an access-ordered dict, so every call is amortised O(1).
+    """
+
+    def __init__(self, idle_ttl: float = 600.0):
+        self.idle_ttl = idle_ttl
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return self.take_sync(key, rate, burst)
+
+    async def refund(self, key: str, burst: float) -> None:
+        """Give back a token taken by a request that was not served."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(burst, bucket[0] + 1)
+
+    def take_sync(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        """Take one token; returns 0 on success or seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else math.inf
+            self._buckets[key] = [tokens, now]
+
+            while self._buckets:
+                oldest_key, oldest = next(iter(self._buckets.items()))
+                if now - oldest[1] < self.idle_ttl:
+                    break
+                del self._buckets[oldest_key]
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """Token buckets shared across workers, updated atomically by a Lua script."""
+
+    _SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    _REFUND = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    if tokens then
+        redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + 1))
+    end
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self._SCRIPT)
+        self._refund = self._redis.register_script(self._REFUND)
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        wait = await self._script(keys=[self.prefix + key], args=[rate, burst, time.time()])
+        return float(wait)
+
+    async def refund(self, key: str, burst: float) -> None:
+        await self._refund(keys=[self.prefix + key], args=[burst])
+
+
+def client_key(scope) -> str:
+    """``user:<sub>`` for requests with a valid token, else ``ip:<address>``."""
+    headers = dict(scope.get("headers") or [])
+    token = None
+    auth = headers.get(b"authorization", b"").decode("latin-1")
+    if auth.lower().startswith("bearer "):
+        token = auth.split(" ", 1)[1].strip()
+    else:
+        for part in headers.get(b"cookie", b"").decode("latin-1").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "access_token" and value:
+                value = value.strip('"')
+                token = value.split(" ", 1)[1] if value.lower().startswith("bearer ") else value
+                break
+    if token:
+        payload = decode_access_token(token)
+        if payload and payload.get("sub") is not None:
+            return f"user:{payload['sub']}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware that enforces the per-client limits described above."""
+
+    def __init__(
+        self,
+        app,
+        store=None,
+        default: str = RATE_LIMIT_DEFAULT,
+        expensive: str = RATE_LIMIT_EXPENSIVE,
+        max_concurrent: int = RATE_LIMIT_MAX_CONCURRENT,
+        enabled: bool = RATE_LIMIT_ENABLED,
+    ):
+        self.app = app
+        if store is None:
+            store = RedisBucketStore(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else MemoryBucketStore()
+        self.store = store
+        self.default = parse_limit(default)
+        self.expensive = parse_limit(expensive)
+        self.max_concurrent = max_concurrent
+        self.enabled = enabled
+        self._in_flight: Dict[str, int] = {}
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        key = client_key(scope)
+        if (scope["method"], scope["path"]) in EXPENSIVE_ROUTES:
+            bucket, (rate, burst) = f"expensive:{key}", self.expensive
+        else:
+            bucket, (rate, burst) = f"default:{key}", self.default
+
+        wait = await self.store.take(bucket, rate, burst)
+        if wait > 0:
+            await self._reject(send, wait)
+            return
+
+        if scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self._in_flight.get(key, 0) >= self.max_concurrent:
+            await self.store.refund(bucket, burst)
+            await self._reject(send, 1)
+            return
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            remaining = self._in_flight[key] - 1
+            if remaining:
+                self._in_flight[key] = remaining
+            else:
+                del self._in_flight[key]
+
+    @staticmethod
+    async def _reject(send, wait: float) -> None:
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
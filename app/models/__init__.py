@@ -1,3 +1,10 @@
 from .base_class import Base
 from .user import User
 from .calculation import Calculation
+from .shard_directory import ShardAssignment
+from .calculation_archive import CalculationArchive, ArchiveRollup
+from .calculation_change import CalculationChange
+from .revoked_token import RevokedToken
+from .refresh_token import RefreshToken
+from .job import Job
+from .analytics_rollup import DailyRollup, ResultHistogram
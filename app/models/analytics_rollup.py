@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Date, Float, Integer, String
+from .base_class import Base  # only from base_class
+
+
+class DailyRollup(Base):
+    """System-wide totals for one user, operation and UTC day.
+
+    Rebuilt day by day by the analytics rollup (see
+    ``app/services/analytics.py``), so admin analytics never scan
+    ``calculations``.
+    """
+
+    __tablename__ = "analytics_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    operation = Column(String(length=20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_result = Column(Float, nullable=False, default=0.0)
+    sum_sq_result = Column(Float, nullable=False, default=0.0)
+    min_result = Column(Float, nullable=True)
+    max_result = Column(Float, nullable=True)
+
+
+class ResultHistogram(Base):
+    """How many results of an operation fell in each value bucket on one day."""
+
+    __tablename__ = "analytics_result_histogram"
+
+    day = Column(Date, primary_key=True)
+    operation = Column(String(length=20), primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # index into RESULT_BUCKET_EDGES
+    count = Column(Integer, nullable=False, default=0)
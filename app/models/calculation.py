@@ -1,6 +1,6 @@
 # app/models/calculation.py
 from enum import Enum
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 from .base_class import Base  # only from base_class
@@ -14,10 +14,15 @@ class CalculationType(Enum):
     DIVISION = "div"  # alias for tests that use DIVISION
     POW = "pow"
     MOD = "mod"
+    EXPR = "expr"  # free-form expression; a and b are bound as variables
 
 
 class Calculation(Base):
     __tablename__ = "calculations"
+    __table_args__ = (
+        # Serves the newest-first keyset pages of a user's list and search
+        Index("ix_calculations_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
@@ -27,7 +32,9 @@ class Calculation(Base):
     a = Column("operand_a", Float, nullable=False)
     b = Column("operand_b", Float, nullable=False)
     result = Column(Float, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # source text of an "expr" calculation (NULL for binary operations)
+    expression = Column(String(length=1000), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     owner = relationship("User", back_populates="calculations")  # ensure User model has calculations relationship
@@ -0,0 +1,50 @@
+# app/models/calculation_archive.py
+from sqlalchemy import Column, Integer, Float, String, DateTime, Index
+from sqlalchemy.orm import synonym
+from datetime import datetime
+from .base_class import Base  # only from base_class
+
+
+class CalculationArchive(Base):
+    """Cold copy of a calculation older than the retention window.
+
+    Keeps the original calculation id and the same attribute names as
+    ``Calculation`` so templates and schemas can render either.
+    """
+
+    __tablename__ = "calculations_archive"
+    __table_args__ = (
+        Index("ix_calculations_archive_user_created", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    type = Column("operation", String(length=20), nullable=False)
+    a = Column("operand_a", Float, nullable=False)
+    b = Column("operand_b", Float, nullable=False)
+    result = Column(Float, nullable=False)
+    expression = Column(String(length=1000), nullable=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    operand_a = synonym('a')
+    operand_b = synonym('b')
+    operation = synonym('type')
+
+
+class ArchiveRollup(Base):
+    """Per-user, per-operation totals of everything moved to the archive.
+
+    Reports add these to the live aggregates so totals stay exact without
+    reading the archive table.
+    """
+
+    __tablename__ = "calculation_archive_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    operation = Column(String(length=20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_a = Column(Float, nullable=False, default=0.0)
+    sum_b = Column(Float, nullable=False, default=0.0)
+    sum_result = Column(Float, nullable=False, default=0.0)
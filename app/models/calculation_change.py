@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from .base_class import Base  # only from base_class
+
+
+class CalculationChange(Base):
+    """One committed insert, update or delete of a calculation.
+
+    ``seq`` only grows, so ``seq > cursor`` is everything that changed since
+    a client last synced (see ``GET /calculations/changes``).
+    """
+
+    __tablename__ = "calculation_changes"
+    __table_args__ = (
+        Index("ix_calculation_changes_user_seq", "user_id", "seq"),
+        {"sqlite_autoincrement": True},  # never reuse a seq after pruning
+    )
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)
+    calculation_id = Column(Integer, nullable=False)
+    op = Column(String(length=6), nullable=False)  # insert | update | delete
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,36 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
+from datetime import datetime
+from .base_class import Base  # only from base_class
+
+
+class Job(Base):
+    """A long-running bulk job (batch compute, export, report) run off the request path.
+
+    ``status`` moves queued -> running -> succeeded | failed | cancelled. A
+    running job's ``heartbeat_at`` is refreshed by the worker that claimed
+    it; when it goes stale that worker is gone and the job is requeued.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_created", "status", "created_at"),
+        Index("ix_jobs_user_status", "user_id", "status"),
+    )
+
+    id = Column(String(length=32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(length=16), nullable=False)  # compute | export | report
+    params = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String(length=16), nullable=False, default="queued")
+    progress = Column(Float, nullable=False, default=0.0)
+    detail = Column(String(length=200), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    saved_items = Column(Integer, nullable=True)  # compute with save: inputs already stored
+    result_path = Column(String(length=500), nullable=True)
+    result_media_type = Column(String(length=100), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
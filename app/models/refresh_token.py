@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from .base_class import Base  # only from base_class
+
+
+class RefreshToken(Base):
+    """One refresh token of a login session.
+
+    Every refresh replaces the token with a new one in the same ``family``.
+    Only a SHA-256 of the opaque token is stored.
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    token_hash = Column(String(length=64), unique=True, nullable=False)
+    family_id = Column(String(length=32), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    # jti of the access token minted alongside, revoked with the family
+    access_jti = Column(String(length=32), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)  # set once rotated; a second use is a replay
+    revoked_at = Column(DateTime, nullable=True)
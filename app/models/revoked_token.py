@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from .base_class import Base  # only from base_class
+
+
+class RevokedToken(Base):
+    """A revoked access token, kept until the token would have expired anyway.
+
+    ``id`` only grows, so workers pick up new revocations with ``id > last``.
+    """
+
+    __tablename__ = "revoked_tokens"
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String(length=32), unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, DateTime
+from datetime import datetime
+from .base_class import Base  # only from base_class
+
+
+class ShardAssignment(Base):
+    """Pins a user's calculations to a shard, overriding the hash placement."""
+
+    __tablename__ = "shard_directory"
+
+    user_id = Column(Integer, primary_key=True)
+    shard = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
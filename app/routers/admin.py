@@ -0,0 +1,45 @@
+"""
+Operator-only, system-wide analytics under `/admin/analytics`.
+
+Every endpoint reads the daily rollups (see `app/services/analytics.py`),
+never `calculations`. `days` is capped at `ANALYTICS_MAX_DAYS` and `n` at
+`ANALYTICS_TOP_N_MAX`, and answers are cached for `ANALYTICS_CACHE_SECONDS`.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.dependencies import get_admin_user
+from app.services import analytics
+
+router = APIRouter(
+    prefix="/admin/analytics",
+    tags=["admin"],
+    dependencies=[Depends(get_admin_user)],
+)
+
+
+@router.get("/operations")
+def operations(days: int = 30, db: Session = Depends(get_db)):
+    """Volume and result statistics per operation and day."""
+    return analytics.operation_volume(db, days)
+
+
+@router.get("/users/top")
+def top_users(days: int = 30, n: int = 10, operation: Optional[str] = None, db: Session = Depends(get_db)):
+    """The most active users in the window, optionally for one operation."""
+    return analytics.top_users(db, days, n, operation)
+
+
+@router.get("/users/active")
+def active_users(days: int = 30, db: Session = Depends(get_db)):
+    """Daily active users."""
+    return analytics.daily_active_users(db, days)
+
+
+@router.get("/results/distribution")
+def result_distribution(days: int = 30, operation: Optional[str] = None, db: Session = Depends(get_db)):
+    """How results are distributed over value buckets, per day."""
+    return analytics.result_distribution(db, days, operation)
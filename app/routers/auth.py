@@ -1,14 +1,129 @@
 """
-This module previously exported login/register routes that conflicted with the
-application's main HTML router. Those handlers have been consolidated into
-`app/schemas/user.py` (HTML) and `app/routers/users.py` (API). To avoid
-duplicate routes and ambiguous behavior, this module intentionally exposes no
-routes at top-level.
-
-If you want namespaced auth endpoints later, add them under a prefix such as
-`/auth` to avoid colliding with the site's public `/login` and `/register`.
+Namespaced auth endpoints under `/auth`.
+
+The site's public `/login` and `/register` live in `app/main.py` (HTML) and
+`app/routers/users.py` (API). This module only holds the token endpoints that
+sit behind them.
+
+Browsers only send the refresh cookie to `/auth/*`. A page load whose access
+cookie has expired is therefore redirected through `GET /auth/refresh`, which
+renews both cookies and sends the browser back to the page (see
+`expired_session_redirect`).
 """
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+from jose import ExpiredSignatureError, JWTError, jwt
+from sqlalchemy.orm import Session
+
+from app.auth import ALGORITHM, SECRET_KEY
+from app.db import get_db
+from app.dependencies import token_from_request
+from app.services.refresh_tokens import REFRESH_TOKEN_EXPIRE_DAYS, RefreshError, refresh_tokens
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+REFRESH_COOKIE = "refresh_token"
+# The refresh cookie is only ever sent to /auth/*
+REFRESH_COOKIE_PATH = "/auth"
+
+
+def set_auth_cookies(response: Response, tokens: dict) -> None:
+    """Store a freshly issued token pair in the browser's cookies."""
+    response.set_cookie(
+        key="access_token",
+        value=f"Bearer {tokens['access_token']}",
+        httponly=True,
+        samesite="lax",
+    )
+    response.set_cookie(
+        key=REFRESH_COOKIE,
+        value=tokens["refresh_token"],
+        httponly=True,
+        samesite="strict",
+        path=REFRESH_COOKIE_PATH,
+        max_age=int(REFRESH_TOKEN_EXPIRE_DAYS * 86400),
+    )
+
+
+def clear_auth_cookies(response: Response) -> None:
+    response.delete_cookie("access_token")
+    response.delete_cookie(REFRESH_COOKIE, path=REFRESH_COOKIE_PATH)
+
+
+def expired_session_redirect(request: Request) -> Optional[RedirectResponse]:
+    """A redirect through `/auth/refresh` for a page load with an expired access cookie, else None."""
+    if request.method != "GET" or "text/html" not in request.headers.get("accept", ""):
+        return None
+    if request.headers.get("authorization") or not request.cookies.get("access_token"):
+        return None
+    try:
+        jwt.decode(token_from_request(request), SECRET_KEY, algorithms=[ALGORITHM])
+        return None  # valid, so the 401 has another cause; refreshing would loop
+    except ExpiredSignatureError:
+        pass
+    except JWTError:
+        return None
+    target = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    return RedirectResponse(f"{REFRESH_COOKIE_PATH}/refresh?{urlencode({'next': target})}", status_code=303)
+
+
+def _local(path: str) -> str:
+    """``path`` if it stays on this site, else the calculations page."""
+    return path if path.startswith("/") and not path.startswith("//") else "/calculations"
+
+
+@router.get("/refresh")
+def refresh_and_return(request: Request, next: str = "/calculations", db: Session = Depends(get_db)):
+    """
+    Browser round trip: renew both cookies, then go back to `next`.
+
+    Without a usable refresh cookie the session is over and the browser is
+    sent to the login page.
+    """
+    token = request.cookies.get(REFRESH_COOKIE)
+    try:
+        if not token:
+            raise RefreshError("Missing refresh token")
+        tokens = refresh_tokens(db, token)
+    except RefreshError:
+        response = RedirectResponse("/login", status_code=303)
+        clear_auth_cookies(response)
+        return response
+    response = RedirectResponse(_local(next), status_code=303)
+    set_auth_cookies(response, tokens)
+    return response
+
+
+@router.post("/refresh")
+async def refresh(request: Request, db: Session = Depends(get_db)):
+    """
+    Trade a refresh token for a new access/refresh pair.
+
+    API clients send `{"refresh_token": ...}`; browsers send the refresh cookie
+    and get both cookies replaced. The old refresh token stops working.
+    """
+    token = None
+    if "application/json" in request.headers.get("content-type", ""):
+        token = (await request.json()).get("refresh_token")
+    from_cookie = not token
+    if from_cookie:
+        token = request.cookies.get(REFRESH_COOKIE)
 
-from fastapi import APIRouter
+    if not token:
+        return JSONResponse({"detail": "Missing refresh token"}, status_code=401)
+    try:
+        tokens = await run_in_threadpool(refresh_tokens, db, token)
+    except RefreshError as exc:
+        response = JSONResponse({"detail": str(exc)}, status_code=401)
+        if from_cookie:
+            clear_auth_cookies(response)
+        return response
 
-router = APIRouter()
\ No newline at end of file
+    response = JSONResponse(tokens)
+    if from_cookie:
+        set_auth_cookies(response, tokens)
+    return response
@@ -1,24 +1,120 @@
 # app/routers/calculations.py
 from fastapi import APIRouter, Depends, HTTPException, Form, Request
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import List
+import time
+from typing import List, NamedTuple, Optional
+from datetime import datetime
+from urllib.parse import urlencode
 
-from app.db import get_db
 from app.models.calculation import Calculation  # SQLAlchemy model
 from app.models.user import User
 from app.schemas.calculation import CalculationOut, CalculationType  # Pydantic schema for response
-from app.dependencies import get_current_user
+from app.db import get_db, shard_map
+from app.dependencies import get_current_user, get_read_db, get_shard_db
 from app.services.report_service import generate_report
+from app.services.ingest_queue import INGEST_MODE, INGEST_WAIT_SECONDS, ingest_enabled, ingest_queue
+from app.services.response_formats import (
+    CALCULATION_COLUMNS,
+    JSON,
+    bulk_response,
+    negotiate_format,
+)
+from app.services.archive_service import calculations_in_window
+from app.services.hot_cache import hot_cache
+from app.services.calculation_math import compute_result
+from app.services.live_updates import event_stream
+from app.services.change_log import CHANGES_PAGE_SIZE, changes_since
+from app.services.single_flight import single_flight
+from app.services.pagination import LIST_PAGE_SIZE, decode_cursor, split_page
 from app.schemas.report import ReportOut
+from app.templating import StreamingTemplateResponse, templates
 
 router = APIRouter(
     prefix="/calculations",
     tags=["calculations"],
 )
 
-templates = Jinja2Templates(directory="app/templates")
+
+# -----------------------------
+# Paging helpers for the HTML list and search
+# -----------------------------
+class _Search(NamedTuple):
+    """What a search matches: one id, an exact result, or operations like a pattern."""
+
+    search_id: Optional[int] = None
+    result: Optional[float] = None
+    operation_like: Optional[str] = None
+
+    def __call__(self, m):
+        """``where`` criteria for either calculations table."""
+        if self.search_id is not None:
+            return [m.id == self.search_id]
+        if self.result is not None:
+            return [m.result == self.result]
+        return [m.type.ilike(f"%{self.operation_like}%")]
+
+
+def _search_filter(search_id: Optional[int], query: Optional[str]) -> Optional[_Search]:
+    """The search, or None when nothing was searched for."""
+    if search_id is not None:
+        return _Search(search_id=search_id)
+    q = (query or "").strip()
+    if not q:
+        return None
+    try:
+        return _Search(result=float(q))
+    except ValueError:
+        return _Search(operation_like=q)
+
+
+def _keyset_position(cursor: Optional[str]):
+    """Decode a page cursor up front, so a bad one is a 400 before streaming starts."""
+    try:
+        return decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _first_page(
+    db: Session,
+    user_id: int,
+    where: Optional[_Search] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after=None,
+):
+    """One newest-first page of calculations and the cursor of the next one."""
+    search = where._asdict() if where is not None else {}
+    rows = hot_cache.page(db, user_id, since, until, after, LIST_PAGE_SIZE + 1, **search)
+    if rows is None:
+        rows = calculations_in_window(
+            db, user_id, since, until, where=where, after=after, limit=LIST_PAGE_SIZE + 1
+        )
+    return split_page(rows, LIST_PAGE_SIZE)
+
+
+def _next_urls(path: str, next_cursor: Optional[str], **params) -> dict:
+    """Links to the next page: a full page (no-JS fallback) and its rows fragment."""
+    if next_cursor is None:
+        return {"next_page": None, "next_rows": None}
+    query = urlencode({
+        k: v.isoformat() if isinstance(v, datetime) else v
+        for k, v in dict(params, cursor=next_cursor).items() if v is not None
+    })
+    return {"next_page": f"{path}?{query}", "next_rows": f"/calculations/rows?{query}"}
+
+
+def _page_loader(path: str, fetch, **link_params):
+    """``load_page`` for list.html: runs ``fetch`` only when the template reaches the table."""
+
+    def load_page() -> dict:
+        calculations, next_cursor = fetch() if fetch is not None else ([], None)
+        return {"calculations": calculations, **_next_urls(path, next_cursor, **link_params)}
+
+    return load_page
+
 
 # -----------------------------
 # 1. List all calculations for the current user
@@ -26,31 +122,53 @@ templates = Jinja2Templates(directory="app/templates")
 @router.get("", response_model=List[CalculationOut])
 def list_calculations(
     request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    """Return either HTML page (for browser) or JSON list (for API clients)."""
-    tmpl = Jinja2Templates(directory="app/templates")
-
-    calculations = (
-        db.query(Calculation)
-        .filter(Calculation.user_id == current_user.user_id)
-        .order_by(Calculation.created_at.desc())
-        .all()
-    )
+    """Return either HTML page (for browser) or JSON list (for API clients).
 
+    ``since``/``until`` bound the time window; archived calculations are
+    included only when ``since`` reaches past the retention cutoff. The HTML
+    page shows the newest ``LIST_PAGE_SIZE`` rows and loads the rest from
+    ``/calculations/rows`` as the user scrolls.
+    """
     accept = request.headers.get("accept", "")
-    # If browser requested HTML, render template
+    user_id = current_user.user_id
+
+    # If browser requested HTML, stream the page; its rows are queried after the head is sent
     if "text/html" in accept:
-        return tmpl.TemplateResponse(
+        after = _keyset_position(cursor)
+        fetch = lambda: single_flight.do(
+            single_flight.key(user_id, "list:page", since=since, until=until, cursor=cursor),
+            lambda: _first_page(db, user_id, since=since, until=until, after=after),
+        )
+        return StreamingTemplateResponse(
+            request,
             "calculations/list.html",
             {
-                "request": request,
-                "calculations": calculations,
                 "current_user": current_user,
+                "load_page": _page_loader("/calculations", fetch, since=since, until=until),
             },
         )
 
+    # Columnar / MessagePack clients get a body built straight from the rows
+    fmt = negotiate_format(accept)
+    if fmt != JSON:
+        rows = single_flight.do(
+            single_flight.key(user_id, "list:rows", since=since, until=until),
+            lambda: calculations_in_window(db, user_id, since, until, columns=list(CALCULATION_COLUMNS)),
+        )
+        return bulk_response(rows, fmt)
+
+    # Identical concurrent requests (many tabs, retries) share one query
+    calculations = single_flight.do(
+        single_flight.key(user_id, "list", since=since, until=until),
+        lambda: calculations_in_window(db, user_id, since, until),
+    )
+
     # Otherwise return JSON-serializable data for API clients
     return [CalculationOut.from_orm(c).dict() for c in calculations]
 
@@ -61,8 +179,7 @@ def add_calculation_form(
     current_user: User = Depends(get_current_user),
 ):
     """Render the Add Calculation HTML form for browser flows."""
-    tmpl = Jinja2Templates(directory="app/templates")
-    return tmpl.TemplateResponse(
+    return templates.TemplateResponse(
         "calculations/add.html",
         {"request": request, "current_user": current_user},
     )
@@ -72,32 +189,34 @@ def add_calculation_form(
 def search_calculations_get(
     request: Request,
     search_id: int | None = None,
+    q: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    """Render the search page or show results when ?search_id=... is provided."""
-    tmpl = Jinja2Templates(directory="app/templates")
-    calculations: list[Calculation] = []
-    if search_id:
-        calculations = (
-            db.query(Calculation)
-            .filter(
-                Calculation.id == search_id,
-                Calculation.user_id == current_user.user_id,
-            )
-            .order_by(Calculation.created_at.desc())
-            .all()
-        )
-    return tmpl.TemplateResponse(
+    """Render the search page or show results when ?search_id=... (or ?q=...) is provided."""
+    where = _search_filter(search_id, q)
+    after = _keyset_position(cursor)
+    fetch = None
+    if where is not None:
+        fetch = lambda: _first_page(db, current_user.user_id, where, since, until, after)
+    return StreamingTemplateResponse(
+        request,
         "calculations/list.html",
-        {"request": request, "calculations": calculations, "current_user": current_user},
+        {
+            "current_user": current_user,
+            "load_page": _page_loader("/calculations/search", fetch,
+                                      search_id=search_id, q=q, since=since, until=until),
+        },
     )
 
 
 @router.post("/search")
 async def search_calculations_post(
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """Accept the form submission from the search box and render results."""
@@ -117,55 +236,118 @@ async def search_calculations_post(
         except Exception:
             search_id = None
 
-    tmpl = Jinja2Templates(directory="app/templates")
-    calculations: list[Calculation] = []
-    if search_id is not None:
-        calculations = (
-            db.query(Calculation)
-            .filter(
-                Calculation.id == search_id,
-                Calculation.user_id == current_user.user_id,
-            )
-            .order_by(Calculation.created_at.desc())
-            .all()
-        )
-    elif raw_query:
-        q = raw_query.strip()
-        calculations_query = db.query(Calculation).filter(
-            Calculation.user_id == current_user.user_id
-        )
-        numeric_val = None
+    # Optional time window, same meaning as on GET /calculations
+    window = {}
+    for key in ("since", "until"):
         try:
-            numeric_val = float(q)
-        except Exception:
-            numeric_val = None
-
-        if numeric_val is not None:
-            calculations = (
-                calculations_query.filter(Calculation.result == numeric_val)
-                .order_by(Calculation.created_at.desc())
-                .all()
-            )
-        else:
-            calculations = (
-                calculations_query.filter(Calculation.type.ilike(f"%{q}%"))
-                .order_by(Calculation.created_at.desc())
-                .all()
-            )
-
-    return tmpl.TemplateResponse(
+            window[key] = datetime.fromisoformat(form.get(key)) if form.get(key) else None
+        except ValueError:
+            window[key] = None
+
+    query = None if search_id is not None else raw_query
+    where = _search_filter(search_id, query)
+    fetch = None
+    if where is not None:
+        fetch = lambda: _first_page(db, current_user.user_id, where, window["since"], window["until"])
+    return StreamingTemplateResponse(
+        request,
         "calculations/list.html",
-        {"request": request, "calculations": calculations, "current_user": current_user},
+        {
+            "current_user": current_user,
+            "load_page": _page_loader("/calculations/search", fetch,
+                                      search_id=search_id, q=query and query.strip(), **window),
+        },
     )
 
 
+@router.get("/rows")
+def calculation_rows(
+    cursor: str,
+    search_id: int | None = None,
+    q: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """The next page of list or search results as bare ``<tr>`` rows.
+
+    ``X-Next-Rows`` carries the URL of the page after it, absent on the last.
+    """
+    where = _search_filter(search_id, q)
+    after = _keyset_position(cursor)
+    calculations, next_cursor = _first_page(db, current_user.user_id, where, since, until, after)
+    html = templates.get_template("calculations/_rows.html").render(calculations=calculations)
+    urls = _next_urls("/calculations", next_cursor, search_id=search_id, q=q, since=since, until=until)
+    headers = {"X-Next-Rows": urls["next_rows"]} if urls["next_rows"] else {}
+    return HTMLResponse(html, headers=headers)
+
+
+# -----------------------------
+# /calculations/stream
+# -----------------------------
+@router.get("/stream")
+def stream_calculations(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Server-sent events: created/updated/deleted calculations and refreshed reports."""
+    user_id = current_user.user_id
+    # Hand the connection back to the pool; an open stream never queries
+    db.close()
+    return StreamingResponse(
+        event_stream(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -----------------------------
+# /calculations/changes
+# -----------------------------
+@router.get("/changes")
+def calculation_changes(
+    since: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_shard_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Changes after the ``since`` cursor; ``reset: true`` means refetch the full list."""
+    # Always the primary: a replica's log may be behind a cursor it issued earlier
+    shard = shard_map.shard_for(current_user.user_id)
+    return changes_since(db, current_user.user_id, shard, since, limit)
+
+
+# -----------------------------
+# /calculations/export
+# -----------------------------
+@router.get("/export")
+def export_calculations(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Export the user's full history as JSON, columnar JSON or MessagePack."""
+    fmt = negotiate_format(request.headers.get("accept", ""))
+    names = list(CALCULATION_COLUMNS)
+    rows = calculations_in_window(
+        db, current_user.user_id, since, until, columns=names, newest_first=False
+    )
+    if fmt != JSON:
+        return bulk_response(rows, fmt)
+
+    return [CalculationOut(**dict(zip(names, row))).dict() for row in rows]
+
+
 # -----------------------------
 # /calculations/report
 # -----------------------------
 @router.get("/report")
 def report_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """
@@ -178,17 +360,23 @@ def report_page(
     if user_id is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    data = generate_report(db, user_id=user_id)
+    def load_report():
+        return single_flight.do(
+            single_flight.key(user_id, "report"), lambda: generate_report(db, user_id=user_id)
+        )
+
     accept = request.headers.get("accept", "")
 
     if "text/html" in accept:
-        return templates.TemplateResponse(
+        # The report is computed once the page head is on its way
+        return StreamingTemplateResponse(
+            request,
             "calculations/report.html",
-            {"request": request, "report": data, "current_user": current_user},
+            {"load_report": load_report, "current_user": current_user},
         )
 
     # For API clients return JSON schema-compatible structure
-    return ReportOut(**data)
+    return ReportOut(**load_report())
 
 
 # -----------------------------
@@ -199,7 +387,7 @@ def view_calculation(
     request: Request,
     calc_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     calc = (
         db.query(Calculation)
@@ -212,10 +400,9 @@ def view_calculation(
     if not calc:
         raise HTTPException(status_code=404, detail="Calculation not found")
 
-    tmpl = Jinja2Templates(directory="app/templates")
     accept = request.headers.get("accept", "")
     if "text/html" in accept:
-        return tmpl.TemplateResponse(
+        return templates.TemplateResponse(
             "calculations/view.html",
             {"request": request, "calc": calc, "current_user": current_user},
         )
@@ -228,7 +415,7 @@ def edit_calculation_form(
     request: Request,
     calc_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_shard_db),
 ):
     """Render the Edit Calculation HTML form for browser flows."""
     calc = (
@@ -242,8 +429,7 @@ def edit_calculation_form(
     if not calc:
         raise HTTPException(status_code=404, detail="Calculation not found")
 
-    tmpl = Jinja2Templates(directory="app/templates")
-    return tmpl.TemplateResponse(
+    return templates.TemplateResponse(
         "calculations/edit.html",
         {"request": request, "calc": calc, "current_user": current_user},
     )
@@ -252,12 +438,20 @@ def edit_calculation_form(
 # -----------------------------
 # 3. Add a new calculation
 # -----------------------------
+def _save_failed(exc: Exception) -> HTTPException:
+    """The same answer for an insert the database refused, queued or not."""
+    if isinstance(exc, IntegrityError):
+        return HTTPException(status_code=400, detail="Invalid calculation")
+    return HTTPException(status_code=503, detail="Could not save the calculation, please retry")
+
+
 @router.post("/add")
 def add_calculation(
     operand1: float = Form(...),
     operand2: float = Form(...),
     operation: str = Form(...),
-    db: Session = Depends(get_db),
+    expression: Optional[str] = Form(None),
+    db: Session = Depends(get_shard_db),
     current_user: User = Depends(get_current_user),
 ):
     # Normalize operation to the enum
@@ -267,35 +461,40 @@ def add_calculation(
         raise HTTPException(status_code=400, detail="Invalid operation")
 
     # Perform calculation
-    if op == CalculationType.ADD:
-        result = operand1 + operand2
-    elif op == CalculationType.SUB:
-        result = operand1 - operand2
-    elif op == CalculationType.MUL:
-        result = operand1 * operand2
-    elif op in (CalculationType.DIV, CalculationType.DIVISION):
-        if operand2 == 0:
-            raise HTTPException(status_code=400, detail="Division by zero")
-        result = operand1 / operand2
-    elif op == CalculationType.POW:
-        result = operand1 ** operand2
-    elif op == CalculationType.MOD:
-        if operand2 == 0:
-            raise HTTPException(status_code=400, detail="Modulo by zero")
-        result = operand1 % operand2
-    else:
-        raise HTTPException(status_code=400, detail="Invalid operation")
+    try:
+        result = compute_result(op, operand1, operand2, expression)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    values = {
+        "user_id": current_user.user_id,
+        "a": operand1,
+        "b": operand2,
+        "type": op.value,
+        "result": result,
+        "expression": expression.strip() if op == CalculationType.EXPR else None,
+    }
+
+    # Group-commit through the ingestion queue when enabled
+    if ingest_enabled():
+        deadline = time.monotonic() + INGEST_WAIT_SECONDS
+        try:
+            future = ingest_queue.submit(values, timeout=INGEST_WAIT_SECONDS)
+            if INGEST_MODE == "sync":
+                # On timeout the row stays queued and may still be saved
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception as exc:  # queue.Full and TimeoutError included: a 503
+            raise _save_failed(exc)
+        return RedirectResponse(url="/calculations", status_code=303)
 
     # Save to DB
-    calc = Calculation(
-        user_id=current_user.user_id,
-        a=operand1,
-        b=operand2,
-        type=op.value,
-        result=result,
-    )
+    calc = Calculation(**values)
     db.add(calc)
-    db.commit()
+    try:
+        db.commit()
+    except SQLAlchemyError as exc:
+        db.rollback()
+        raise _save_failed(exc)
     db.refresh(calc)
 
     return RedirectResponse(url="/calculations", status_code=303)
@@ -310,7 +509,8 @@ def edit_calculation(
     operand1: float = Form(...),
     operand2: float = Form(...),
     operation: str = Form(...),
-    db: Session = Depends(get_db),
+    expression: Optional[str] = Form(None),
+    db: Session = Depends(get_shard_db),
     current_user: User = Depends(get_current_user),
 ):
     calc = (
@@ -330,30 +530,17 @@ def edit_calculation(
         raise HTTPException(status_code=400, detail="Invalid operation")
 
     # Recalculate result
-    if op == CalculationType.ADD:
-        result = operand1 + operand2
-    elif op == CalculationType.SUB:
-        result = operand1 - operand2
-    elif op == CalculationType.MUL:
-        result = operand1 * operand2
-    elif op in (CalculationType.DIV, CalculationType.DIVISION):
-        if operand2 == 0:
-            raise HTTPException(status_code=400, detail="Division by zero")
-        result = operand1 / operand2
-    elif op == CalculationType.POW:
-        result = operand1 ** operand2
-    elif op == CalculationType.MOD:
-        if operand2 == 0:
-            raise HTTPException(status_code=400, detail="Modulo by zero")
-        result = operand1 % operand2
-    else:
-        raise HTTPException(status_code=400, detail="Invalid operation")
+    try:
+        result = compute_result(op, operand1, operand2, expression)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
     # Update DB
     calc.a = operand1
     calc.b = operand2
     calc.type = op.value
     calc.result = result
+    calc.expression = expression.strip() if op == CalculationType.EXPR else None
     db.commit()
     db.refresh(calc)
 
@@ -366,7 +553,7 @@ def edit_calculation(
 @router.post("/{calc_id}/delete")
 def delete_calculation(
     calc_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_shard_db),
     current_user: User = Depends(get_current_user),
 ):
     calc = (
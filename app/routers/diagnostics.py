@@ -0,0 +1,49 @@
+"""
+Operator-only runtime diagnostics under `/admin/diagnostics`.
+
+Memory profiling (see `app/services/memory_profiler.py`) is per worker
+process: each answer carries the `pid` of the worker that served it.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.dependencies import get_admin_user
+from app.services.memory_profiler import MEMORY_TRACE_FRAMES, memory_profiler
+
+router = APIRouter(
+    prefix="/admin/diagnostics",
+    tags=["admin"],
+    dependencies=[Depends(get_admin_user)],
+)
+
+
+@router.post("/memory/start")
+def start_memory_profiling(frames: int = MEMORY_TRACE_FRAMES, sample_rate: Optional[float] = None):
+    """Start tracemalloc and per-route accounting (restarting resets the route stats)."""
+    return memory_profiler.start(min(max(frames, 1), 100), sample_rate)
+
+
+@router.post("/memory/stop")
+def stop_memory_profiling():
+    """Stop tracemalloc; returns the final status."""
+    return memory_profiler.stop()
+
+
+@router.get("/memory")
+def memory_status():
+    """RSS, traced memory and per-route peak allocation and identity-map sizes."""
+    return memory_profiler.status()
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(top: int = 20, group_by: str = "lineno"):
+    """Top allocation sites by growth since the previous snapshot."""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    try:
+        # Snapshots of a large heap take a while; keep them off the event loop
+        return await run_in_threadpool(memory_profiler.snapshot, min(max(top, 1), 200), group_by)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
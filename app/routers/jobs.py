@@ -0,0 +1,120 @@
+"""
+Asynchronous jobs under `/jobs` (see `app/services/jobs.py`).
+
+`POST /jobs` answers 202 with the queued job; poll `GET /jobs/{id}` until
+`status` is `succeeded`, `failed` or `cancelled`, then download
+`GET /jobs/{id}/result`.
+"""
+import os
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.dependencies import get_current_user
+from app.models.job import Job
+from app.models.user import User
+from app.schemas.job import JobCreate, JobOut
+from app.services.jobs import (
+    SUCCEEDED,
+    JobError,
+    JobLimitError,
+    cancel_job,
+    get_job,
+    job_runner,
+    list_jobs,
+    submit_job,
+)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _job_out(job: Job) -> dict:
+    out = JobOut(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress,
+        detail=job.detail,
+        error=job.error,
+        attempts=job.attempts,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        result_url=f"/jobs/{job.id}/result" if job.status == SUCCEEDED else None,
+    )
+    return out.dict()
+
+
+def _own_job(db: Session, user: User, job_id: str) -> Job:
+    job = get_job(db, user.user_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("", status_code=202, response_model=JobOut)
+def create_job(
+    payload: JobCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Queue a `compute`, `export` or `report` job."""
+    try:
+        job = submit_job(db, current_user.user_id, payload.kind.value, payload.params)
+    except JobLimitError as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    except JobError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    job_runner.wake()
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return _job_out(job)
+
+
+@router.get("", response_model=List[JobOut])
+def read_jobs(
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """The current user's most recent jobs."""
+    return [_job_out(job) for job in list_jobs(db, current_user.user_id, min(limit, 200))]
+
+
+@router.get("/{job_id}", response_model=JobOut)
+def read_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Status and progress of one job."""
+    return _job_out(_own_job(db, current_user, job_id))
+
+
+@router.post("/{job_id}/cancel", response_model=JobOut)
+def cancel(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Cancel a job; a running one stops at its next progress report."""
+    return _job_out(cancel_job(db, _own_job(db, current_user, job_id)))
+
+
+@router.get("/{job_id}/result")
+def download_result(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """The finished job's output file."""
+    job = _own_job(db, current_user, job_id)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    filename = f"{job.kind}-{job.id}{os.path.splitext(job.result_path)[1]}"
+    return FileResponse(job.result_path, media_type=job.result_media_type, filename=filename)
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.templating import Jinja2Templates
 from typing import Any
 from sqlalchemy.orm import Session
-from app.dependencies import get_current_user
-from app.db import get_db
+from app.dependencies import get_current_user, get_read_db
 from app.services.report_service import generate_report
+from app.services.single_flight import single_flight
 from app.schemas.report import ReportOut
+from app.models.calculation import Calculation
+from app.services.response_formats import JSON, bulk_response, column_entities, negotiate_format
 
 router = APIRouter(prefix="/calculations", tags=["reports"])
-templates = Jinja2Templates(directory="app/templates")
 
 
 # Note: /report route is now in app/routers/calculations.py before /{calc_id}
@@ -16,9 +16,29 @@ templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/history")
-def report_history(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def report_history(
+    request: Request,
+    limit: int = 5,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
     user_id = getattr(current_user, "id", getattr(current_user, "user_id", None))
     if user_id is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    data = generate_report(db, user_id=user_id)
+
+    fmt = negotiate_format(request.headers.get("accept", ""))
+    if fmt != JSON:
+        rows = (
+            db.query(*column_entities())
+            .filter(Calculation.user_id == user_id)
+            .order_by(Calculation.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+        return bulk_response(rows, fmt)
+
+    data = single_flight.do(
+        single_flight.key(user_id, "report", limit=limit),
+        lambda: generate_report(db, user_id=user_id, limit=limit),
+    )
     return {"recent": data["recent"]}
@@ -1,13 +1,18 @@
 # app/routers/users.py
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, Form, Response, status, Request
 from fastapi.responses import RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
 
-templates = Jinja2Templates(directory="app/templates")
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models.user import User
-from app.auth import hash_password, verify_password, create_access_token
+from app.auth import hash_password, verify_password, decode_access_token
+from app.dependencies import token_from_request
+from app.services.token_revocation import revocations
+from app.services.refresh_tokens import issue_tokens, revoke_session
+from app.routers.auth import clear_auth_cookies, set_auth_cookies
+from app.templating import templates
 
 router = APIRouter(
     prefix="/users",
@@ -93,13 +98,14 @@ async def login(request: Request, response: Response, db: Session = Depends(get_
             return JSONResponse({"detail": "Invalid email or password"}, status_code=401)
         return {"template": "login.html", "error": "Invalid email or password"}
 
+    # Access + refresh token; clients renew them at /auth/refresh instead of logging in again
+    tokens = issue_tokens(db, user)
     if "application/json" in content_type:
-        return JSONResponse({"id": getattr(user, 'id', None), "email": user.email}, status_code=200)
+        return JSONResponse({"id": getattr(user, 'id', None), "email": user.email, **tokens}, status_code=200)
 
-    # For browser flows: create access token, set as HTTP-only cookie, and redirect to /calculations
-    token = create_access_token({"sub": getattr(user, 'id', getattr(user, 'user_id', None))})
+    # For browser flows: set both tokens as HTTP-only cookies and redirect to /calculations
     redirect = RedirectResponse(url="/calculations", status_code=status.HTTP_303_SEE_OTHER)
-    redirect.set_cookie(key="access_token", value=token, httponly=True)
+    set_auth_cookies(redirect, tokens)
     return redirect
 
 
@@ -107,6 +113,15 @@ async def login(request: Request, response: Response, db: Session = Depends(get_
 # Logout Route
 # -----------------------------
 @router.get("/logout")
-def logout(response: Response):
-    response.delete_cookie("user_id")
-    return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+def logout(request: Request, db: Session = Depends(get_db)):
+    """Revoke the current access token and refresh-token family, and clear their cookies."""
+    token = token_from_request(request)
+    payload = decode_access_token(token) if token else None
+    if payload and payload.get("jti") and payload.get("exp"):
+        revocations.revoke(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+        # The refresh cookie is scoped to /auth, so find the session by its access token
+        revoke_session(db, payload["jti"])
+
+    redirect = RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    clear_auth_cookies(redirect)
+    return redirect
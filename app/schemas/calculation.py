@@ -4,6 +4,8 @@ from pydantic import BaseModel, Field, validator, root_validator
 from typing import Optional
 from datetime import datetime
 
+from app.services.expression import compile_expression
+
 
 class CalculationType(str, Enum):
     ADD = "add"
@@ -13,12 +15,15 @@ class CalculationType(str, Enum):
     DIVISION = "div"  # alias
     POW = "pow"
     MOD = "mod"
+    EXPR = "expr"
 
 
 class CalculationCreate(BaseModel):
     a: float
     b: float
     type: CalculationType
+    # required for CalculationType.EXPR; may use a and b as variables
+    expression: Optional[str] = None
 
     @root_validator(skip_on_failure=True)
     def check_division_by_zero(cls, values):
@@ -28,6 +33,15 @@ class CalculationCreate(BaseModel):
             raise ValueError("Division by zero")
         return values
 
+    @root_validator(skip_on_failure=True)
+    def check_expression(cls, values):
+        if values.get("type") == CalculationType.EXPR:
+            if not values.get("expression"):
+                raise ValueError("Expression is required")
+            values["expression"] = values["expression"].strip()
+            compile_expression(values["expression"]).evaluate({"a": values.get("a"), "b": values.get("b")})
+        return values
+
 
 class CalculationUpdate(BaseModel):
     a: Optional[float]
@@ -41,6 +55,7 @@ class CalculationOut(BaseModel):
     b: float
     type: CalculationType
     result: float
+    expression: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,30 @@
+from enum import Enum
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class JobKind(str, Enum):
+    COMPUTE = "compute"
+    EXPORT = "export"
+    REPORT = "report"
+
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    params: Dict[str, Any] = {}
+
+
+class JobOut(BaseModel):
+    id: str
+    kind: JobKind
+    status: str
+    progress: float
+    detail: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Set once the job has succeeded
+    result_url: Optional[str] = None
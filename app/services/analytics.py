@@ -0,0 +1,364 @@
+"""System-wide analytics for operators, served from daily rollups.
+
+Scanning ``calculations`` for a cross-user ``GROUP BY`` on the production
+database costs time proportional to its whole history. Instead, the
+rollup keeps two small tables on the primary:
+
+- ``analytics_daily_rollups``: count, sum, sum of squares, min and max of
+  the results, per (day, user, operation);
+- ``analytics_result_histogram``: result counts per (day, operation,
+  value bucket).
+
+The rollup is incremental. One pass rebuilds each day from the last rolled-
+up day through today, one day at a time. Each day is a range scan on
+``calculations.created_at`` per shard, plus the archive for days past the
+retention cutoff. The last ``ANALYTICS_REFRESH_DAYS`` are always rebuilt, to
+pick up late edits and deletes. Older edits only show up after
+``python -m app.cli analytics-rollup --since DAY``.
+
+Queries read only the rollups, over at most ``ANALYTICS_MAX_DAYS`` days
+and ``ANALYTICS_TOP_N_MAX`` users, so every query has a bounded cost. Their
+answers are cached for ``ANALYTICS_CACHE_SECONDS``.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, distinct, func
+from sqlalchemy.orm import Session
+
+from app.models.analytics_rollup import DailyRollup, ResultHistogram
+from app.models.calculation import Calculation
+from app.models.calculation_archive import CalculationArchive
+from app.models.user import User
+from app.services.archive_service import archive_cutoff
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_ROLLUP_SECONDS = float(os.getenv("ANALYTICS_ROLLUP_SECONDS", "300"))
+ANALYTICS_REFRESH_DAYS = int(os.getenv("ANALYTICS_REFRESH_DAYS", "2"))
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "366"))
+ANALYTICS_TOP_N_MAX = int(os.getenv("ANALYTICS_TOP_N_MAX", "100"))
+ANALYTICS_CACHE_SECONDS = float(os.getenv("ANALYTICS_CACHE_SECONDS", "60"))
+
+# Bucket i holds results in [edges[i-1], edges[i]); 0 and len(edges) are open-ended
+RESULT_BUCKET_EDGES = (-1e6, -1e3, -100.0, -10.0, -1.0, 0.0, 1.0, 10.0, 100.0, 1e3, 1e6)
+
+_CACHE_MAX_ENTRIES = 256
+
+
+def bucket_label(bucket: int) -> str:
+    edges = RESULT_BUCKET_EDGES
+    if bucket == 0:
+        return f"< {edges[0]:g}"
+    if bucket == len(edges):
+        return f">= {edges[-1]:g}"
+    return f"[{edges[bucket - 1]:g}, {edges[bucket]:g})"
+
+
+def _bucket(column):
+    return case(
+        *[(column < edge, i) for i, edge in enumerate(RESULT_BUCKET_EDGES)],
+        else_=len(RESULT_BUCKET_EDGES),
+    )
+
+
+# -----------------------------
+# Rollup
+# -----------------------------
+def _day_models(day: date) -> List[Any]:
+    cutoff = archive_cutoff()
+    if cutoff is not None and datetime.combine(day, dt_time.min) < cutoff:
+        return [Calculation, CalculationArchive]
+    return [Calculation]
+
+
+def rollup_day(
+    shard_factories: Iterable[Callable[[], Session]],
+    primary_factory: Callable[[], Session],
+    day: date,
+) -> int:
+    """Rebuild one day's rollups from every shard; returns how many rollup rows it has."""
+    start = datetime.combine(day, dt_time.min)
+    end = start + timedelta(days=1)
+    totals: Dict[Tuple[int, str], List[Any]] = {}
+    buckets: Dict[Tuple[str, int], int] = {}
+
+    for factory in shard_factories:
+        db = factory()
+        try:
+            for model in _day_models(day):
+                in_day = (model.created_at >= start, model.created_at < end)
+                for user_id, op, n, s, sq, lo, hi in (
+                    db.query(model.user_id, model.type, func.count(model.id), func.sum(model.result),
+                             func.sum(model.result * model.result), func.min(model.result),
+                             func.max(model.result))
+                    .filter(*in_day)
+                    .group_by(model.user_id, model.type)
+                ):
+                    t = totals.setdefault((user_id, op), [0, 0.0, 0.0, None, None])
+                    t[0] += n
+                    t[1] += s or 0.0
+                    t[2] += sq or 0.0
+                    t[3] = lo if t[3] is None else min(t[3], lo)
+                    t[4] = hi if t[4] is None else max(t[4], hi)
+                bucket = _bucket(model.result)
+                for op, b, n in (
+                    db.query(model.type, bucket, func.count(model.id)).filter(*in_day).group_by(model.type, bucket)
+                ):
+                    buckets[(op, b)] = buckets.get((op, b), 0) + n
+        finally:
+            db.close()
+
+    db = primary_factory()
+    try:
+        db.query(DailyRollup).filter(DailyRollup.day == day).delete(synchronize_session=False)
+        db.query(ResultHistogram).filter(ResultHistogram.day == day).delete(synchronize_session=False)
+        db.add_all(
+            DailyRollup(day=day, user_id=user_id, operation=op, count=n, sum_result=s,
+                        sum_sq_result=sq, min_result=lo, max_result=hi)
+            for (user_id, op), (n, s, sq, lo, hi) in totals.items()
+        )
+        db.add_all(
+            ResultHistogram(day=day, operation=op, bucket=b, count=n) for (op, b), n in buckets.items()
+        )
+        db.commit()
+    finally:
+        db.close()
+    return len(totals)
+
+
+def _first_day(shard_factories: Iterable[Callable[[], Session]]) -> Optional[date]:
+    """The day of the oldest calculation on any shard (archive included)."""
+    oldest = []
+    for factory in shard_factories:
+        db = factory()
+        try:
+            oldest.append(db.query(func.min(Calculation.created_at)).scalar())
+            if archive_cutoff() is not None:
+                oldest.append(db.query(func.min(CalculationArchive.created_at)).scalar())
+        finally:
+            db.close()
+    oldest = [d for d in oldest if d is not None]
+    return min(oldest).date() if oldest else None
+
+
+def refresh_rollups(
+    shard_factories: Iterable[Callable[[], Session]],
+    primary_factory: Callable[[], Session],
+    since: Optional[date] = None,
+    today: Optional[date] = None,
+    should_stop: Callable[[], bool] = lambda: False,
+) -> int:
+    """Roll up every day from ``since`` (default: where the last pass left off) to today."""
+    shard_factories = list(shard_factories)
+    today = today or datetime.utcnow().date()
+    if since is None:
+        db = primary_factory()
+        try:
+            last = db.query(func.max(DailyRollup.day)).scalar()
+        finally:
+            db.close()
+        since = last if last is not None else _first_day(shard_factories) or today
+        since = min(since, today - timedelta(days=ANALYTICS_REFRESH_DAYS - 1))
+
+    days = 0
+    day = since
+    while day <= today and not should_stop():
+        rollup_day(shard_factories, primary_factory, day)
+        days += 1
+        day += timedelta(days=1)
+    if days:
+        cache.clear()
+    return days
+
+
+class AnalyticsWorker:
+    """Background thread that refreshes the rollups every ``interval`` seconds."""
+
+    def __init__(self, session_factories: Callable[[], Iterable[Callable[[], Session]]],
+                 primary_factory: Callable[[], Session], interval: float = ANALYTICS_ROLLUP_SECONDS):
+        self.session_factories = session_factories
+        self.primary_factory = primary_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="analytics-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        # First pass right away, so a fresh deployment backfills
+        while not self._stop.is_set():
+            try:
+                refresh_rollups(self.session_factories(), self.primary_factory, should_stop=self._stop.is_set)
+            except Exception:
+                logger.exception("Analytics rollup failed")
+            self._stop.wait(self.interval)
+
+
+# -----------------------------
+# Cached queries
+# -----------------------------
+class TTLCache:
+    """Answers kept for ``ttl`` seconds; the oldest entry goes first when full."""
+
+    def __init__(self, ttl: float = ANALYTICS_CACHE_SECONDS, max_entries: int = _CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+cache = TTLCache()
+
+
+def _window(days: int) -> Tuple[date, date]:
+    days = min(max(int(days), 1), ANALYTICS_MAX_DAYS)
+    today = datetime.utcnow().date()
+    return today - timedelta(days=days - 1), today
+
+
+def _cached(name: str, compute: Callable[[date, date], Dict[str, Any]], days: int, **params) -> Dict[str, Any]:
+    start, end = _window(days)
+
+    def run() -> Dict[str, Any]:
+        return {"from": start.isoformat(), "to": end.isoformat(),
+                "computed_at": datetime.utcnow().isoformat(), **compute(start, end)}
+
+    return cache.get_or_compute((name, start, end, tuple(sorted(params.items()))), run)
+
+
+def operation_volume(db: Session, days: int = 30) -> Dict[str, Any]:
+    """Per day and operation: count, mean, standard deviation, min and max of the results."""
+
+    def compute(start: date, end: date) -> Dict[str, Any]:
+        rows = (
+            db.query(DailyRollup.day, DailyRollup.operation, func.sum(DailyRollup.count),
+                     func.sum(DailyRollup.sum_result), func.sum(DailyRollup.sum_sq_result),
+                     func.min(DailyRollup.min_result), func.max(DailyRollup.max_result))
+            .filter(DailyRollup.day.between(start, end))
+            .group_by(DailyRollup.day, DailyRollup.operation)
+            .order_by(DailyRollup.day, DailyRollup.operation)
+            .all()
+        )
+        out = []
+        for day, op, n, s, sq, lo, hi in rows:
+            mean = s / n
+            out.append({
+                "day": day.isoformat(), "operation": op, "count": int(n), "mean": mean,
+                "stddev": math.sqrt(max(sq / n - mean * mean, 0.0)), "min": lo, "max": hi,
+            })
+        return {"operations": out}
+
+    return _cached("operations", compute, days)
+
+
+def top_users(db: Session, days: int = 30, n: int = 10, operation: Optional[str] = None) -> Dict[str, Any]:
+    """The ``n`` users with the most calculations in the window, ranked with ``RANK()``."""
+    n = min(max(int(n), 1), ANALYTICS_TOP_N_MAX)
+
+    def compute(start: date, end: date) -> Dict[str, Any]:
+        total = func.sum(DailyRollup.count)
+        per_user = (
+            db.query(
+                DailyRollup.user_id.label("user_id"),
+                total.label("count"),
+                func.count(distinct(DailyRollup.day)).label("active_days"),
+                func.rank().over(order_by=total.desc()).label("rank"),
+            )
+            .filter(DailyRollup.day.between(start, end))
+        )
+        if operation:
+            per_user = per_user.filter(DailyRollup.operation == operation)
+        ranked = per_user.group_by(DailyRollup.user_id).subquery()
+        rows = (
+            db.query(ranked.c.rank, ranked.c.user_id, User.email, ranked.c.count, ranked.c.active_days)
+            .outerjoin(User, User.user_id == ranked.c.user_id)
+            .filter(ranked.c.rank <= n)
+            .order_by(ranked.c.rank, ranked.c.user_id)
+            .all()
+        )
+        return {"operation": operation, "users": [
+            {"rank": rank, "user_id": user_id, "email": email, "count": int(count), "active_days": active_days}
+            for rank, user_id, email, count, active_days in rows
+        ]}
+
+    return _cached("top_users", compute, days, n=n, operation=operation)
+
+
+def daily_active_users(db: Session, days: int = 30) -> Dict[str, Any]:
+    """Distinct users per day, with a moving average over the last seven days that had activity."""
+
+    def compute(start: date, end: date) -> Dict[str, Any]:
+        per_day = (
+            db.query(DailyRollup.day.label("day"), func.count(distinct(DailyRollup.user_id)).label("users"))
+            .filter(DailyRollup.day.between(start, end))
+            .group_by(DailyRollup.day)
+            .subquery()
+        )
+        moving = func.avg(per_day.c.users).over(order_by=per_day.c.day, rows=(-6, 0))
+        rows = db.query(per_day.c.day, per_day.c.users, moving).order_by(per_day.c.day).all()
+        return {"days": [
+            {"day": day.isoformat() if isinstance(day, date) else day, "active_users": users,
+             "moving_average_7": round(float(avg), 3)}
+            for day, users, avg in rows
+        ]}
+
+    return _cached("active_users", compute, days)
+
+
+def result_distribution(db: Session, days: int = 30, operation: Optional[str] = None) -> Dict[str, Any]:
+    """Result counts per value bucket and day."""
+
+    def compute(start: date, end: date) -> Dict[str, Any]:
+        q = (
+            db.query(ResultHistogram.day, ResultHistogram.bucket, func.sum(ResultHistogram.count))
+            .filter(ResultHistogram.day.between(start, end))
+        )
+        if operation:
+            q = q.filter(ResultHistogram.operation == operation)
+        rows = q.group_by(ResultHistogram.day, ResultHistogram.bucket).order_by(
+            ResultHistogram.day, ResultHistogram.bucket
+        )
+        by_day: Dict[str, Dict[str, int]] = {}
+        for day, bucket, count in rows:
+            by_day.setdefault(day.isoformat(), {})[bucket_label(bucket)] = int(count)
+        return {
+            "operation": operation,
+            "buckets": [bucket_label(i) for i in range(len(RESULT_BUCKET_EDGES) + 1)],
+            "days": [{"day": day, "counts": counts} for day, counts in by_day.items()],
+        }
+
+    return _cached("distribution", compute, days, operation=operation)
@@ -0,0 +1,247 @@
+"""Hot/cold archival of old calculations.
+
+With ``ARCHIVE_AFTER_DAYS`` set, calculations whose ``created_at`` is older
+than that many days are moved from ``calculations`` to
+``calculations_archive`` in chunks of ``ARCHIVE_BATCH_SIZE`` rows. Each chunk
+is one transaction that copies the rows, folds them into
+``calculation_archive_rollups`` and deletes the originals, so reports
+(live aggregates + rollups) stay exact at every point.
+
+Archival runs from ``python -m app.cli archive`` or, when
+``ARCHIVE_INTERVAL_SECONDS`` is set, from a background thread in the app.
+
+Reads only touch the archive when the requested time window starts before
+the retention cutoff (see ``calculations_in_window``).
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.models.calculation import Calculation
+from app.models.calculation_archive import ArchiveRollup, CalculationArchive
+from app.services.change_log import DELETE, record_changes
+from app.services.pagination import NO_CREATED_AT
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.05"))
+
+_ARCHIVED_COLUMNS = ("id", "user_id", "type", "a", "b", "result", "expression", "created_at", "updated_at")
+
+
+def archive_cutoff(now: Optional[datetime] = None, days: int = ARCHIVE_AFTER_DAYS) -> Optional[datetime]:
+    """Rows created before this moment belong in the archive (None = disabled)."""
+    if days <= 0:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to ``batch_size`` rows older than ``cutoff``; returns rows moved."""
+    rows = (
+        db.query(Calculation)
+        .filter(Calculation.created_at < cutoff)
+        .order_by(Calculation.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    totals: Dict[Tuple[int, str], List[float]] = {}
+    for row in rows:
+        db.add(CalculationArchive(**{name: getattr(row, name) for name in _ARCHIVED_COLUMNS}))
+        t = totals.setdefault((row.user_id, row.type), [0, 0.0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += row.a
+        t[2] += row.b
+        t[3] += row.result
+
+    for (user_id, operation), (count, sum_a, sum_b, sum_result) in totals.items():
+        rollup = db.get(ArchiveRollup, (user_id, operation))
+        if rollup is None:
+            rollup = ArchiveRollup(user_id=user_id, operation=operation,
+                                   count=0, sum_a=0.0, sum_b=0.0, sum_result=0.0)
+            db.add(rollup)
+        rollup.count += count
+        rollup.sum_a += sum_a
+        rollup.sum_b += sum_b
+        rollup.sum_result += sum_result
+
+    db.query(Calculation).filter(
+        Calculation.id.in_([row.id for row in rows])
+    ).delete(synchronize_session=False)
+    # Archived rows leave the live list, so syncing clients see them as deleted
+    record_changes(db.connection(), [(row.user_id, row.id, DELETE) for row in rows])
+    db.commit()
+    db.expunge_all()
+    return len(rows)
+
+
+def archive_old_calculations(
+    session_factories: Iterable[Callable[[], Session]],
+    cutoff: Optional[datetime] = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    pause: float = ARCHIVE_BATCH_PAUSE_SECONDS,
+    should_stop: Callable[[], bool] = lambda: False,
+) -> int:
+    """Archive every row older than ``cutoff`` on each database, chunk by chunk.
+
+    Sleeps ``pause`` seconds between chunks to leave room for live traffic.
+    """
+    cutoff = cutoff or archive_cutoff()
+    if cutoff is None:
+        return 0
+    total = 0
+    for factory in session_factories:
+        db = factory()
+        try:
+            while not should_stop():
+                moved = archive_batch(db, cutoff, batch_size)
+                total += moved
+                if moved < batch_size:
+                    break
+                time.sleep(pause)
+        finally:
+            db.close()
+    return total
+
+
+def calculations_in_window(
+    db: Session,
+    user_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+    newest_first: bool = True,
+    where: Optional[Callable[[Any], list]] = None,
+    cutoff: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+) -> list:
+    """A user's calculations created in ``[since, until)``.
+
+    Returns ORM objects, or row tuples of ``columns`` (which must include
+    ``id`` and ``created_at``). ``where(model)`` may return extra filter
+    criteria for either table. Without a ``since`` the window is the hot
+    (unarchived) period. The archive is queried only when archival is
+    enabled and ``since`` falls before the retention cutoff.
+
+    ``after`` is a ``(created_at, id)`` keyset position: only rows past it in
+    the chosen order are returned, at most ``limit`` of them. Each page is
+    then an index range scan, however deep it is. Rows without a
+    ``created_at`` sort as if created at ``NO_CREATED_AT``: they are read as
+    a separate segment ordered by id (last newest-first, first otherwise),
+    so NULLs never leave the index order.
+    """
+    cutoff = cutoff or archive_cutoff()
+
+    def _segment(model, undated, position, limit):
+        q = db.query(*[getattr(model, c) for c in columns]) if columns else db.query(model)
+        q = q.filter(model.user_id == user_id)
+        if where is not None:
+            q = q.filter(*where(model))
+        if undated:
+            q = q.filter(model.created_at.is_(None))
+            if position is not None:
+                q = q.filter(model.id < position[1] if newest_first else model.id > position[1])
+            q = q.order_by(model.id.desc() if newest_first else model.id)
+        else:
+            q = q.filter(model.created_at.isnot(None))
+            if since is not None:
+                q = q.filter(model.created_at >= since)
+            if until is not None:
+                q = q.filter(model.created_at < until)
+            if position is not None:
+                key = tuple_(model.created_at, model.id)
+                q = q.filter(key < tuple_(*position) if newest_first else key > tuple_(*position))
+            if newest_first:
+                q = q.order_by(model.created_at.desc(), model.id.desc())
+            else:
+                q = q.order_by(model.created_at, model.id)
+        return q.limit(limit).all() if limit is not None else q.all()
+
+    def _window(model):
+        # A time window has no room for undated rows
+        segments = [False, True] if newest_first else [True, False]
+        if since is not None or until is not None:
+            segments = [False]
+        if after is not None:
+            undated_after = after[0] == NO_CREATED_AT
+            if undated_after not in segments:
+                return []
+            segments = segments[segments.index(undated_after):]
+        rows = []
+        for i, undated in enumerate(segments):
+            remaining = None if limit is None else limit - len(rows)
+            if remaining is not None and remaining <= 0:
+                break
+            rows += _segment(model, undated, after if i == 0 else None, remaining)
+        return rows
+
+    rows = _window(Calculation)
+    if cutoff is not None and since is not None and since < cutoff:
+        rows = list(rows) + list(_window(CalculationArchive))
+        rows.sort(key=lambda c: (c.created_at or NO_CREATED_AT, c.id), reverse=newest_first)
+        if limit is not None:
+            rows = rows[:limit]
+    return rows
+
+
+def archived_totals(db: Session, user_id: int) -> Dict[str, ArchiveRollup]:
+    """Archived rollups for a user keyed by operation (empty when nothing is archived)."""
+    return {
+        r.operation: r
+        for r in db.query(ArchiveRollup).filter(ArchiveRollup.user_id == user_id)
+    }
+
+
+def recent_archived(db: Session, user_id: int, limit: int) -> List[CalculationArchive]:
+    return (
+        db.query(CalculationArchive)
+        .filter(CalculationArchive.user_id == user_id)
+        .order_by(CalculationArchive.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+class ArchiveWorker:
+    """Background thread that runs an archival pass every ``interval`` seconds."""
+
+    def __init__(self, session_factories: Callable[[], Iterable[Callable[[], Session]]],
+                 interval: float = ARCHIVE_INTERVAL_SECONDS):
+        self.session_factories = session_factories
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or archive_cutoff() is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="calculation-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                moved = archive_old_calculations(self.session_factories(), should_stop=self._stop.is_set)
+                if moved:
+                    logger.info("Archived %d calculations", moved)
+            except Exception:
+                logger.exception("Archival pass failed")
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from app.schemas.calculation import CalculationType
+from app.services.calculation_math import compute_result
 
 
 class CalculationStrategy(ABC):
@@ -30,6 +31,18 @@ class DivideStrategy(CalculationStrategy):
         return a / b
 
 
+class PowerStrategy(CalculationStrategy):
+    def calculate(self, a: float, b: float) -> float:
+        return compute_result("pow", a, b)
+
+
+class ModuloStrategy(CalculationStrategy):
+    def calculate(self, a: float, b: float) -> float:
+        if b == 0:
+            raise ZeroDivisionError("Cannot take modulo by zero")
+        return compute_result("mod", a, b)
+
+
 class CalculationFactory:
     @staticmethod
     def get_strategy(calc_type: CalculationType) -> CalculationStrategy:
@@ -41,4 +54,8 @@ class CalculationFactory:
             return MultiplyStrategy()
         if calc_type == CalculationType.DIV:
             return DivideStrategy()
+        if calc_type == CalculationType.POW:
+            return PowerStrategy()
+        if calc_type == CalculationType.MOD:
+            return ModuloStrategy()
         raise ValueError(f"Unsupported calculation type: {calc_type}")
@@ -0,0 +1,118 @@
+"""The single definition of how a calculation's result is computed.
+
+Every write path (router, crud, calculation_service, the strategy factory,
+bulk import) and the recompute audit use these functions, so a stored
+``result`` can always be checked against ``compute_result``.
+
+Semantics:
+
+- ``div`` and ``mod`` by zero are errors.
+- ``mod`` follows Python's floored modulo (the sign of the divisor).
+- ``pow`` is real-valued: a negative base with a fractional exponent is
+  an error, never a complex result.
+- A result that is not finite (overflow, or an infinite operand) is an
+  error for every operation, never ``inf`` or ``nan``.
+- ``expr`` evaluates ``expression`` with ``a`` and ``b`` bound.
+
+``compute_results`` is the vectorized form. Where the scalar form would
+raise, it returns ``nan`` instead.
+"""
+import math
+from typing import Optional, Sequence
+
+try:  # vectorized recomputation is optional
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from app.services.expression import ExpressionError, compile_expression
+
+OPERATIONS = ("add", "sub", "mul", "div", "pow", "mod", "expr")
+
+
+def compute_result(operation, a: float, b: float, expression: Optional[str] = None) -> float:
+    """Result of one calculation; raises ``ValueError`` when it has none."""
+    result = _compute(operation.value if hasattr(operation, "value") else operation, a, b, expression)
+    if not math.isfinite(result):
+        raise ValueError("Result is not a finite number")
+    return result
+
+
+def _compute(operation: str, a: float, b: float, expression: Optional[str]) -> float:
+
+    if operation == "add":
+        return a + b
+    if operation == "sub":
+        return a - b
+    if operation == "mul":
+        return a * b
+    if operation == "div":
+        if b == 0:
+            raise ValueError("Division by zero")
+        return a / b
+    if operation == "mod":
+        if b == 0:
+            raise ValueError("Modulo by zero")
+        return a % b
+    if operation == "pow":
+        try:
+            return math.pow(a, b)
+        except (OverflowError, ValueError):
+            raise ValueError("Power has no real result")
+    if operation == "expr":
+        if not expression:
+            raise ValueError("Expression is required")
+        # ExpressionError is a ValueError
+        return compile_expression(expression).evaluate({"a": a, "b": b})
+    raise ValueError("Unknown operation")
+
+
+def compute_results(
+    operations: Sequence[str],
+    a: Sequence[float],
+    b: Sequence[float],
+    expressions: Optional[Sequence[Optional[str]]] = None,
+) -> "np.ndarray":
+    """Vectorized ``compute_result`` over parallel columns (``nan`` = no result)."""
+    if np is None:
+        raise RuntimeError("Vectorized computation needs numpy: pip install numpy")
+    ops = np.asarray(operations, dtype=object)
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    out = np.full(len(ops), np.nan)
+
+    with np.errstate(all="ignore"):
+        for op in set(ops.tolist()):
+            mask = ops == op
+            x, y = a[mask], b[mask]
+            if op == "add":
+                out[mask] = x + y
+            elif op == "sub":
+                out[mask] = x - y
+            elif op == "mul":
+                out[mask] = x * y
+            elif op == "div":
+                out[mask] = np.where(y == 0, np.nan, x / np.where(y == 0, 1.0, y))
+            elif op == "mod":
+                out[mask] = np.where(y == 0, np.nan, np.mod(x, np.where(y == 0, 1.0, y)))
+            elif op == "pow":
+                out[mask] = np.power(x, y)
+            elif op == "expr" and expressions is not None:
+                out[mask] = _expression_results(np.asarray(expressions, dtype=object)[mask], x, y)
+
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _expression_results(texts, a, b):
+    """One batch evaluation per distinct expression text."""
+    out = np.full(len(texts), np.nan)
+    for text in set(texts.tolist()):
+        if not text:
+            continue
+        mask = texts == text
+        try:
+            out[mask] = compile_expression(text).evaluate_batch({"a": a[mask], "b": b[mask]})
+        except ExpressionError:
+            pass
+    return out
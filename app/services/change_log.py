@@ -0,0 +1,167 @@
+"""Per-shard change log behind ``GET /calculations/changes``.
+
+Every flush that inserts, updates or deletes a ``Calculation`` also writes
+one ``calculation_changes`` row per calculation in the same transaction, so
+the log commits (or rolls back) with the data. Bulk paths that bypass the ORM
+(import, recompute) call ``record_changes``.
+
+Clients sync with an opaque cursor ``"<shard>-<seq>"``. A page holds the
+changes with ``seq`` greater than the cursor, collapsed to one entry per
+calculation: the current row for inserts/updates, a tombstone for deletes.
+A cursor that can no longer be served gets ``reset: true``, and the client
+must refetch the full list. That happens when the user moved to another
+shard or the log was pruned past the cursor. Pruning always keeps the newest
+entry, so the oldest remaining ``seq`` tells how far the log was pruned even
+when nothing changed since.
+
+Sequence numbers are assigned at flush time. On a database with concurrent
+writers (PostgreSQL), a transaction can commit a lower ``seq`` after a
+higher one is already visible. ``CHANGES_SETTLE_SECONDS`` hides changes
+younger than that so such stragglers are not skipped.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.models.calculation import Calculation
+from app.models.calculation_change import CalculationChange
+
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "100"))
+CHANGES_MAX_PAGE_SIZE = int(os.getenv("CHANGES_MAX_PAGE_SIZE", "1000"))
+CHANGES_SETTLE_SECONDS = float(os.getenv("CHANGES_SETTLE_SECONDS", "0"))
+
+INSERT, UPDATE, DELETE = "insert", "update", "delete"
+
+_FIELDS = ("id", "a", "b", "type", "result", "expression", "created_at", "updated_at")
+
+
+def record_changes(connection, changes: Iterable[Tuple[int, int, str]]) -> None:
+    """Log ``(user_id, calculation_id, op)`` triples on ``connection``."""
+    now = datetime.utcnow()
+    rows = [{"user_id": u, "calculation_id": c, "op": op, "changed_at": now} for u, c, op in changes]
+    if rows:
+        connection.execute(CalculationChange.__table__.insert(), rows)
+
+
+def install(session_class=Session) -> None:
+    """Log calculation changes flushed through any ``session_class``."""
+
+    @event.listens_for(session_class, "after_flush")
+    def _log(session, flush_context):
+        changes = []
+        for op, objs in ((INSERT, session.new), (UPDATE, session.dirty), (DELETE, session.deleted)):
+            for obj in objs:
+                if not isinstance(obj, Calculation) or obj.id is None:
+                    continue
+                if op == UPDATE and not session.is_modified(obj):
+                    continue
+                changes.append((obj.user_id, obj.id, op))
+        if changes:
+            record_changes(session.connection(), changes)
+
+
+def encode_cursor(shard: int, seq: int) -> str:
+    return f"{shard}-{seq}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    shard, _, seq = cursor.partition("-")
+    return int(shard), int(seq)
+
+
+def _row(calc) -> Dict[str, Any]:
+    out = {}
+    for name in _FIELDS:
+        value = getattr(calc, name)
+        out[name] = value.isoformat() if isinstance(value, datetime) else value
+    return out
+
+
+def latest_seq(db: Session) -> int:
+    return db.query(func.max(CalculationChange.seq)).scalar() or 0
+
+
+def changes_since(
+    db: Session,
+    user_id: int,
+    shard: int,
+    cursor: Optional[str],
+    limit: int = CHANGES_PAGE_SIZE,
+    settle_seconds: float = CHANGES_SETTLE_SECONDS,
+) -> Dict[str, Any]:
+    """One page of a user's changes after ``cursor`` (see the module docstring)."""
+    limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+    reset = {"changes": [], "cursor": encode_cursor(shard, latest_seq(db)), "has_more": False, "reset": True}
+    if not cursor:
+        return reset
+    try:
+        cursor_shard, since = decode_cursor(cursor)
+    except ValueError:
+        return reset
+    if cursor_shard != shard:
+        return reset
+    oldest = db.query(func.min(CalculationChange.seq)).scalar()
+    if oldest is not None and since < oldest - 1:
+        return reset
+
+    q = db.query(CalculationChange).filter(
+        CalculationChange.user_id == user_id, CalculationChange.seq > since
+    )
+    if settle_seconds > 0:
+        q = q.filter(CalculationChange.changed_at <= datetime.utcnow() - timedelta(seconds=settle_seconds))
+    entries: List[CalculationChange] = q.order_by(CalculationChange.seq).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return {"changes": [], "cursor": cursor, "has_more": False, "reset": False}
+
+    # Collapse to the last change per calculation, keeping commit order
+    last: Dict[int, CalculationChange] = {}
+    inserted = set()
+    for entry in entries:
+        last.pop(entry.calculation_id, None)
+        last[entry.calculation_id] = entry
+        if entry.op == INSERT:
+            inserted.add(entry.calculation_id)
+
+    live_ids = [cid for cid, e in last.items() if e.op != DELETE]
+    rows = {}
+    if live_ids:
+        rows = {
+            c.id: c for c in db.query(Calculation).filter(
+                Calculation.id.in_(live_ids), Calculation.user_id == user_id
+            )
+        }
+
+    changes = []
+    for cid, entry in last.items():
+        calc = rows.get(cid)
+        if entry.op == DELETE or calc is None:
+            changes.append({"seq": entry.seq, "op": DELETE, "id": cid, "calculation": None})
+        else:
+            op = INSERT if cid in inserted else UPDATE
+            changes.append({"seq": entry.seq, "op": op, "id": cid, "calculation": _row(calc)})
+    return {
+        "changes": changes,
+        "cursor": encode_cursor(shard, entries[-1].seq),
+        "has_more": has_more,
+        "reset": False,
+    }
+
+
+def prune_changes(db: Session, before: datetime) -> int:
+    """Drop log entries older than ``before``; clients behind them get ``reset``.
+
+    The newest entry is kept, even when older than ``before``: it marks how
+    far the log was pruned for ``changes_since``.
+    """
+    deleted = (
+        db.query(CalculationChange)
+        .filter(CalculationChange.changed_at < before, CalculationChange.seq < latest_seq(db))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
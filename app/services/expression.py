@@ -0,0 +1,266 @@
+"""Arithmetic expressions such as ``(a + b) * c ^ d``, without ``eval``.
+
+Expressions are tokenized and compiled with a shunting-yard pass into a flat
+postfix plan (a tuple of stack-machine instructions). Plans are cached in an
+LRU keyed by the normalized expression text, so ``"(a+b)*2"`` and
+``"( a + b ) * 2"`` share one entry.
+
+Grammar: numbers, variable names, ``+ - * / % ^`` (``**`` is an alias for
+``^``, which is right-associative and binds tighter than unary minus, so
+``-2 ^ 2 == -4``), unary ``+``/``-``, parentheses and the one-argument
+functions in ``FUNCTIONS``.
+
+``CompiledExpression.evaluate`` works on one set of bindings;
+``evaluate_batch`` runs the same plan over NumPy arrays of bindings.
+"""
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Mapping, Tuple
+
+try:  # batch evaluation is optional
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+EXPRESSION_MAX_LENGTH = int(os.getenv("EXPRESSION_MAX_LENGTH", "1000"))
+EXPRESSION_CACHE_SIZE = int(os.getenv("EXPRESSION_CACHE_SIZE", "1024"))
+
+FUNCTIONS = ("abs", "sqrt", "exp", "log", "sin", "cos", "tan")
+
+# operator -> (precedence, right associative)
+_BINARY = {"+": (1, False), "-": (1, False), "*": (2, False), "/": (2, False), "%": (2, False), "^": (4, True)}
+_UNARY_PRECEDENCE = 3
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|(?P<name>[A-Za-z_]\w*)|(?P<op>\*\*|[-+*/%^()]))"
+)
+
+# Instruction opcodes
+PUSH_CONST, PUSH_VAR, UNARY, BINARY, CALL = range(5)
+
+
+class ExpressionError(ValueError):
+    """The expression is malformed or cannot be evaluated."""
+
+
+def tokenize(text: str) -> List[str]:
+    if len(text) > EXPRESSION_MAX_LENGTH:
+        raise ExpressionError(f"Expression longer than {EXPRESSION_MAX_LENGTH} characters")
+    tokens, pos, text = [], 0, text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            raise ExpressionError(f"Unexpected character {text[pos:].lstrip()[:1]!r}")
+        token = m.group("num") or m.group("name") or m.group("op")
+        tokens.append("^" if token == "**" else token)
+        pos = m.end()
+    if not tokens:
+        raise ExpressionError("Empty expression")
+    return tokens
+
+
+def normalize(text: str) -> str:
+    """Canonical spelling of an expression: its tokens joined by single spaces."""
+    return " ".join(tokenize(text))
+
+
+def _is_number(token: str) -> bool:
+    return token[0].isdigit() or token[0] == "."
+
+
+def _is_name(token: str) -> bool:
+    return token[0].isalpha() or token[0] == "_"
+
+
+def _parse(tokens: List[str]) -> Tuple[tuple, Tuple[str, ...]]:
+    """Shunting-yard: infix tokens -> postfix instructions and variable names."""
+    plan: List[tuple] = []
+    variables: List[str] = []
+    stack: List[tuple] = []  # pending (kind, value) operators, "(" and functions
+    expect_operand = True
+
+    def pop_operator():
+        kind, value = stack.pop()
+        plan.append((UNARY, value) if kind == "unary" else (BINARY, value))
+
+    for i, token in enumerate(tokens):
+        if expect_operand:
+            if _is_number(token):
+                plan.append((PUSH_CONST, float(token)))
+                expect_operand = False
+            elif _is_name(token):
+                if token in FUNCTIONS:
+                    if i + 1 >= len(tokens) or tokens[i + 1] != "(":
+                        raise ExpressionError(f"Function {token!r} needs parentheses")
+                    stack.append(("call", token))
+                else:
+                    plan.append((PUSH_VAR, token))
+                    if token not in variables:
+                        variables.append(token)
+                    expect_operand = False
+            elif token in ("+", "-"):
+                stack.append(("unary", token))
+            elif token == "(":
+                stack.append(("(", None))
+            else:
+                raise ExpressionError(f"Unexpected {token!r}")
+        elif token in _BINARY:
+            prec, right = _BINARY[token]
+            while stack and stack[-1][0] in ("unary", "binary"):
+                top_prec = _UNARY_PRECEDENCE if stack[-1][0] == "unary" else _BINARY[stack[-1][1]][0]
+                if top_prec > prec or (top_prec == prec and not right):
+                    pop_operator()
+                else:
+                    break
+            stack.append(("binary", token))
+            expect_operand = True
+        elif token == ")":
+            while stack and stack[-1][0] != "(":
+                pop_operator()
+            if not stack:
+                raise ExpressionError("Unbalanced parentheses")
+            stack.pop()
+            if stack and stack[-1][0] == "call":
+                plan.append((CALL, stack.pop()[1]))
+        else:
+            raise ExpressionError(f"Unexpected {token!r}")
+
+    if expect_operand:
+        raise ExpressionError("Expression ends with an operator")
+    while stack:
+        if stack[-1][0] in ("(", "call"):
+            raise ExpressionError("Unbalanced parentheses")
+        pop_operator()
+    return tuple(plan), tuple(variables)
+
+
+def _div(x, y):
+    if y == 0:
+        raise ExpressionError("Division by zero")
+    return x / y
+
+
+def _mod(x, y):
+    if y == 0:
+        raise ExpressionError("Modulo by zero")
+    return x % y
+
+
+_SCALAR_BINARY = {
+    "+": float.__add__,
+    "-": float.__sub__,
+    "*": float.__mul__,
+    "/": _div,
+    "%": _mod,
+    "^": math.pow,
+}
+_SCALAR_FUNCTIONS = {
+    "abs": abs, "sqrt": math.sqrt, "exp": math.exp, "log": math.log,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+}
+
+
+class CompiledExpression:
+    """A parsed expression: a flat postfix plan plus the variables it reads."""
+
+    __slots__ = ("text", "plan", "variables")
+
+    def __init__(self, text: str, plan: tuple, variables: Tuple[str, ...]):
+        self.text = text
+        self.plan = plan
+        self.variables = variables
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.text!r})"
+
+    def _check_bindings(self, bindings: Mapping[str, object]) -> None:
+        missing = [v for v in self.variables if v not in bindings]
+        if missing:
+            raise ExpressionError(f"Unbound variable(s): {', '.join(missing)}")
+
+    def evaluate(self, bindings: Mapping[str, float] = None) -> float:
+        bindings = bindings or {}
+        self._check_bindings(bindings)
+        stack: List[float] = []
+        push, pop = stack.append, stack.pop
+        try:
+            for op, arg in self.plan:
+                if op == PUSH_CONST:
+                    push(arg)
+                elif op == PUSH_VAR:
+                    push(float(bindings[arg]))
+                elif op == BINARY:
+                    y = pop()
+                    push(_SCALAR_BINARY[arg](pop(), y))
+                elif op == UNARY:
+                    if arg == "-":
+                        push(-pop())
+                else:
+                    push(float(_SCALAR_FUNCTIONS[arg](pop())))
+        except (OverflowError, ValueError) as exc:
+            if isinstance(exc, ExpressionError):
+                raise
+            raise ExpressionError(str(exc)) from exc
+        result = stack[0]
+        if math.isnan(result) or math.isinf(result):
+            raise ExpressionError("Result is not a finite number")
+        return result
+
+    def evaluate_batch(self, bindings: Mapping[str, object]) -> "np.ndarray":
+        """Evaluate over arrays of bindings (scalars broadcast).
+
+        Follows IEEE semantics instead of raising: division or modulo by zero
+        and domain errors give ``inf``/``nan`` in the affected positions.
+        """
+        if np is None:
+            raise RuntimeError("Batch evaluation needs numpy: pip install numpy")
+        self._check_bindings(bindings)
+        arrays: Dict[str, np.ndarray] = {
+            name: np.asarray(bindings[name], dtype=np.float64) for name in self.variables
+        }
+        stack: list = []
+        push, pop = stack.append, stack.pop
+        with np.errstate(all="ignore"):
+            for op, arg in self.plan:
+                if op == PUSH_CONST:
+                    push(np.float64(arg))
+                elif op == PUSH_VAR:
+                    push(arrays[arg])
+                elif op == BINARY:
+                    y = pop()
+                    push(_NUMPY_BINARY[arg](pop(), y))
+                elif op == UNARY:
+                    if arg == "-":
+                        push(np.negative(pop()))
+                else:
+                    push(getattr(np, "absolute" if arg == "abs" else arg)(pop()))
+        shape = np.broadcast_shapes(*(a.shape for a in arrays.values())) if arrays else ()
+        return np.broadcast_to(np.asarray(stack[0], dtype=np.float64), shape).copy()
+
+
+if np is not None:
+    _NUMPY_BINARY = {
+        "+": np.add, "-": np.subtract, "*": np.multiply,
+        "/": np.true_divide, "%": np.mod, "^": np.power,
+    }
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_normalized(text: str) -> CompiledExpression:
+    plan, variables = _parse(text.split(" "))
+    return CompiledExpression(text, plan, variables)
+
+
+def compile_expression(text: str) -> CompiledExpression:
+    """Parse ``text`` into a plan, reusing a cached plan for the same normalized text."""
+    return _compile_normalized(normalize(text))
+
+
+def evaluate(text: str, bindings: Mapping[str, float] = None) -> float:
+    return compile_expression(text).evaluate(bindings)
+
+
+def cache_info():
+    return _compile_normalized.cache_info()
@@ -0,0 +1,402 @@
+"""Columnar in-memory cache of hot users' calculations.
+
+A few power users make most of the list, search and report reads, and each
+of those repeats the same scan of their rows. With ``HOT_CACHE_MAX_BYTES``
+set, a user's live calculations are loaded on first access into NumPy
+column arrays (id, a, b, operation code, result, created_at) sorted by
+``(created_at, id)``, and those reads are answered from memory:
+
+- a list or search page is a ``searchsorted`` to the time window and keyset
+  position, plus a vectorized mask for the search;
+- the report's per-operation totals are one ``bincount`` per column.
+
+Entries are kept current through the change log (``change_log``): before
+each read, the user's changes logged after the entry's sequence number are
+applied to the arrays in place. That covers every write path, including bulk
+ones and writes made by other workers, for one indexed query that is almost
+always empty. A user who moved shard, fell further behind than
+``HOT_CACHE_MAX_CATCHUP`` changes, or whose position was pruned from the
+log is reloaded.
+
+Entries are evicted least recently used first once they hold more than the
+budget. Windows that reach into the archive still go to the database. The
+cache is per worker process and is off without NumPy.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+try:  # the cache is optional
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db import shard_map
+from app.models.calculation import Calculation
+from app.models.calculation_change import CalculationChange
+from app.services.archive_service import archive_cutoff
+from app.services.calculation_math import OPERATIONS
+from app.services.change_log import CHANGES_SETTLE_SECONDS, DELETE
+from app.services.metrics import metrics
+
+HOT_CACHE_MAX_BYTES = int(os.getenv("HOT_CACHE_MAX_BYTES", "0"))
+HOT_CACHE_MAX_CATCHUP = int(os.getenv("HOT_CACHE_MAX_CATCHUP", "1000"))
+
+_EPOCH = datetime(1970, 1, 1)
+# Fixed cost charged per entry on top of its arrays
+_ENTRY_BYTES = 512
+
+_requests = metrics.counter(
+    "hot_cache_requests_total",
+    "Reads through the hot-user cache by outcome (hit, load, reload, uncacheable)",
+)
+
+
+def _micros(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _datetime(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def _like(pattern: str) -> "re.Pattern":
+    """SQL ``ILIKE`` pattern as a regular expression."""
+    parts = ("." if ch == "_" else ".*" if ch == "%" else re.escape(ch) for ch in pattern)
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+class CachedCalculation:
+    """A row served from the cache, with the attributes the templates and report read."""
+
+    __slots__ = ("id", "a", "b", "type", "result", "expression", "created_at")
+
+    def __init__(self, id, a, b, type, result, expression, created_at):
+        self.id = id
+        self.a = a
+        self.b = b
+        self.type = type
+        self.result = result
+        self.expression = expression
+        self.created_at = created_at
+
+    operand_a = property(lambda self: self.a)
+    operand_b = property(lambda self: self.b)
+    operation = property(lambda self: self.type)
+
+
+class _Entry:
+    """One user's rows: parallel arrays over ``[0, n)``, grown by doubling."""
+
+    COLUMNS = (("ids", "i8"), ("a", "f8"), ("b", "f8"), ("op", "i1"), ("result", "f8"), ("created", "i8"))
+
+    def __init__(self, shard: int):
+        self.lock = threading.Lock()
+        self.shard = shard
+        self.loaded = False
+        self.usable = True
+        self.seq = 0
+        self.n = 0
+        self.expressions: Dict[int, str] = {}
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    @property
+    def nbytes(self) -> int:
+        arrays = sum(getattr(self, name).nbytes for name, _ in self.COLUMNS)
+        return _ENTRY_BYTES + arrays + sum(100 + len(e) for e in self.expressions.values())
+
+    def position(self, created: int, calc_id: int) -> int:
+        """Index of ``(created, calc_id)`` in sort order: the number of rows before it."""
+        lo = int(np.searchsorted(self.created[:self.n], created, "left"))
+        hi = int(np.searchsorted(self.created[:self.n], created, "right"))
+        return lo + int(np.searchsorted(self.ids[lo:hi], calc_id, "left"))
+
+    def insert(self, at: int, values: Tuple) -> None:
+        if self.n == len(self.ids):
+            capacity = max(16, 2 * self.n)
+            for name, dtype in self.COLUMNS:
+                grown = np.empty(capacity, dtype=dtype)
+                grown[:self.n] = getattr(self, name)[:self.n]
+                setattr(self, name, grown)
+        for (name, _), value in zip(self.COLUMNS, values):
+            column = getattr(self, name)
+            column[at + 1:self.n + 1] = column[at:self.n]
+            column[at] = value
+        self.n += 1
+
+    def remove(self, at: int) -> None:
+        for name, _ in self.COLUMNS:
+            column = getattr(self, name)
+            column[at:self.n - 1] = column[at + 1:self.n]
+        self.n -= 1
+
+
+class HotUserCache:
+    """LRU of per-user column arrays under a global byte budget."""
+
+    def __init__(self, max_bytes: int = HOT_CACHE_MAX_BYTES, max_catchup: int = HOT_CACHE_MAX_CATCHUP):
+        self.max_bytes = max_bytes
+        self.max_catchup = max_catchup
+        self.bytes = 0
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        # Operation name <-> int8 code; unknown names get the next code
+        self._operations: List[str] = list(OPERATIONS)
+        self._codes: Dict[str, int] = {name: i for i, name in enumerate(self._operations)}
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None and self.max_bytes > 0
+
+    def users(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    # -- reads -----------------------------------------------------------
+
+    def page(
+        self,
+        db: Session,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 50,
+        search_id: Optional[int] = None,
+        result: Optional[float] = None,
+        operation_like: Optional[str] = None,
+    ) -> Optional[List[CachedCalculation]]:
+        """Newest-first rows like ``calculations_in_window``, or None when the cache cannot answer."""
+        cutoff = archive_cutoff()
+        if not self.enabled or (cutoff is not None and since is not None and since < cutoff):
+            return None
+        entry = self._use(db, user_id)
+        if entry is None:
+            return None
+        with entry.lock:
+            n = entry.n
+            lo = 0 if since is None else int(np.searchsorted(entry.created[:n], _micros(since), "left"))
+            hi = n if until is None else int(np.searchsorted(entry.created[:n], _micros(until), "left"))
+            if after is not None:
+                hi = min(hi, entry.position(_micros(after[0]), after[1]))
+            if hi <= lo:
+                return []
+            if search_id is not None:
+                mask = entry.ids[lo:hi] == search_id
+            elif result is not None:
+                mask = entry.result[lo:hi] == result
+            elif operation_like is not None:
+                pattern = _like(f"%{operation_like}%")
+                codes = [code for code, name in enumerate(self._operations) if pattern.fullmatch(name)]
+                mask = np.isin(entry.op[lo:hi], codes)
+            else:
+                mask = None
+            if mask is None:
+                picked = np.arange(max(lo, hi - limit), hi)
+            else:
+                picked = lo + np.flatnonzero(mask)[-limit:]
+            return self._rows(entry, picked[::-1])
+
+    def report_totals(
+        self, db: Session, user_id: int, recent: int = 5
+    ) -> Optional[Tuple[Dict[str, List[float]], List[CachedCalculation]]]:
+        """Live ``{operation: [count, sum_a, sum_b, sum_result]}`` and the newest ``recent`` rows."""
+        if not self.enabled:
+            return None
+        entry = self._use(db, user_id)
+        if entry is None:
+            return None
+        with entry.lock:
+            n, op = entry.n, entry.op[:entry.n]
+            size = len(self._operations)
+            counts = np.bincount(op, minlength=size)
+            sums = [np.bincount(op, weights=getattr(entry, name)[:n], minlength=size)
+                    for name in ("a", "b", "result")]
+            totals = {
+                self._operations[code]: [int(counts[code])] + [float(s[code]) for s in sums]
+                for code in np.flatnonzero(counts)
+            }
+            return totals, self._rows(entry, np.arange(n - 1, max(n - recent, 0) - 1, -1))
+
+    def _rows(self, entry: _Entry, picked) -> List[CachedCalculation]:
+        columns = [getattr(entry, name)[picked].tolist() for name, _ in entry.COLUMNS]
+        return [
+            CachedCalculation(calc_id, a, b, self._operations[op], result,
+                              entry.expressions.get(calc_id), _datetime(created))
+            for calc_id, a, b, op, result, created in zip(*columns)
+        ]
+
+    # -- loading and catching up -----------------------------------------
+
+    def _use(self, db: Session, user_id: int) -> Optional[_Entry]:
+        """The user's up-to-date entry (loaded on first use), or None if they cannot be cached."""
+        shard = shard_map.shard_for(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.shard != shard:
+                entry = self._entries[user_id] = _Entry(shard)
+            self._entries.move_to_end(user_id)
+
+        with entry.lock:
+            try:
+                if not entry.loaded:
+                    outcome = "load"
+                    self._load(db, user_id, entry)
+                elif not entry.usable:
+                    outcome = "uncacheable"
+                elif not self._catch_up(db, user_id, entry):
+                    outcome = "reload"
+                    self._load(db, user_id, entry)
+                else:
+                    outcome = "hit"
+            except BaseException:
+                with self._lock:
+                    if self._entries.get(user_id) is entry:
+                        self._forget(user_id)
+                raise
+            size = entry.nbytes
+        _requests.inc(result=outcome)
+
+        with self._lock:
+            if self._entries.get(user_id) is not entry:
+                return entry if entry.usable else None  # evicted meanwhile; still answers this read
+            self.bytes += size - self._sizes.get(user_id, 0)
+            self._sizes[user_id] = size
+            # Least recently used first, but never the entry this read is using
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                if oldest == user_id:
+                    break
+                self._forget(oldest)
+            if self.bytes > self.max_bytes:
+                self._forget(user_id)  # larger than the whole budget on its own
+        return entry if entry.usable else None
+
+    def _forget(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+        self.bytes -= self._sizes.pop(user_id, 0)
+
+    def _code(self, operation: str) -> int:
+        code = self._codes.get(operation)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(operation)
+                if code is None:
+                    code = self._codes[operation] = len(self._operations)
+                    self._operations.append(operation)
+        return code
+
+    def _load(self, db: Session, user_id: int, entry: _Entry) -> None:
+        # Read the log position first: a write landing in between is applied again, harmlessly
+        seq = db.query(func.max(CalculationChange.seq)).scalar() or 0
+        rows = (
+            db.query(Calculation.id, Calculation.a, Calculation.b, Calculation.type,
+                     Calculation.result, Calculation.expression, Calculation.created_at)
+            .filter(Calculation.user_id == user_id)
+            .order_by(Calculation.created_at, Calculation.id)
+            .all()
+        )
+        fresh = _Entry(entry.shard)
+        fresh.seq = seq
+        if any(row.created_at is None for row in rows):
+            # The database's NULL ordering is not worth mirroring: these users read from it
+            fresh.usable = False
+        else:
+            fresh.n = len(rows)
+            fresh.ids = np.fromiter((r.id for r in rows), dtype="i8", count=len(rows))
+            fresh.a = np.fromiter((r.a for r in rows), dtype="f8", count=len(rows))
+            fresh.b = np.fromiter((r.b for r in rows), dtype="f8", count=len(rows))
+            fresh.op = np.fromiter((self._code(r.type) for r in rows), dtype="i1", count=len(rows))
+            fresh.result = np.fromiter((r.result for r in rows), dtype="f8", count=len(rows))
+            fresh.created = np.fromiter((_micros(r.created_at) for r in rows), dtype="i8", count=len(rows))
+            fresh.expressions = {r.id: r.expression for r in rows if r.expression is not None}
+        for name in ("usable", "seq", "n", "expressions") + tuple(name for name, _ in _Entry.COLUMNS):
+            setattr(entry, name, getattr(fresh, name))
+        entry.loaded = True
+
+    def _catch_up(self, db: Session, user_id: int, entry: _Entry) -> bool:
+        """Apply the user's logged changes; False when the entry must be reloaded instead."""
+        oldest = db.query(func.min(CalculationChange.seq)).scalar()
+        if oldest is not None and entry.seq < oldest - 1:
+            return False  # pruned past the entry's position
+        changes = (
+            db.query(CalculationChange.seq, CalculationChange.calculation_id,
+                     CalculationChange.op, CalculationChange.changed_at)
+            .filter(CalculationChange.user_id == user_id, CalculationChange.seq > entry.seq)
+            .order_by(CalculationChange.seq)
+            .limit(self.max_catchup + 1)
+            .all()
+        )
+        if not changes:
+            return True
+        if len(changes) > self.max_catchup:
+            return False
+
+        last = {change.calculation_id: change.op for change in changes}
+        live = [calc_id for calc_id, op in last.items() if op != DELETE]
+        rows = {}
+        if live:
+            rows = {
+                row.id: row for row in db.query(
+                    Calculation.id, Calculation.a, Calculation.b, Calculation.type,
+                    Calculation.result, Calculation.expression, Calculation.created_at,
+                ).filter(Calculation.id.in_(live), Calculation.user_id == user_id)
+            }
+        if any(row.created_at is None for row in rows.values()):
+            return False
+        for calc_id in last:
+            self._apply(entry, calc_id, rows.get(calc_id))
+
+        # A change younger than the settle window may still be joined by a lower seq
+        # committed after it, so the position only moves past changes that have settled
+        settled = datetime.utcnow() - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+        for change in changes:
+            if CHANGES_SETTLE_SECONDS > 0 and change.changed_at > settled:
+                break
+            entry.seq = change.seq
+        return True
+
+    def _apply(self, entry: _Entry, calc_id: int, row) -> None:
+        """Make the entry's copy of ``calc_id`` match ``row`` (None = gone)."""
+        found = np.flatnonzero(entry.ids[:entry.n] == calc_id)
+        at = int(found[0]) if len(found) else None
+        if row is None:
+            if at is not None:
+                entry.remove(at)
+            entry.expressions.pop(calc_id, None)
+            return
+
+        created = _micros(row.created_at)
+        values = (row.id, row.a, row.b, self._code(row.type), row.result, created)
+        if at is not None and entry.created[at] == created:
+            for (name, _), value in zip(entry.COLUMNS, values):
+                getattr(entry, name)[at] = value
+        else:
+            if at is not None:
+                entry.remove(at)
+            entry.insert(entry.position(created, calc_id), values)
+        if row.expression is not None:
+            entry.expressions[calc_id] = row.expression
+        else:
+            entry.expressions.pop(calc_id, None)
+
+
+hot_cache = HotUserCache()
+
+metrics.gauge("hot_cache_bytes", "Bytes held by the hot-user calculation cache", read=lambda: hot_cache.bytes)
+metrics.gauge("hot_cache_users", "Users held by the hot-user calculation cache", read=hot_cache.users)
@@ -0,0 +1,290 @@
+"""Bulk import of historical calculations from CSV or JSON Lines.
+
+Each record needs ``a``, ``b`` and ``type`` (or ``operation``), plus
+``user_id`` unless a default is given. It may carry ``expression`` and
+``created_at`` (ISO 8601). Input is streamed and processed in batches:
+
+1. every record is validated with ``CalculationCreate``, and its
+   ``user_id`` checked against ``users`` (one query per batch);
+2. results for the whole batch are computed with ``compute_results``;
+3. accepted rows are routed to their shard and loaded with ``COPY`` on
+   PostgreSQL, or with chunked ``executemany`` inserts inside large
+   transactions elsewhere (SQLite).
+
+Rejected records go to the ``rejects`` stream as JSON lines with the line
+number and the error. When loading finishes, each touched database is
+``ANALYZE``d. Loaded rows are logged to ``calculation_changes`` in the
+same transactions, so syncing clients pick them up. If archival is enabled,
+imported history older than the retention window is then moved to the
+archive (and its rollups) in chunks, instead of one rollup update per row.
+"""
+import csv
+import io
+import json
+import math
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.schemas.calculation import CalculationCreate
+from app.services.archive_service import archive_cutoff, archive_old_calculations
+from app.services.calculation_math import compute_result, compute_results, np
+from app.services.change_log import INSERT, record_changes
+
+CSV = "csv"
+JSONL = "jsonl"
+
+# Table column order used for both COPY and executemany
+_COLUMNS = ("user_id", "operation", "operand_a", "operand_b", "result", "expression", "created_at", "updated_at")
+
+
+def detect_format(path: str) -> str:
+    return JSONL if path.endswith((".jsonl", ".ndjson", ".json")) else CSV
+
+
+def iter_records(source: TextIO, fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """``(line number, record)`` pairs; unparseable JSON lines yield the raw text."""
+    if fmt == CSV:
+        reader = csv.DictReader(source)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(source, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_no, line
+
+
+def validate_record(record: Any, default_user_id: Optional[int], now: datetime) -> Dict[str, Any]:
+    """A record as a ``calculations`` row without its result; raises ``ValueError``/``ValidationError``."""
+    if not isinstance(record, dict):
+        raise ValueError("Not a JSON object")
+    user_id = record.get("user_id")
+    if user_id in (None, ""):
+        user_id = default_user_id
+    if user_id in (None, ""):
+        raise ValueError("user_id is required")
+    calc = CalculationCreate(
+        a=record.get("a", record.get("operand_a")),
+        b=record.get("b", record.get("operand_b")),
+        type=record.get("type") or record.get("operation"),
+        expression=record.get("expression") or None,
+    )
+    created_at = record.get("created_at")
+    created_at = datetime.fromisoformat(created_at) if created_at else now
+    return {
+        "user_id": int(user_id),
+        "operation": calc.type.value,
+        "operand_a": calc.a,
+        "operand_b": calc.b,
+        "expression": calc.expression,
+        "created_at": created_at,
+        "updated_at": now,
+    }
+
+
+def known_user_ids(shard_map, user_ids: Iterable[int]) -> Set[int]:
+    """The ``user_ids`` that exist in ``users`` (on the primary database)."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return set()
+    db = shard_map.directory_session()
+    try:
+        return set(db.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+    finally:
+        db.close()
+
+
+def with_results(rows: List[Dict[str, Any]]) -> List[Optional[float]]:
+    """Results for validated rows (``None`` where there is no valid result)."""
+    if np is not None:
+        values = compute_results(
+            [r["operation"] for r in rows], [r["operand_a"] for r in rows],
+            [r["operand_b"] for r in rows], [r["expression"] for r in rows],
+        )
+        return [None if math.isnan(v) else float(v) for v in values.tolist()]
+    results = []
+    for r in rows:
+        try:
+            results.append(compute_result(r["operation"], r["operand_a"], r["operand_b"], r["expression"]))
+        except ValueError:
+            results.append(None)
+    return results
+
+
+class ExecutemanyLoader:
+    """Chunked multi-row inserts, committing every ``transaction_rows`` rows.
+
+    ``before_commit(connection)`` runs inside each transaction just before it
+    commits; if it raises, the transaction is rolled back.
+    """
+
+    def __init__(self, engine: Engine, transaction_rows: int,
+                 before_commit: Optional[Callable[[Connection], None]] = None):
+        self.engine = engine
+        self.transaction_rows = transaction_rows
+        self.before_commit = before_commit
+        self._conn = engine.connect()
+        self._in_transaction = 0
+        # (user_id, id) of the rows inserted in the open transaction
+        self._inserted: List[Tuple[int, int]] = []
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        calcs = Calculation.__table__
+        return [tuple(r) for r in self._conn.execute(calcs.insert().returning(calcs.c.user_id, calcs.c.id), rows)]
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._inserted += self._insert(rows)
+        self._in_transaction += len(rows)
+        if self._in_transaction >= self.transaction_rows:
+            self._commit()
+
+    def _commit(self) -> None:
+        # Log the loaded rows (and only those) in the same transaction for GET /calculations/changes
+        record_changes(self._conn, [(user_id, calc_id, INSERT) for user_id, calc_id in self._inserted])
+        self._inserted = []
+        if self.before_commit is not None:
+            try:
+                self.before_commit(self._conn)
+            except BaseException:
+                self._conn.rollback()
+                self._in_transaction = 0
+                raise
+        self._conn.commit()
+        self._in_transaction = 0
+
+    def close(self) -> None:
+        if self._in_transaction:
+            self._commit()
+        self._conn.close()
+
+
+class CopyLoader(ExecutemanyLoader):
+    """PostgreSQL ``COPY ... FROM STDIN`` (psycopg 3 or psycopg2).
+
+    COPY cannot return the new ids, so they are drawn from the table's
+    sequence beforehand and copied with the rows.
+    """
+
+    _SQL = f"COPY calculations (id, {', '.join(_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        ids = self._conn.execute(
+            text("SELECT nextval(pg_get_serial_sequence('calculations', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(rows)},
+        ).scalars().all()
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for calc_id, row in zip(ids, rows):
+            # An unquoted empty field is NULL in COPY's csv format
+            writer.writerow([calc_id] + ["" if row[c] is None else row[c] for c in _COLUMNS])
+        cursor = self._conn.connection.dbapi_connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                buf.seek(0)
+                cursor.copy_expert(self._SQL, buf)
+            else:  # psycopg 3
+                with cursor.copy(self._SQL) as copy:
+                    copy.write(buf.getvalue())
+        finally:
+            cursor.close()
+        return [(row["user_id"], calc_id) for calc_id, row in zip(ids, rows)]
+
+
+def loader_for(engine: Engine, transaction_rows: int,
+               before_commit: Optional[Callable[[Connection], None]] = None):
+    if engine.dialect.name == "postgresql":
+        return CopyLoader(engine, transaction_rows, before_commit)
+    return ExecutemanyLoader(engine, transaction_rows, before_commit)
+
+
+def import_calculations(
+    source: TextIO,
+    fmt: str,
+    shard_map,
+    default_user_id: Optional[int] = None,
+    batch_size: int = 5000,
+    transaction_rows: int = 100_000,
+    rejects: Optional[TextIO] = None,
+    log: Callable[[str], None] = lambda msg: None,
+) -> Dict[str, Any]:
+    """Load every valid record from ``source``; returns counts and rows/sec."""
+    started = time.monotonic()
+    stats = {"read": 0, "imported": 0, "rejected": 0}
+    loaders: Dict[int, Any] = {}
+
+    def reject(line_no: int, record: Any, error: str) -> None:
+        stats["rejected"] += 1
+        if rejects is not None:
+            rejects.write(json.dumps({"line": line_no, "record": record, "error": error}, default=str) + "\n")
+
+    def flush(batch: List[Tuple[int, Any]]) -> None:
+        now = datetime.utcnow()
+        accepted, lines = [], []
+        for line_no, record in batch:
+            try:
+                accepted.append(validate_record(record, default_user_id, now))
+                lines.append((line_no, record))
+            except (ValidationError, ValueError, TypeError) as exc:
+                reject(line_no, record, str(exc).splitlines()[-1] if isinstance(exc, ValidationError) else str(exc))
+
+        # Rows for unknown users would be orphans on SQLite and abort the COPY on PostgreSQL
+        users = known_user_ids(shard_map, (row["user_id"] for row in accepted))
+        kept = [(row, line) for row, line in zip(accepted, lines) if row["user_id"] in users]
+        for row, (line_no, record) in zip(accepted, lines):
+            if row["user_id"] not in users:
+                reject(line_no, record, f"Unknown user_id {row['user_id']}")
+        accepted, lines = [row for row, _ in kept], [line for _, line in kept]
+
+        by_shard: Dict[int, List[Dict[str, Any]]] = {}
+        for row, result, (line_no, record) in zip(accepted, with_results(accepted), lines):
+            if result is None:
+                reject(line_no, record, "Calculation has no valid result")
+                continue
+            row["result"] = result
+            by_shard.setdefault(shard_map.shard_for(row["user_id"]), []).append(row)
+
+        for shard, rows in by_shard.items():
+            if shard not in loaders:
+                loaders[shard] = loader_for(shard_map.engines[shard], transaction_rows)
+            loaders[shard].write(rows)
+            stats["imported"] += len(rows)
+
+        elapsed = time.monotonic() - started
+        log(f"{stats['read']} read, {stats['imported']} imported, {stats['rejected']} rejected "
+            f"({stats['read'] / elapsed if elapsed else 0:.0f} rows/s)")
+
+    batch: List[Tuple[int, Any]] = []
+    try:
+        for line_no, record in iter_records(source, fmt):
+            stats["read"] += 1
+            batch.append((line_no, record))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        for loader in loaders.values():
+            loader.close()
+
+    load_seconds = time.monotonic() - started
+    for shard in loaders:
+        with shard_map.engines[shard].begin() as conn:
+            conn.execute(text("ANALYZE calculations"))
+    if archive_cutoff() is not None and loaders:
+        stats["archived"] = archive_old_calculations([shard_map.sessionmakers[s] for s in loaders])
+
+    stats["seconds"] = round(load_seconds, 3)
+    stats["rows_per_second"] = round(stats["imported"] / load_seconds, 1) if load_seconds else None
+    return stats
@@ -0,0 +1,169 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db import shard_map
+from app.models.calculation import Calculation
+
+logger = logging.getLogger(__name__)
+
+# "off"   -> every POST /calculations/add commits on its own (default)
+# "sync"  -> inserts are group-committed, the request waits for its batch
+# "async" -> inserts are group-committed, the request returns immediately
+INGEST_MODE = os.getenv("INGEST_MODE", "off").lower()
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_FLUSH_INTERVAL_MS = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "5"))
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", "10000"))
+# Longest a request waits for room in the queue and, in "sync" mode, for its batch
+INGEST_WAIT_SECONDS = float(os.getenv("INGEST_WAIT_SECONDS", "10"))
+
+_STOP = object()
+
+
+class IngestQueue:
+    """In-process write-behind queue for calculation inserts.
+
+    Validated rows are queued as plain dicts. A single worker thread collects
+    them into batches (closed when ``batch_size`` rows are waiting or
+    ``flush_interval`` seconds have passed since the first one arrived) and
+    inserts each batch inside one transaction per shard. Every submitted row
+    gets a Future that resolves to its new id once the batch has committed.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL_MS / 1000.0,
+        max_queue: int = INGEST_MAX_QUEUE,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="calculation-ingest", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, values: Dict[str, Any], timeout: Optional[float] = None) -> "Future[int]":
+        """Queue one row of ``Calculation`` column values for insertion.
+
+        Blocks when the queue is full, which pushes back on callers instead
+        of growing memory without bound; raises ``queue.Full`` if there is
+        still no room after ``timeout`` seconds.
+        """
+        if not self.running:
+            self.start()
+        future: "Future[int]" = Future()
+        self._queue.put((values, future), timeout=timeout)
+        return future
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Flush everything queued so far and stop the worker."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            if self._thread is thread and not thread.is_alive():
+                self._thread = None
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[Tuple[Dict[str, Any], Future]] = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush_batch(batch)
+
+        # Drain whatever was queued behind the stop marker.
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        for start in range(0, len(leftovers), self.batch_size):
+            self._flush_batch(leftovers[start:start + self.batch_size])
+
+    def _flush_batch(self, batch: List[Tuple[Dict[str, Any], Future]]) -> None:
+        if self.session_factory is not None:
+            self._flush(batch, self.session_factory)
+            return
+        by_shard: Dict[int, List[Tuple[Dict[str, Any], Future]]] = {}
+        for item in batch:
+            by_shard.setdefault(shard_map.shard_for(item[0]["user_id"]), []).append(item)
+        for shard, items in by_shard.items():
+            self._flush(items, shard_map.sessionmakers[shard])
+
+    def _flush(self, batch: List[Tuple[Dict[str, Any], Future]], session_factory: Callable[[], Session]) -> None:
+        db = session_factory()
+        try:
+            rows = [Calculation(**values) for values, _ in batch]
+            db.add_all(rows)
+            db.flush()
+            ids = [row.id for row in rows]
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            error: Optional[Exception] = exc
+        else:
+            error = None
+        finally:
+            db.close()
+
+        if error is None:
+            for (_, future), new_id in zip(batch, ids):
+                future.set_result(new_id)
+        elif len(batch) > 1:
+            # One bad row must not fail its neighbours: retry them one by one.
+            for item in batch:
+                self._flush([item], session_factory)
+        else:
+            values, future = batch[0]
+            logger.error("Failed to insert queued calculation %r: %s", values, error)
+            future.set_exception(error)
+
+
+ingest_queue = IngestQueue()
+
+
+def ingest_enabled() -> bool:
+    return INGEST_MODE in ("sync", "async")
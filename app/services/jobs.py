@@ -0,0 +1,701 @@
+"""Asynchronous jobs for bulk work that does not fit in a request.
+
+``POST /jobs`` stores a job in the ``jobs`` table and returns at once; the
+client polls ``GET /jobs/{id}`` and downloads the result when it is done.
+Three kinds exist:
+
+- ``compute``: validate and compute a batch of calculations, result as
+  JSON Lines. With ``save`` the valid ones are stored too, one transaction
+  per chunk (chunks saved before a cancellation stay). The job's
+  ``saved_items`` moves forward in the same transaction (right after it
+  when the user's calculations are on another shard), so a requeued run
+  skips the chunks already stored;
+- ``export``: the user's calculations in a window, as JSON, columnar JSON
+  or MessagePack;
+- ``report``: the full report, recomputed over live and archived rows.
+
+Every app worker runs a ``JobRunner``: a thread that claims queued jobs with
+a conditional ``UPDATE`` (so two workers never run the same job) and runs
+them in a local process pool. The table is the queue, so there is no broker.
+At most ``JOB_MAX_RUNNING_PER_USER`` jobs of a user run at once; further
+ones wait. A user may have ``JOB_MAX_ACTIVE_PER_USER`` jobs queued or running.
+
+The job process reports progress to the table between chunks and stops
+there when the job was cancelled. Each claim bumps ``attempts``; every write
+from the job process is fenced on it, so a run that lost its claim cannot
+overwrite the next one. The runner refreshes ``heartbeat_at`` of the jobs it
+owns. A running job whose heartbeat is older than ``JOB_STALE_SECONDS`` lost
+its worker (crash, restart) and is requeued, up to ``JOB_MAX_ATTEMPTS``
+runs. Finished jobs and their result files are deleted after
+``JOB_RESULT_TTL_HOURS``.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.models.job import Job
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_RUNNING_PER_USER = int(os.getenv("JOB_MAX_RUNNING_PER_USER", "1"))
+JOB_MAX_ACTIVE_PER_USER = int(os.getenv("JOB_MAX_ACTIVE_PER_USER", "10"))
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "100000"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RESULT_TTL_HOURS = float(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+JOB_RESULTS_DIR = os.path.abspath(os.getenv("JOB_RESULTS_DIR", "job_results"))
+
+JOB_CHUNK_SIZE = 5000
+# Progress is written at most this often (the final update always is)
+_PROGRESS_INTERVAL = 0.5
+_PRUNE_INTERVAL = 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+EXPORT_FORMATS = ("json", "columnar", "msgpack")
+
+_finished = metrics.counter("jobs_finished_total", "Jobs finished by this worker, by kind and status")
+
+
+class JobError(ValueError):
+    """The job cannot be submitted as given (unknown kind, bad params)."""
+
+
+class JobLimitError(JobError):
+    """The user already has ``JOB_MAX_ACTIVE_PER_USER`` unfinished jobs."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it was cancelled or its claim was lost."""
+
+
+# -----------------------------
+# Job process side
+# -----------------------------
+class JobContext:
+    """What a running job uses to report progress and write its result."""
+
+    def __init__(self, db: Session, job: Job, attempt: int, results_dir: str):
+        self.db = db
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.kind = job.kind
+        self.attempt = attempt
+        self.saved_items = job.saved_items or 0
+        self.results_dir = results_dir
+        self._last_progress = 0.0
+
+    def _owned(self):
+        return self.db.query(Job).filter(
+            Job.id == self.job_id, Job.status == RUNNING, Job.attempts == self.attempt
+        )
+
+    def progress(self, fraction: float, detail: Optional[str] = None, force: bool = False) -> None:
+        """Record progress; raises ``JobCancelled`` if the job should stop."""
+        now = time.monotonic()
+        if not force and now - self._last_progress < _PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        values = {"progress": round(min(max(fraction, 0.0), 1.0), 4)}
+        if detail is not None:
+            values["detail"] = detail[:200]
+        updated = self._owned().update(values, synchronize_session=False)
+        cancel = self.db.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar()
+        self.db.commit()
+        if not updated or cancel:
+            raise JobCancelled()
+
+    def checkpoint(self, saved_items: int, connection=None) -> None:
+        """Record that the first ``saved_items`` inputs are stored; raises ``JobCancelled`` if the claim was lost.
+
+        With ``connection`` the update joins that connection's transaction;
+        otherwise it is flushed on ``db`` for the caller to commit.
+        """
+        if connection is not None:
+            updated = connection.execute(
+                update(Job)
+                .where(Job.id == self.job_id, Job.status == RUNNING, Job.attempts == self.attempt)
+                .values(saved_items=saved_items)
+            ).rowcount
+        else:
+            updated = self._owned().update({"saved_items": saved_items}, synchronize_session=False)
+        if not updated:
+            raise JobCancelled()
+        self.saved_items = saved_items
+
+    def result_path(self, extension: str) -> str:
+        os.makedirs(self.results_dir, exist_ok=True)
+        return os.path.join(self.results_dir, f"{self.job_id}{extension}")
+
+    def finish(self, status: str, **values) -> bool:
+        values.update(status=status, finished_at=datetime.utcnow())
+        if status == SUCCEEDED:
+            values["progress"] = 1.0
+        updated = self._owned().update(values, synchronize_session=False)
+        self.db.commit()
+        return bool(updated)
+
+
+def _write_atomic(path: str, write: Callable[[Any], None], mode: str = "w") -> None:
+    tmp = path + ".part"
+    try:
+        with open(tmp, mode) as f:
+            write(f)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def _parse_datetime(value: Any, name: str) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise JobError(f"{name} must be an ISO 8601 datetime")
+
+
+def _isoformat(value: datetime) -> str:
+    return value.isoformat()
+
+
+def _check_compute(params: Dict[str, Any]) -> None:
+    items = params.get("calculations")
+    if not isinstance(items, list) or not items:
+        raise JobError("params.calculations must be a non-empty list")
+    if len(items) > JOB_MAX_ITEMS:
+        raise JobError(f"At most {JOB_MAX_ITEMS} calculations per job")
+
+
+def _run_compute(ctx: JobContext, params: Dict[str, Any]) -> Tuple[str, str]:
+    """One JSON line per input, ``{"index", "result"}`` or ``{"index", "error"}``."""
+    from pydantic import ValidationError
+
+    from app.db import shard_map
+    from app.services.import_service import loader_for, validate_record, with_results
+
+    items = params["calculations"]
+    save = bool(params.get("save"))
+    loader = None
+    # Inputs stored once this chunk commits
+    position = {"end": 0}
+    on_primary = shard_map.shard_for(ctx.user_id) == 0
+    if save:
+        def checkpoint(connection) -> None:
+            # The jobs table is on the primary: there the checkpoint commits with the chunk
+            ctx.checkpoint(position["end"], connection if on_primary else None)
+
+        # transaction_rows=1: each chunk commits on its own, before progress is reported
+        loader = loader_for(
+            shard_map.engines[shard_map.shard_for(ctx.user_id)], transaction_rows=1, before_commit=checkpoint
+        )
+    path = ctx.result_path(".jsonl")
+    counts = {"computed": 0, "rejected": 0}
+
+    def write(out) -> None:
+        for start in range(0, len(items), JOB_CHUNK_SIZE):
+            now = datetime.utcnow()
+            lines: Dict[int, Dict[str, Any]] = {}
+            accepted, indexes = [], []
+            for index, record in enumerate(items[start:start + JOB_CHUNK_SIZE], start=start):
+                try:
+                    if isinstance(record, dict):
+                        # Never another user's: the owner is the job's user
+                        record = {k: v for k, v in record.items() if k != "user_id"}
+                    accepted.append(validate_record(record, ctx.user_id, now))
+                    indexes.append(index)
+                except ValidationError as exc:
+                    lines[index] = {"index": index, "error": exc.errors()[0]["msg"]}
+                except (ValueError, TypeError) as exc:
+                    lines[index] = {"index": index, "error": str(exc)}
+
+            saved = []
+            for index, row, result in zip(indexes, accepted, with_results(accepted)):
+                if result is None:
+                    lines[index] = {"index": index, "error": "Calculation has no valid result"}
+                    continue
+                lines[index] = {"index": index, "result": result}
+                row["result"] = result
+                saved.append(row)
+            done = min(start + JOB_CHUNK_SIZE, len(items))
+            # Chunks an earlier attempt stored are only written to the result
+            if loader is not None and saved and done > ctx.saved_items:
+                position["end"] = done
+                loader.write(saved)
+                if not on_primary:
+                    ctx.db.commit()
+
+            for index in sorted(lines):
+                out.write(json.dumps(lines[index]) + "\n")
+            counts["computed"] += len(saved)
+            counts["rejected"] += len(lines) - len(saved)
+            ctx.progress(done / len(items), f"{counts['computed']} computed, {counts['rejected']} rejected")
+
+    try:
+        _write_atomic(path, write)
+    finally:
+        if loader is not None:
+            loader.close()
+    return path, "application/x-ndjson"
+
+
+def _check_export(params: Dict[str, Any]) -> None:
+    if params.get("format", "json") not in EXPORT_FORMATS:
+        raise JobError(f"params.format must be one of {', '.join(EXPORT_FORMATS)}")
+    _parse_datetime(params.get("since"), "params.since")
+    _parse_datetime(params.get("until"), "params.until")
+
+
+def _window_count(db: Session, user_id: int, since: Optional[datetime], until: Optional[datetime]) -> int:
+    """How many rows ``calculations_in_window`` will return (for progress)."""
+    from app.models.calculation import Calculation
+    from app.models.calculation_archive import CalculationArchive
+    from app.services.archive_service import archive_cutoff
+
+    def count(model) -> int:
+        q = db.query(func.count(model.id)).filter(model.user_id == user_id)
+        if since is not None:
+            q = q.filter(model.created_at >= since)
+        if until is not None:
+            q = q.filter(model.created_at < until)
+        return q.scalar() or 0
+
+    cutoff = archive_cutoff()
+    total = count(Calculation)
+    if cutoff is not None and since is not None and since < cutoff:
+        total += count(CalculationArchive)
+    return total
+
+
+def _run_export(ctx: JobContext, params: Dict[str, Any]) -> Tuple[str, str]:
+    """The window in keyset-paginated chunks, oldest first, like ``GET /calculations/export``."""
+    from app.db import shard_map
+    from app.schemas.calculation import CalculationOut
+    from app.services.archive_service import calculations_in_window
+    from app.services.response_formats import (
+        CALCULATION_COLUMNS, COLUMNAR, COLUMNAR_MEDIA_TYPE, MSGPACK, MSGPACK_MEDIA_TYPES,
+        encode_columnar_json, encode_msgpack,
+    )
+
+    fmt = params.get("format", "json")
+    since = _parse_datetime(params.get("since"), "params.since")
+    until = _parse_datetime(params.get("until"), "params.until")
+    names = list(CALCULATION_COLUMNS)
+    db = shard_map.sessionmakers[shard_map.shard_for(ctx.user_id)]()
+    try:
+        total = _window_count(db, ctx.user_id, since, until)
+        rows: List[Any] = []
+
+        def chunks():
+            after, done = None, 0
+            while True:
+                chunk = calculations_in_window(
+                    db, ctx.user_id, since, until, columns=names, newest_first=False,
+                    after=after, limit=JOB_CHUNK_SIZE,
+                )
+                db.commit()  # don't hold a read transaction open between chunks
+                if not chunk:
+                    return
+                yield chunk
+                done += len(chunk)
+                ctx.progress(done / total if total else 1.0, f"{done} of {total} rows")
+                if len(chunk) < JOB_CHUNK_SIZE:
+                    return
+                after = (chunk[-1][names.index("created_at")], chunk[-1][0])
+
+        if fmt == "json":
+            path = ctx.result_path(".json")
+
+            def write(out) -> None:
+                out.write("[")
+                first = True
+                for chunk in chunks():
+                    for row in chunk:
+                        body = json.dumps(CalculationOut(**dict(zip(names, row))).dict(), default=_isoformat)
+                        out.write(body if first else "," + body)
+                        first = False
+                out.write("]")
+
+            _write_atomic(path, write)
+            return path, "application/json"
+
+        # The columnar encodings need every row at once
+        for chunk in chunks():
+            rows.extend(chunk)
+        if fmt == MSGPACK:
+            path = ctx.result_path(".msgpack")
+            _write_atomic(path, lambda out: out.write(encode_msgpack(rows)), "wb")
+            return path, MSGPACK_MEDIA_TYPES[0]
+        assert fmt == COLUMNAR
+        path = ctx.result_path(".json")
+        _write_atomic(path, lambda out: out.write(encode_columnar_json(rows)), "wb")
+        return path, COLUMNAR_MEDIA_TYPE
+    finally:
+        db.close()
+
+
+def _check_report(params: Dict[str, Any]) -> None:
+    recent = params.get("recent", 5)
+    if not isinstance(recent, int) or not 0 <= recent <= 1000:
+        raise JobError("params.recent must be an integer between 0 and 1000")
+
+
+def _run_report(ctx: JobContext, params: Dict[str, Any]) -> Tuple[str, str]:
+    from app.db import shard_map
+    from app.services.report_service import generate_report
+
+    db = shard_map.sessionmakers[shard_map.shard_for(ctx.user_id)]()
+    try:
+        report = generate_report(db, ctx.user_id, limit=params.get("recent", 5))
+    finally:
+        db.close()
+    ctx.progress(0.9, force=True)
+    path = ctx.result_path(".json")
+    _write_atomic(path, lambda out: json.dump(report, out))
+    return path, "application/json"
+
+
+# kind -> (check params at submit time, run in the job process)
+KINDS: Dict[str, Tuple[Callable[[Dict[str, Any]], None], Callable[[JobContext, Dict[str, Any]], Tuple[str, str]]]] = {
+    "compute": (_check_compute, _run_compute),
+    "export": (_check_export, _run_export),
+    "report": (_check_report, _run_report),
+}
+
+
+def execute_job(job_id: str, attempt: int, results_dir: str = JOB_RESULTS_DIR) -> str:
+    """Run one claimed job to the end; runs in a pool process. Returns the final status."""
+    from app.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return FAILED
+        ctx = JobContext(db, job, attempt, results_dir)
+        params = json.loads(job.params or "{}")
+        db.commit()
+        try:
+            path, media_type = KINDS[job.kind][1](ctx, params)
+        except JobCancelled:
+            db.rollback()
+            ctx.finish(CANCELLED)
+            return CANCELLED
+        except Exception as exc:
+            logger.exception("Job %s failed", job_id)
+            db.rollback()
+            ctx.finish(FAILED, error=f"{type(exc).__name__}: {exc}"[:2000])
+            return FAILED
+        if not ctx.finish(SUCCEEDED, result_path=path, result_media_type=media_type):
+            return CANCELLED  # the claim was lost while finishing
+        return SUCCEEDED
+    finally:
+        db.close()
+
+
+# -----------------------------
+# API side
+# -----------------------------
+def submit_job(db: Session, user_id: int, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+    """Queue a job; raises ``JobError`` for bad input and ``JobLimitError`` over the limit."""
+    if kind not in KINDS:
+        raise JobError(f"Unknown job kind: {kind}")
+    params = params or {}
+    KINDS[kind][0](params)
+    active = (
+        db.query(func.count(Job.id))
+        .filter(Job.user_id == user_id, Job.status.in_(ACTIVE))
+        .scalar()
+    )
+    if active >= JOB_MAX_ACTIVE_PER_USER:
+        raise JobLimitError(f"At most {JOB_MAX_ACTIVE_PER_USER} unfinished jobs per user")
+    job = Job(
+        id=uuid.uuid4().hex, user_id=user_id, kind=kind, params=json.dumps(params),
+        status=QUEUED, progress=0.0, attempts=0, cancel_requested=False,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def get_job(db: Session, user_id: int, job_id: str) -> Optional[Job]:
+    return db.query(Job).filter(Job.id == job_id, Job.user_id == user_id).first()
+
+
+def list_jobs(db: Session, user_id: int, limit: int = 50) -> List[Job]:
+    return (
+        db.query(Job)
+        .filter(Job.user_id == user_id)
+        .order_by(Job.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def cancel_job(db: Session, job: Job) -> Job:
+    """Cancel a queued job at once; a running one stops at its next progress report."""
+    now = datetime.utcnow()
+    cancelled = (
+        db.query(Job)
+        .filter(Job.id == job.id, Job.status == QUEUED)
+        .update({"status": CANCELLED, "cancel_requested": True, "finished_at": now}, synchronize_session=False)
+    )
+    if not cancelled:
+        db.query(Job).filter(Job.id == job.id, Job.status == RUNNING).update(
+            {"cancel_requested": True}, synchronize_session=False
+        )
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+class JobRunner:
+    """Claims queued jobs and runs them in a process pool (inline when ``workers`` <= 0)."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_SECONDS,
+        stale_seconds: float = JOB_STALE_SECONDS,
+        max_running_per_user: int = JOB_MAX_RUNNING_PER_USER,
+        results_dir: str = JOB_RESULTS_DIR,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.max_running_per_user = max_running_per_user
+        self.results_dir = results_dir
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # job id -> (attempt, kind) of the jobs this runner owns
+        self._running: Dict[str, Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def wake(self) -> None:
+        """Dispatch now rather than at the next poll (called after a submit)."""
+        self._wake.set()
+
+    # -- one pass --------------------------------------------------------
+
+    def run_once(self) -> int:
+        """Heartbeat, recover, prune and dispatch once; returns how many jobs were started."""
+        db = self.session_factory()
+        try:
+            self._heartbeat(db)
+            self.recover(db)
+            if time.monotonic() - self._last_prune >= _PRUNE_INTERVAL:
+                self.prune(db)
+                self._last_prune = time.monotonic()
+            claimed = self._claim(db)
+        finally:
+            db.close()
+        for job_id, attempt, kind in claimed:
+            self._start(job_id, attempt, kind)
+        return len(claimed)
+
+    def _heartbeat(self, db: Session) -> None:
+        with self._lock:
+            owned = list(self._running)
+        if owned:
+            db.query(Job).filter(Job.id.in_(owned), Job.status == RUNNING).update(
+                {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+
+    def recover(self, db: Session) -> int:
+        """Requeue (or fail) running jobs whose worker stopped heartbeating."""
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        with self._lock:
+            owned = set(self._running)
+        stale = [
+            job for job in db.query(Job).filter(Job.status == RUNNING, Job.heartbeat_at < stale_before)
+            if job.id not in owned
+        ]
+        for job in stale:
+            self._release(db, job.id, job.attempts, "Worker lost while running the job")
+        return len(stale)
+
+    def _release(self, db: Session, job_id: str, attempt: int, error: str) -> None:
+        """Give a job whose run died back to the queue, or fail it after too many runs."""
+        job = db.get(Job, job_id)
+        if job is None or job.status != RUNNING or job.attempts != attempt:
+            return
+        if job.cancel_requested:
+            values = {"status": CANCELLED, "finished_at": datetime.utcnow()}
+        elif attempt >= JOB_MAX_ATTEMPTS:
+            values = {"status": FAILED, "error": error, "finished_at": datetime.utcnow()}
+        else:
+            values = {"status": QUEUED, "progress": 0.0, "detail": None}
+        db.query(Job).filter(Job.id == job_id, Job.status == RUNNING, Job.attempts == attempt).update(
+            values, synchronize_session=False
+        )
+        db.commit()
+        logger.warning("Job %s (attempt %d): %s -> %s", job_id, attempt, error, values["status"])
+
+    def prune(self, db: Session) -> int:
+        """Delete jobs (and result files) finished more than ``JOB_RESULT_TTL_HOURS`` ago."""
+        before = datetime.utcnow() - timedelta(hours=JOB_RESULT_TTL_HOURS)
+        old = db.query(Job).filter(Job.status.in_(FINISHED), Job.finished_at < before).all()
+        for job in old:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            db.delete(job)
+        db.commit()
+        return len(old)
+
+    def _claim(self, db: Session) -> List[Tuple[str, int, str]]:
+        free = max(self.workers, 1) - self.running()
+        if free <= 0:
+            return []
+        running_by_user = dict(
+            db.query(Job.user_id, func.count(Job.id))
+            .filter(Job.status == RUNNING)
+            .group_by(Job.user_id)
+            .all()
+        )
+        candidates = (
+            db.query(Job.id, Job.user_id, Job.attempts, Job.kind)
+            .filter(Job.status == QUEUED)
+            .order_by(Job.created_at, Job.id)
+            .limit(free * 10)
+            .all()
+        )
+        claimed = []
+        now = datetime.utcnow()
+        for job_id, user_id, attempts, kind in candidates:
+            if len(claimed) >= free:
+                break
+            if running_by_user.get(user_id, 0) >= self.max_running_per_user:
+                continue
+            # Only one worker's UPDATE matches a queued row
+            won = (
+                db.query(Job)
+                .filter(Job.id == job_id, Job.status == QUEUED)
+                .update(
+                    {"status": RUNNING, "attempts": attempts + 1, "started_at": now,
+                     "heartbeat_at": now, "error": None},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if won:
+                running_by_user[user_id] = running_by_user.get(user_id, 0) + 1
+                claimed.append((job_id, attempts + 1, kind))
+        return claimed
+
+    def _start(self, job_id: str, attempt: int, kind: str) -> None:
+        with self._lock:
+            self._running[job_id] = (attempt, kind)
+        if self.workers <= 0:
+            try:
+                status = execute_job(job_id, attempt, self.results_dir)
+            except Exception as exc:
+                self._done(job_id, exc=exc)
+            else:
+                self._done(job_id, status=status)
+            return
+        try:
+            future = self._executor.submit(execute_job, job_id, attempt, self.results_dir)
+        except BrokenProcessPool:
+            # A job process died and took the pool with it
+            self._executor = self._new_executor()
+            future = self._executor.submit(execute_job, job_id, attempt, self.results_dir)
+        future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+
+    def _finished(self, job_id: str, future: Future) -> None:
+        exc = future.exception()
+        self._done(job_id, status=None if exc else future.result(), exc=exc)
+        self._wake.set()  # a slot is free
+
+    def _done(self, job_id: str, status: Optional[str] = None, exc: Optional[BaseException] = None) -> None:
+        with self._lock:
+            attempt, kind = self._running.pop(job_id)
+        if exc is None:
+            _finished.inc(kind=kind, status=status)
+            return
+        # The job process died (killed, out of memory) or the pool broke
+        logger.error("Job %s crashed: %r", job_id, exc)
+        _finished.inc(kind=kind, status="crashed")
+        db = self.session_factory()
+        try:
+            self._release(db, job_id, attempt, f"Job process died: {type(exc).__name__}")
+        finally:
+            db.close()
+
+    # -- background thread -----------------------------------------------
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Fresh interpreters: forking a threaded server can copy held locks
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if self.workers > 0:
+            self._executor = self._new_executor()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop claiming jobs; unfinished ones are picked up again after a restart."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Job runner pass failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+def _session():
+    from app.db import SessionLocal
+
+    return SessionLocal()
+
+
+job_runner = JobRunner(_session)
+metrics.gauge("jobs_running", "Jobs this worker is running right now", read=job_runner.running)
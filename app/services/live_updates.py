@@ -0,0 +1,248 @@
+"""Push calculation changes to connected browsers (``GET /calculations/stream``).
+
+After every commit that created, updated or deleted calculations, the
+changes are published per user. Each worker fans them out to that user's
+open streams, then recomputes the user's report once and pushes it too.
+
+- An idle stream is an ``asyncio.Queue`` and a suspended generator. It runs
+  no queries; the report is computed once per (worker, user, burst of
+  writes), never once per connection.
+- Publishing is in-process by default. With ``LIVE_UPDATES_REDIS_URL`` set,
+  messages go through a Redis pub/sub channel, so a write on one worker
+  reaches streams held by every worker. Any object with
+  ``publish(message)`` and ``start(deliver)`` can be plugged in instead.
+- A stream that falls ``LIVE_UPDATES_QUEUE_SIZE`` events behind is cleared
+  and sent a single ``resync`` event telling the client to refetch.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import anyio
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models.calculation import Calculation
+
+logger = logging.getLogger(__name__)
+
+LIVE_UPDATES_REDIS_URL = os.getenv("LIVE_UPDATES_REDIS_URL")
+LIVE_UPDATES_CHANNEL = os.getenv("LIVE_UPDATES_CHANNEL", "calculations:live")
+LIVE_UPDATES_QUEUE_SIZE = int(os.getenv("LIVE_UPDATES_QUEUE_SIZE", "64"))
+LIVE_UPDATES_HEARTBEAT_SECONDS = float(os.getenv("LIVE_UPDATES_HEARTBEAT_SECONDS", "15"))
+
+_FIELDS = ("id", "type", "a", "b", "result", "expression", "created_at", "updated_at")
+
+
+def _serialize(obj: Calculation) -> Dict[str, Any]:
+    # Read the already-loaded state so serializing never triggers a query
+    values = inspect(obj).dict
+    out = {}
+    for name in _FIELDS:
+        value = values.get(name)
+        out[name] = value.isoformat() if isinstance(value, datetime) else value
+    return out
+
+
+class LocalBroadcast:
+    """Delivers straight to this process's subscribers."""
+
+    def __init__(self):
+        self._deliver: Callable[[Dict[str, Any]], None] = lambda message: None
+
+    def start(self, deliver: Callable[[Dict[str, Any]], None]) -> None:
+        self._deliver = deliver
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self._deliver(message)
+
+
+class RedisBroadcast:
+    """Relays messages through a Redis pub/sub channel to every worker."""
+
+    def __init__(self, url: str, channel: str = LIVE_UPDATES_CHANNEL):
+        import redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self.channel = channel
+
+    def start(self, deliver: Callable[[Dict[str, Any]], None]) -> None:
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        def _listen():
+            for item in pubsub.listen():
+                try:
+                    deliver(json.loads(item["data"]))
+                except Exception:
+                    logger.exception("Dropping malformed live update")
+
+        threading.Thread(target=_listen, name="live-updates-redis", daemon=True).start()
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self._redis.publish(self.channel, json.dumps(message))
+
+
+def _load_report(user_id: int) -> Dict[str, Any]:
+    from app.db import shard_map
+    from app.services.report_service import generate_report
+    from app.services.single_flight import single_flight
+
+    def load():
+        db = shard_map.sessionmakers[shard_map.shard_for(user_id)]()
+        try:
+            return generate_report(db, user_id=user_id)
+        finally:
+            db.close()
+
+    # Shares the query with a concurrent GET /calculations/report
+    return single_flight.do(single_flight.key(user_id, "report"), load)
+
+
+class LiveUpdates:
+    """Per-user fan-out of change events to open streams."""
+
+    def __init__(
+        self,
+        broadcast=None,
+        queue_size: int = LIVE_UPDATES_QUEUE_SIZE,
+        report_loader: Optional[Callable[[int], Dict[str, Any]]] = _load_report,
+    ):
+        self.queue_size = queue_size
+        self.report_loader = report_loader
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reports_pending: Set[int] = set()
+        self._broadcast = None
+        self.set_broadcast(broadcast or LocalBroadcast())
+
+    def set_broadcast(self, broadcast) -> None:
+        self._broadcast = broadcast
+        broadcast.start(self.deliver)
+
+    # -- streams ---------------------------------------------------------
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Register a stream; must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def connections(self) -> int:
+        return sum(len(q) for q in self._subscribers.values())
+
+    # -- publishing ------------------------------------------------------
+
+    def publish(self, user_id: int, events: List[Dict[str, Any]]) -> None:
+        """Announce committed changes; safe to call from any thread."""
+        self._broadcast.publish({"user_id": user_id, "events": events})
+
+    def deliver(self, message: Dict[str, Any]) -> None:
+        """Hand a broadcast message to this process's streams (any thread)."""
+        loop = self._loop
+        if loop is None or message["user_id"] not in self._subscribers or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message: Dict[str, Any]) -> None:
+        user_id = message["user_id"]
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        for item in message["events"]:
+            for queue in queues:
+                self._offer(queue, item)
+        if self.report_loader is not None and user_id not in self._reports_pending:
+            self._reports_pending.add(user_id)
+            asyncio.ensure_future(self._push_report(user_id))
+
+    async def _push_report(self, user_id: int) -> None:
+        # Yield once so a burst of commits collapses into one report query
+        await asyncio.sleep(0)
+        self._reports_pending.discard(user_id)
+        try:
+            report = await anyio.to_thread.run_sync(self.report_loader, user_id)
+        except Exception:
+            logger.exception("Could not refresh the report for live updates")
+            return
+        for queue in self._subscribers.get(user_id, ()):
+            self._offer(queue, {"event": "report", "data": report})
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, item: Dict[str, Any]) -> None:
+        if queue.full():
+            while not queue.empty():
+                queue.get_nowait()
+            item = {"event": "resync", "data": None}
+        queue.put_nowait(item)
+
+    # -- ORM hooks -------------------------------------------------------
+
+    def install(self, session_class=Session) -> None:
+        """Publish calculation changes committed through any ``session_class``."""
+        key = f"live_changes:{id(self)}"
+
+        @event.listens_for(session_class, "after_flush")
+        def _collect(session, flush_context):
+            changes = session.info.setdefault(key, [])
+            for kind, objs in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+                for obj in objs:
+                    if isinstance(obj, Calculation) and obj.user_id is not None:
+                        if kind == "updated" and not session.is_modified(obj):
+                            continue
+                        changes.append((obj.user_id, {"event": kind, "data": _serialize(obj)}))
+
+        @event.listens_for(session_class, "after_commit")
+        def _publish(session):
+            changes = session.info.pop(key, None)
+            if not changes:
+                return
+            by_user: Dict[int, List[Dict[str, Any]]] = {}
+            for user_id, item in changes:
+                by_user.setdefault(user_id, []).append(item)
+            for user_id, events in by_user.items():
+                try:
+                    self.publish(user_id, events)
+                except Exception:
+                    logger.exception("Could not publish live update")
+
+        @event.listens_for(session_class, "after_rollback")
+        def _discard(session):
+            session.info.pop(key, None)
+
+
+def format_sse(item: Dict[str, Any]) -> str:
+    return f"event: {item['event']}\ndata: {json.dumps(item['data'], default=str)}\n\n"
+
+
+async def event_stream(user_id: int, hub: "LiveUpdates" = None,
+                       heartbeat: float = LIVE_UPDATES_HEARTBEAT_SECONDS):
+    """Server-sent events for one user until the client disconnects."""
+    hub = hub or live_updates
+    queue = hub.subscribe(user_id)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(item)
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+live_updates = LiveUpdates(RedisBroadcast(LIVE_UPDATES_REDIS_URL) if LIVE_UPDATES_REDIS_URL else None)
@@ -0,0 +1,224 @@
+"""Allocation profiling and per-route memory accounting, for diagnosing RSS growth.
+
+Everything is off until an operator starts it (``POST
+/admin/diagnostics/memory/start``) and costs nothing until then. While on:
+
+- ``tracemalloc`` traces allocations. Each ``snapshot()`` returns the top
+  allocation sites that grew since the previous snapshot.
+- A sample of requests (``sample_rate``) has its peak traced allocation
+  recorded against its route. The peak is process-wide, so a sampled
+  request runs only when no other sample is in flight. Requests running
+  at the same time still add to it, so it is an upper bound.
+- Every ORM load records the size of its session's identity map, so each
+  route reports how many objects its sessions held at most.
+
+Numbers are per worker process; ``pid`` in every answer says which one.
+"""
+import contextvars
+import linecache
+import os
+import random
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+MEMORY_SAMPLE_RATE = float(os.getenv("MEMORY_SAMPLE_RATE", "0.1"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+
+# Allocations of the profiler itself are not interesting
+_IGNORED_FILES = (tracemalloc.__file__, linecache.__file__, "<frozen importlib._bootstrap>",
+                  "<frozen importlib._bootstrap_external>", "<unknown>")
+
+_request: contextvars.ContextVar[Optional["RequestRecord"]] = contextvars.ContextVar("memory_request", default=None)
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux), else the peak from ``getrusage``."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RequestRecord:
+    """What one request allocated and held, filled in while it runs."""
+
+    __slots__ = ("sampled", "baseline", "peak_bytes", "identity_maps", "token")
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.baseline = 0
+        self.peak_bytes: Optional[int] = None
+        self.token: Optional[contextvars.Token] = None
+        # id(session) -> largest identity map seen for it
+        self.identity_maps: Dict[int, int] = {}
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.sessions = 0
+        self.identity_map_max = 0
+        self.identity_map_total = 0
+        self.samples = 0
+        self.peak_bytes_max = 0
+        self.peak_bytes_total = 0
+
+    def add(self, record: RequestRecord) -> None:
+        self.requests += 1
+        for size in record.identity_maps.values():
+            self.sessions += 1
+            self.identity_map_total += size
+            self.identity_map_max = max(self.identity_map_max, size)
+        if record.peak_bytes is not None:
+            self.samples += 1
+            self.peak_bytes_total += record.peak_bytes
+            self.peak_bytes_max = max(self.peak_bytes_max, record.peak_bytes)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "sessions": self.sessions,
+            "identity_map_max": self.identity_map_max,
+            "identity_map_mean": round(self.identity_map_total / self.sessions, 1) if self.sessions else None,
+            "samples": self.samples,
+            "peak_bytes_max": self.peak_bytes_max if self.samples else None,
+            "peak_bytes_mean": round(self.peak_bytes_total / self.samples) if self.samples else None,
+        }
+
+
+class MemoryProfiler:
+    def __init__(self, session_class=None):
+        self.session_class = session_class
+        self.active = False
+        self.sample_rate = MEMORY_SAMPLE_RATE
+        self.started_at: Optional[float] = None
+        self.routes: Dict[str, RouteStats] = {}
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+        self._sampling = threading.Lock()
+
+    # -- control ---------------------------------------------------------
+
+    def start(self, frames: int = MEMORY_TRACE_FRAMES, sample_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Start tracing (or restart with fresh stats) and take the baseline snapshot."""
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() != frames:
+            tracemalloc.stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        with self._lock:
+            self.routes = {}
+        self._snapshot = self._take()
+        if not self.active and self.session_class is not None:
+            event.listen(self.session_class, "loaded_as_persistent", _on_load)
+        self.active = True
+        self.started_at = time.time()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing; the route stats collected so far are kept until the next start."""
+        status = self.status()
+        if self.active and self.session_class is not None:
+            event.remove(self.session_class, "loaded_as_persistent", _on_load)
+        self.active = False
+        self._snapshot = None
+        tracemalloc.stop()
+        return dict(status, tracing=False)
+
+    # -- reports ---------------------------------------------------------
+
+    def status(self) -> Dict[str, Any]:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        with self._lock:
+            routes = {name: stats.as_dict() for name, stats in sorted(self.routes.items())}
+        return {
+            "pid": os.getpid(),
+            "tracing": self.active,
+            "started_at": self.started_at if self.active else None,
+            "sample_rate": self.sample_rate,
+            "rss_bytes": rss_bytes(),
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "routes": routes,
+        }
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, name) for name in _IGNORED_FILES]
+        )
+
+    def snapshot(self, top: int = 20, group_by: str = "lineno") -> Dict[str, Any]:
+        """The ``top`` allocation sites by growth since the last snapshot (or start)."""
+        if not self.active:
+            raise RuntimeError("Memory profiling is not running")
+        current = self._take()
+        previous, self._snapshot = self._snapshot, current
+        stats = current.compare_to(previous, group_by)
+        sites = []
+        for stat in stats[:top]:
+            # Oldest call first, like a Python traceback
+            frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+            sites.append({
+                "site": frames[-1],
+                "traceback": frames if group_by == "traceback" else None,
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            })
+        return {
+            "pid": os.getpid(),
+            "rss_bytes": rss_bytes(),
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "total_diff_bytes": sum(s.size_diff for s in stats),
+            "top": sites,
+        }
+
+    # -- request accounting (called by MemoryAccountingMiddleware) -------
+
+    def begin_request(self) -> Optional[RequestRecord]:
+        if not self.active:
+            return None
+        sampled = random.random() < self.sample_rate and self._sampling.acquire(blocking=False)
+        record = RequestRecord(sampled)
+        if sampled:
+            tracemalloc.reset_peak()
+            record.baseline = tracemalloc.get_traced_memory()[0]
+        record.token = _request.set(record)
+        return record
+
+    def end_request(self, record: RequestRecord, route: str) -> None:
+        _request.reset(record.token)
+        if record.sampled:
+            # Not when profiling was stopped mid-request
+            if tracemalloc.is_tracing():
+                record.peak_bytes = max(tracemalloc.get_traced_memory()[1] - record.baseline, 0)
+            self._sampling.release()
+        if not self.active:
+            return
+        with self._lock:
+            self.routes.setdefault(route, RouteStats()).add(record)
+
+
+def _on_load(session, instance) -> None:
+    record = _request.get()
+    if record is not None:
+        size = len(session.identity_map)
+        if size > record.identity_maps.get(id(session), 0):
+            record.identity_maps[id(session)] = size
+
+
+memory_profiler = MemoryProfiler(Session)
@@ -0,0 +1,41 @@
+"""Keyset cursors for the paginated HTML list and search results.
+
+A cursor is the ``(created_at, id)`` of the last row shown, encoded as an
+opaque URL-safe token. The next page is the rows after it in newest-first
+order (see ``calculations_in_window``). Unlike an offset, it costs the same
+on page 1000 as on page 1, and rows added meanwhile never shift a page.
+Rows without a ``created_at`` sort as if created at ``NO_CREATED_AT``, so
+they come last newest-first and can be a cursor like any other row.
+"""
+import base64
+import os
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+# Keyset position of a row whose created_at is NULL
+NO_CREATED_AT = datetime.min
+
+
+def encode_cursor(created_at: datetime, calc_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{calc_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, calc_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(calc_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def split_page(rows: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """Trim rows fetched with ``limit + 1`` to one page plus the next cursor (None on the last page)."""
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(last.created_at or NO_CREATED_AT, last.id)
@@ -0,0 +1,226 @@
+"""Audit (and optionally repair) stored calculation results.
+
+Walks ``calculations`` on every shard in id order using keyset pagination
+(``WHERE id > :last ORDER BY id LIMIT :n``), so each chunk is an index range
+scan no matter how far the walk has got. Chunks are recomputed with the
+vectorized ``compute_results`` in a process pool. The main process keeps
+reading ahead while the workers compute.
+
+A row is a mismatch when its stored result differs from the recomputed one
+beyond a small relative tolerance. Rows that have no valid result under the
+current semantics (e.g. a stored division by zero) are reported but never
+"fixed". With ``fix=True`` mismatches are corrected in one transaction per
+chunk, logged to the change log like any other update. Each ``UPDATE`` only
+applies while the row still has the operation, operands and expression it
+was scanned with; a row edited since is counted as ``skipped``.
+
+Progress can be saved to a JSON checkpoint after every chunk, so an
+interrupted run resumes where it stopped. A run that finishes deletes its
+checkpoint, so the next run scans everything again. ``max_rows_per_second`` caps the scan rate to
+limit the load on a production database.
+"""
+import json
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.calculation import Calculation
+from app.services.calculation_math import compute_result, compute_results, np
+from app.services.change_log import UPDATE, record_changes
+
+REL_TOLERANCE = 1e-9
+ABS_TOLERANCE = 1e-12
+
+# (id, operation, a, b, result, expression, user_id)
+Row = Tuple[int, str, float, float, float, Optional[str], int]
+
+
+def scan_chunks(db: Session, after_id: int, chunk_size: int) -> Iterator[List[Row]]:
+    """Keyset-paginated chunks of rows with ``id > after_id``."""
+    last = after_id
+    while True:
+        rows = (
+            db.query(Calculation.id, Calculation.type, Calculation.a, Calculation.b,
+                     Calculation.result, Calculation.expression, Calculation.user_id)
+            .filter(Calculation.id > last)
+            .order_by(Calculation.id)
+            .limit(chunk_size)
+            .all()
+        )
+        db.commit()  # don't hold a read transaction open between chunks
+        if not rows:
+            return
+        chunk = [tuple(r) for r in rows]
+        last = chunk[-1][0]
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+
+
+def _expected(rows: Sequence[Row]) -> List[Optional[float]]:
+    if np is not None:
+        values = compute_results([r[1] for r in rows], [r[2] for r in rows],
+                                 [r[3] for r in rows], [r[5] for r in rows])
+        return [None if math.isnan(v) else float(v) for v in values.tolist()]
+    expected = []
+    for _, op, a, b, _, expression, _ in rows:
+        try:
+            expected.append(compute_result(op, a, b, expression))
+        except ValueError:
+            expected.append(None)
+    return expected
+
+
+def check_chunk(rows: Sequence[Row]) -> Dict[str, Any]:
+    """Recompute one chunk; runs in a worker process."""
+    mismatches = []
+    for row, expected in zip(rows, _expected(rows)):
+        stored = row[4]
+        if expected is None or stored is None or not math.isclose(
+            stored, expected, rel_tol=REL_TOLERANCE, abs_tol=ABS_TOLERANCE
+        ):
+            mismatches.append((row, expected))
+    return {"last_id": rows[-1][0], "scanned": len(rows), "mismatches": mismatches}
+
+
+def apply_fixes(db: Session, fixes: Sequence[Tuple[Row, float]]) -> int:
+    """Set ``result`` for ``(scanned row, result)`` pairs whose row is unchanged; returns how many."""
+    if not fixes:
+        return 0
+    now = datetime.utcnow()
+    fixed = []
+    for row, result in fixes:
+        calc_id, operation, a, b, _, expression, user_id = row
+        updated = db.execute(
+            update(Calculation.__table__)
+            .where(
+                Calculation.id == calc_id,
+                Calculation.type == operation,
+                Calculation.a == a,
+                Calculation.b == b,
+                Calculation.expression.is_not_distinct_from(expression),
+            )
+            .values(result=result, updated_at=now)
+        ).rowcount
+        if updated:
+            fixed.append((user_id, calc_id, UPDATE))
+    record_changes(db.connection(), fixed)
+    db.commit()
+    return len(fixed)
+
+
+def load_checkpoint(path: Optional[str]) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {"shards": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: Optional[str], state: Dict[str, Any]) -> None:
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+class _Done:
+    """Future-like wrapper for results computed inline (``workers <= 1``)."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def result(self):
+        return self._value
+
+
+def recompute_calculations(
+    session_factories: Iterable[Callable[[], Session]],
+    chunk_size: int = 10_000,
+    workers: int = 0,
+    fix: bool = False,
+    checkpoint: Optional[str] = None,
+    max_rows_per_second: float = 0,
+    report: Optional[TextIO] = None,
+    log: Callable[[str], None] = lambda msg: None,
+) -> Dict[str, int]:
+    """Verify every shard's results; returns scanned/mismatched/uncomputable/fixed/skipped counts.
+
+    ``workers`` > 1 computes in that many processes; otherwise inline.
+    Each mismatch is written to ``report`` as one JSON line.
+    """
+    state = load_checkpoint(checkpoint)
+    stats = {"scanned": 0, "mismatched": 0, "uncomputable": 0, "fixed": 0, "skipped": 0}
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    started = time.monotonic()
+
+    try:
+        for shard, factory in enumerate(session_factories):
+            progress = state["shards"].setdefault(str(shard), {"last_id": 0, "done": False})
+            if progress["done"]:
+                log(f"shard {shard}: already checked (checkpoint {checkpoint})")
+                continue
+            if progress["last_id"]:
+                log(f"shard {shard}: resuming from id {progress['last_id']} (checkpoint {checkpoint})")
+            db = factory()
+            pending: "deque[Future]" = deque()
+
+            def handle(result: Dict[str, Any]) -> None:
+                fixes = []
+                for row, expected in result["mismatches"]:
+                    if expected is None:
+                        stats["uncomputable"] += 1
+                    else:
+                        stats["mismatched"] += 1
+                        fixes.append((row, expected))
+                    if report is not None:
+                        report.write(json.dumps({
+                            "shard": shard, "id": row[0], "operation": row[1], "a": row[2], "b": row[3],
+                            "expression": row[5], "stored": row[4], "expected": expected,
+                        }) + "\n")
+                if fix:
+                    fixed = apply_fixes(db, fixes)
+                    stats["fixed"] += fixed
+                    stats["skipped"] += len(fixes) - fixed
+                stats["scanned"] += result["scanned"]
+                progress["last_id"] = result["last_id"]
+                save_checkpoint(checkpoint, state)
+                log(f"shard {shard}: checked through id {result['last_id']} ({stats['scanned']} rows)")
+
+            try:
+                read = 0
+                for chunk in scan_chunks(db, progress["last_id"], chunk_size):
+                    if executor is not None:
+                        pending.append(executor.submit(check_chunk, chunk))
+                    else:
+                        pending.append(_Done(check_chunk(chunk)))
+                    # Results are applied in order so the checkpoint only moves past finished chunks
+                    while len(pending) > max(workers, 1) * 2 or (pending and isinstance(pending[0], _Done)):
+                        handle(pending.popleft().result())
+
+                    read += len(chunk)
+                    if max_rows_per_second > 0:
+                        ahead = read / max_rows_per_second - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                while pending:
+                    handle(pending.popleft().result())
+                progress["done"] = True
+                save_checkpoint(checkpoint, state)
+            finally:
+                db.close()
+            started = time.monotonic()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return stats
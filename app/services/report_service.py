@@ -2,6 +2,8 @@ from typing import Dict, List, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.models.calculation import Calculation
+from app.services.archive_service import archived_totals, recent_archived
+from app.services.hot_cache import hot_cache
 
 
 def generate_report(db: Session, user_id: int, limit: int = 5) -> Dict[str, Any]:
@@ -15,37 +17,55 @@ def generate_report(db: Session, user_id: int, limit: int = 5) -> Dict[str, Any]
       - op_counts: dict mapping operation -> count
       - recent: list of recent calculations (dicts)
     """
-    # Total count
-    total = db.query(func.count(Calculation.id)).filter(Calculation.user_id == user_id).scalar() or 0
+    # Hot users' live totals and newest rows come from memory
+    cached = hot_cache.report_totals(db, user_id, limit)
+    if cached is not None:
+        totals, recent_rows = cached
+    else:
+        # One grouped pass over the live rows: count and sums per operation
+        rows = (
+            db.query(
+                Calculation.type,
+                func.count(Calculation.id),
+                func.sum(Calculation.a),
+                func.sum(Calculation.b),
+                func.sum(Calculation.result),
+            )
+            .filter(Calculation.user_id == user_id)
+            .group_by(Calculation.type)
+            .all()
+        )
+        totals = {op: [count, sum_a or 0.0, sum_b or 0.0, sum_result or 0.0]
+                  for op, count, sum_a, sum_b, sum_result in rows}
 
-    # Average result
-    avg_result = db.query(func.avg(Calculation.result)).filter(Calculation.user_id == user_id).scalar()
-    average_result = float(avg_result) if avg_result is not None else None
+    # Fold in rows that were moved to the archive
+    for op, rollup in archived_totals(db, user_id).items():
+        t = totals.setdefault(op, [0, 0.0, 0.0, 0.0])
+        t[0] += rollup.count
+        t[1] += rollup.sum_a
+        t[2] += rollup.sum_b
+        t[3] += rollup.sum_result
 
-    # Average operands
-    avg_a = db.query(func.avg(Calculation.a)).filter(Calculation.user_id == user_id).scalar()
-    average_a = float(avg_a) if avg_a is not None else None
-
-    avg_b = db.query(func.avg(Calculation.b)).filter(Calculation.user_id == user_id).scalar()
-    average_b = float(avg_b) if avg_b is not None else None
-
-    # Counts per operation
-    rows = (
-        db.query(Calculation.type, func.count(Calculation.id))
-        .filter(Calculation.user_id == user_id)
-        .group_by(Calculation.type)
-        .all()
-    )
-    op_counts = {r[0]: r[1] for r in rows}
+    total = sum(t[0] for t in totals.values())
+    op_counts = {op: t[0] for op, t in totals.items() if t[0]}
+    if total:
+        average_a = sum(t[1] for t in totals.values()) / total
+        average_b = sum(t[2] for t in totals.values()) / total
+        average_result = sum(t[3] for t in totals.values()) / total
+    else:
+        average_a = average_b = average_result = None
 
     # Recent calculations
-    recent_rows = (
-        db.query(Calculation)
-        .filter(Calculation.user_id == user_id)
-        .order_by(Calculation.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+    if cached is None:
+        recent_rows = (
+            db.query(Calculation)
+            .filter(Calculation.user_id == user_id)
+            .order_by(Calculation.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+    if len(recent_rows) < limit and total > len(recent_rows):
+        recent_rows += recent_archived(db, user_id, limit - len(recent_rows))
 
     recent = [
         {
@@ -0,0 +1,131 @@
+"""Compact encodings for bulk calculation data.
+
+The default JSON list of ``CalculationOut`` objects repeats every key on every
+row. Analytics clients can instead ask for one of two column-oriented shapes
+via the ``Accept`` header:
+
+- ``application/vnd.calculations.columnar+json``:
+  ``{"id": [...], "a": [...], "b": [...], ...}``
+- ``application/msgpack`` (or ``application/x-msgpack``): a MessagePack map
+  in which every numeric column is a single little-endian binary blob, so a
+  client can decode it without copying, e.g.
+  ``numpy.frombuffer(doc["a"], dtype=doc["dtypes"]["a"])``. A missing
+  timestamp is NumPy's ``NaT`` (the int64 minimum), and ``nulls`` lists
+  the row indexes of each column that has any.
+
+Both are built directly from the tuples of a column query, never from ORM
+objects.
+"""
+import json
+import sys
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import Response
+
+try:  # MessagePack support is optional
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+from app.models.calculation import Calculation
+
+JSON = "json"
+COLUMNAR = "columnar"
+MSGPACK = "msgpack"
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.calculations.columnar+json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Column name -> binary dtype used in MessagePack bodies (None = list of str)
+CALCULATION_COLUMNS = {
+    "id": "<i8",
+    "a": "<f8",
+    "b": "<f8",
+    "type": None,
+    "result": "<f8",
+    "expression": None,
+    "created_at": "<M8[us]",
+    "updated_at": "<M8[us]",
+}
+
+_ARRAY_CODES = {"<i8": "q", "<f8": "d", "<M8[us]": "q"}
+_EPOCH = datetime(1970, 1, 1)
+# datetime64 "not a time": how a null timestamp is packed
+NAT = -(2 ** 63)
+
+
+def column_entities(model=Calculation) -> List[Any]:
+    """The ORM attributes to pass to ``db.query(...)`` for a columnar body."""
+    return [getattr(model, name) for name in CALCULATION_COLUMNS]
+
+
+def negotiate_format(accept: str) -> str:
+    """Pick the bulk response format for an ``Accept`` header.
+
+    MessagePack is only offered when the ``msgpack`` package is installed;
+    otherwise such clients get plain JSON.
+    """
+    accept = (accept or "").lower()
+    if msgpack is not None and any(t in accept for t in MSGPACK_MEDIA_TYPES):
+        return MSGPACK
+    if COLUMNAR_MEDIA_TYPE in accept:
+        return COLUMNAR
+    return JSON
+
+
+def _columns(rows: Sequence[Sequence[Any]]) -> Dict[str, List[Any]]:
+    names = list(CALCULATION_COLUMNS)
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
+
+
+def _micros(value: Optional[datetime]) -> int:
+    if value is None:
+        return NAT
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _pack(values: Iterable[Any], dtype: str) -> bytes:
+    if dtype == "<M8[us]":
+        values = (_micros(v) for v in values)
+    buf = array(_ARRAY_CODES[dtype], values)
+    if sys.byteorder != "little":
+        buf.byteswap()
+    return buf.tobytes()
+
+
+def encode_columnar_json(rows: Sequence[Sequence[Any]]) -> bytes:
+    columns = _columns(rows)
+    for name in ("created_at", "updated_at"):
+        columns[name] = [v.isoformat() if v else None for v in columns[name]]
+    return json.dumps(columns, separators=(",", ":")).encode("utf-8")
+
+
+def encode_msgpack(rows: Sequence[Sequence[Any]]) -> bytes:
+    columns = _columns(rows)
+    doc: Dict[str, Any] = {"length": len(rows), "dtypes": {}}
+    for name, dtype in CALCULATION_COLUMNS.items():
+        if dtype is None:
+            doc[name] = columns[name]
+        else:
+            doc["dtypes"][name] = dtype
+            doc[name] = _pack(columns[name], dtype)
+            nulls = [i for i, v in enumerate(columns[name]) if v is None]
+            if nulls:
+                doc.setdefault("nulls", {})[name] = nulls
+    return msgpack.packb(doc, use_bin_type=True)
+
+
+def bulk_response(rows: Sequence[Sequence[Any]], fmt: str) -> Response:
+    """Encode column-query rows as a columnar JSON or MessagePack response."""
+    if fmt == MSGPACK:
+        body, media_type = encode_msgpack(rows), MSGPACK_MEDIA_TYPES[0]
+    else:
+        body, media_type = encode_columnar_json(rows), COLUMNAR_MEDIA_TYPE
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
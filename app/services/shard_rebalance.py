@@ -0,0 +1,207 @@
+"""Online tools for moving users between calculation shards.
+
+``move_user`` copies a user's rows while the app keeps serving them:
+
+1. copy every row from the source shard to the target in chunks;
+2. point the user's ``shard_directory`` entry at the target, so new reads
+   and writes go there;
+3. wait ``settle_seconds`` (longer than ``SHARD_DIRECTORY_TTL``) so every
+   worker has picked up the new placement;
+4. catch up rows that were inserted, updated or deleted on the source while
+   steps 1-3 were running;
+5. delete the user's rows from the source, then move their archived rows
+   and archive rollups (see app/services/archive_service.py).
+
+Every shard allocates calculation ids from its own range (see
+``SHARD_ID_RANGE``), so a moved calculation keeps its id and links, change
+log cursors and client caches that name it stay valid. SQLite allocates
+past the largest id in the table, so a SQLite shard refuses rows from a
+higher shard's range.
+"""
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import func, select
+
+from app.db.sharding import SHARD_ID_RANGE, ShardMap
+from app.models.calculation import Calculation
+from app.models.calculation_archive import ArchiveRollup, CalculationArchive
+from app.models.user import User
+
+_COPIED_COLUMNS = ("id", "user_id", "type", "a", "b", "result", "expression", "created_at", "updated_at")
+
+
+def _copy_values(calc: Calculation) -> dict:
+    return {name: getattr(calc, name) for name in _COPIED_COLUMNS}
+
+
+def move_user(
+    shard_map: ShardMap,
+    user_id: int,
+    target: int,
+    chunk_size: int = 1000,
+    settle_seconds: Optional[float] = None,
+    log: Callable[[str], None] = lambda msg: None,
+) -> Dict[str, int]:
+    """Move one user's calculations to shard ``target``.
+
+    Returns counts of copied, caught-up and deleted rows. Raises
+    ``ValueError`` when a SQLite target would have to take ids from a higher
+    shard's range.
+    """
+    shard_map.reload_directory()
+    source = shard_map.shard_for(user_id)
+    if source == target:
+        return {"copied": 0, "caught_up": 0, "deleted": 0, "archived": 0}
+    if settle_seconds is None:
+        settle_seconds = shard_map.directory_ttl + 1
+
+    src = shard_map.sessionmakers[source]()
+    dst = shard_map.sessionmakers[target]()
+    copied_ids: Set[int] = set()
+    started = datetime.utcnow()
+    try:
+        if shard_map.engines[target].dialect.name == "sqlite":
+            highest = max(
+                src.query(func.max(Calculation.id)).filter(Calculation.user_id == user_id).scalar() or 0,
+                src.query(func.max(CalculationArchive.id)).filter(CalculationArchive.user_id == user_id).scalar() or 0,
+            )
+            if highest >= (target + 1) * SHARD_ID_RANGE:
+                raise ValueError(
+                    f"user {user_id} has ids above shard {target}'s range, which SQLite would reuse"
+                )
+
+        # Rows left on the target by an earlier, interrupted move
+        dst.query(Calculation).filter(Calculation.user_id == user_id).delete(synchronize_session=False)
+        dst.commit()
+
+        # 1. bulk copy in id order
+        copied = 0
+        last_id = 0
+        while True:
+            chunk = (
+                src.query(Calculation)
+                .filter(Calculation.user_id == user_id, Calculation.id > last_id)
+                .order_by(Calculation.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not chunk:
+                break
+            dst.add_all([Calculation(**_copy_values(c)) for c in chunk])
+            dst.commit()
+            copied_ids.update(c.id for c in chunk)
+            copied += len(chunk)
+            last_id = chunk[-1].id
+            src.expunge_all()
+            log(f"copied {copied} rows")
+
+        # 2. flip the directory, 3. let every worker notice
+        shard_map.assign(user_id, target)
+        log(f"user {user_id} now routed to shard {target}; settling {settle_seconds}s")
+        time.sleep(settle_seconds)
+
+        # 4. catch up writes that landed on the source meanwhile
+        caught_up = 0
+        seen = set()
+        for calc in src.execute(
+            select(Calculation).where(Calculation.user_id == user_id).order_by(Calculation.id)
+        ).scalars():
+            seen.add(calc.id)
+            if calc.id not in copied_ids:
+                dst.add(Calculation(**_copy_values(calc)))
+                copied_ids.add(calc.id)
+                caught_up += 1
+            elif calc.updated_at and calc.updated_at >= started:
+                target_row = dst.get(Calculation, calc.id)
+                if target_row is None:
+                    continue  # deleted on the target after the flip, which is newer
+                for name, value in _copy_values(calc).items():
+                    setattr(target_row, name, value)
+                caught_up += 1
+        for source_id in copied_ids - seen:
+            copied_ids.discard(source_id)
+            target_row = dst.get(Calculation, source_id)
+            if target_row is not None:
+                dst.delete(target_row)
+                caught_up += 1
+        dst.commit()
+
+        # 5. remove the originals
+        deleted = (
+            src.query(Calculation)
+            .filter(Calculation.user_id == user_id)
+            .delete(synchronize_session=False)
+        )
+        src.commit()
+
+        archived = _move_archive(src, dst, user_id, copied_ids)
+    finally:
+        src.close()
+        dst.close()
+
+    return {"copied": copied, "caught_up": caught_up, "deleted": deleted, "archived": archived}
+
+
+def _move_archive(src, dst, user_id: int, copied_ids: Set[int]) -> int:
+    """Move a user's archived rows and rollups from ``src`` to ``dst``.
+
+    A row archived on the source after it was copied live to the target is
+    already on the target, so it is skipped and taken out of the rollups.
+    """
+    rollups = {
+        r.operation: [r.count, r.sum_a, r.sum_b, r.sum_result]
+        for r in src.query(ArchiveRollup).filter(ArchiveRollup.user_id == user_id)
+    }
+    moved = 0
+    for row in src.query(CalculationArchive).filter(CalculationArchive.user_id == user_id):
+        if row.id in copied_ids:
+            t = rollups[row.type]
+            t[0] -= 1
+            t[1] -= row.a
+            t[2] -= row.b
+            t[3] -= row.result
+            continue
+        values = {name: getattr(row, name) for name in _COPIED_COLUMNS}
+        dst.add(CalculationArchive(archived_at=row.archived_at, **values))
+        moved += 1
+
+    for operation, (count, sum_a, sum_b, sum_result) in rollups.items():
+        if count <= 0:
+            continue
+        target = dst.get(ArchiveRollup, (user_id, operation))
+        if target is None:
+            target = ArchiveRollup(user_id=user_id, operation=operation,
+                                   count=0, sum_a=0.0, sum_b=0.0, sum_result=0.0)
+            dst.add(target)
+        target.count += count
+        target.sum_a += sum_a
+        target.sum_b += sum_b
+        target.sum_result += sum_result
+    dst.commit()
+
+    src.query(CalculationArchive).filter(CalculationArchive.user_id == user_id).delete(synchronize_session=False)
+    src.query(ArchiveRollup).filter(ArchiveRollup.user_id == user_id).delete(synchronize_session=False)
+    src.commit()
+    return moved
+
+
+def pin_all_users(shard_map: ShardMap) -> int:
+    """Record every user's current hash placement in the directory.
+
+    Run this before changing the number of shards so existing users keep
+    finding their data; returns the number of users pinned.
+    """
+    shard_map.reload_directory()
+    db = shard_map.directory_session()
+    try:
+        user_ids = [uid for (uid,) in db.query(User.id)]
+    finally:
+        db.close()
+    pinned = 0
+    for user_id in user_ids:
+        if shard_map.pinned_shard(user_id) is None:
+            shard_map.assign(user_id, shard_map.hash_shard(user_id))
+            pinned += 1
+    return pinned
@@ -0,0 +1,152 @@
+"""Coalesce concurrent identical requests into one computation.
+
+When several requests for the same (user, endpoint, parameters) arrive
+while one is already computing, they wait for it and share its result (or
+its exception) instead of running the same queries again. Nothing is cached:
+once the computation finishes, the next request starts a new one.
+
+- ``do`` is for sync handlers (FastAPI runs them in a threadpool). Waiters
+  block on an event.
+- ``do_async`` is for async handlers. The computation runs as a task, so a
+  disconnecting client never cancels it for the others.
+
+A request must not be served data older than its user's own last write. Keys
+therefore include a per-user write generation. ``install`` bumps it on every
+commit that touches the user's calculations, so a request that arrives after
+a write never joins a computation that started before it. Generations are
+tracked per worker process.
+
+Shared results are handed to every waiter as the same object, so callers
+must treat them as read-only.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.calculation import Calculation
+from app.services.metrics import metrics
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") not in ("0", "false", "False")
+
+_requests = metrics.counter(
+    "single_flight_requests_total",
+    "Requests through the single-flight layer by endpoint and role (leader ran it, coalesced shared it)",
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Per-key deduplication of in-flight work."""
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[int, Hashable], "asyncio.Task"] = {}
+        self._generations: Dict[int, int] = {}
+
+    def key(self, user_id: int, endpoint: str, **params: Any) -> Tuple:
+        """Normalized key: unset parameters are dropped and order does not matter."""
+        normalized = tuple(sorted(
+            (name, value.isoformat() if hasattr(value, "isoformat") else value)
+            for name, value in params.items() if value is not None
+        ))
+        return endpoint, user_id, self._generations.get(user_id, 0), normalized
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._tasks)
+
+    def do(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` once for every concurrent caller with the same ``key``."""
+        endpoint = key[0]
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            _requests.inc(endpoint=endpoint, role="coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        _requests.inc(endpoint=endpoint, role="leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Tuple, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async form of ``do``: ``fn`` returns an awaitable."""
+        endpoint = key[0]
+        if not self.enabled:
+            return await fn()
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            _requests.inc(endpoint=endpoint, role="leader")
+            task = loop.create_task(fn())
+            self._tasks[task_key] = task
+            task.add_done_callback(lambda t: self._tasks.pop(task_key, None))
+        else:
+            _requests.inc(endpoint=endpoint, role="coalesced")
+        return await asyncio.shield(task)
+
+    # -- read-your-writes -------------------------------------------------
+
+    def note_write(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def install(self, session_class=Session) -> None:
+        """Bump a user's generation after commits through ``session_class`` that wrote their calculations."""
+        info_key = f"single_flight_users:{id(self)}"
+
+        @event.listens_for(session_class, "after_flush")
+        def _collect(session, flush_context):
+            users = session.info.setdefault(info_key, set())
+            for objs in (session.new, session.dirty, session.deleted):
+                for obj in objs:
+                    if isinstance(obj, Calculation) and obj.user_id is not None:
+                        users.add(obj.user_id)
+
+        @event.listens_for(session_class, "after_commit")
+        def _bump(session):
+            for user_id in session.info.pop(info_key, ()):
+                self.note_write(user_id)
+
+        @event.listens_for(session_class, "after_rollback")
+        def _discard(session):
+            session.info.pop(info_key, None)
+
+
+single_flight = SingleFlight()
+
+metrics.gauge("single_flight_in_flight", "Computations currently shared by the single-flight layer",
+              read=single_flight.in_flight)
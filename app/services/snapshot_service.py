@@ -0,0 +1,234 @@
+"""Offline analytics snapshots of the ``calculations`` table.
+
+``export_snapshot`` streams rows through a server-side cursor in fixed-size
+chunks and writes them as Parquet or Arrow IPC files laid out as::
+
+    <out_dir>/date=YYYY-MM-DD/user_bucket=NN/part-<snapshot>-<chunk>.<ext>
+
+partitioned by the row's ``created_at`` date and a stable hash of its
+``user_id``. Every calculation shard is exported (see app/db/sharding.py).
+After a successful run the highest ``(updated_at, id)`` seen on each shard is
+stored in ``<out_dir>/_watermark.json`` so the next run only exports rows
+changed since then. Legacy rows without ``updated_at`` are ordered by their
+``created_at`` (or, lacking both, before everything else), the same way on
+every database. An updated row therefore appears in more than one
+snapshot; ``read_snapshot(..., latest_only=True)`` keeps its newest version.
+
+``read_snapshot`` memory-maps the files, so aggregates run against the OS
+page cache instead of the production database.
+"""
+import json
+import os
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import DateTime, and_, func, literal, or_, select
+from sqlalchemy.engine import Engine
+
+try:  # pyarrow is only needed by the snapshot tooling
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+    pc = None
+    pq = None
+
+from app.models.calculation import Calculation
+
+PARQUET = "parquet"
+ARROW = "arrow"
+WATERMARK_FILE = "_watermark.json"
+# Change time of rows that have neither updated_at nor created_at
+_NO_TIME = datetime(1970, 1, 1)
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Snapshots need pyarrow: pip install pyarrow")
+
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("operation", pa.string()),
+        ("a", pa.float64()),
+        ("b", pa.float64()),
+        ("result", pa.float64()),
+        ("expression", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("us")),
+    ])
+
+
+def user_bucket(user_id: int, buckets: int) -> int:
+    """Stable (process-independent) hash bucket for a user id."""
+    return zlib.crc32(str(user_id).encode()) % buckets
+
+
+def load_watermark(out_dir: Path) -> Optional[Dict[str, Any]]:
+    """``{"shards": {"<shard>": {"updated_at", "id", "snapshot"}}}``, or None before the first run."""
+    path = Path(out_dir) / WATERMARK_FILE
+    if not path.exists():
+        return None
+    watermark = json.loads(path.read_text())
+    if "shards" not in watermark:
+        # Written before snapshots covered every shard: it was the primary's
+        watermark = {"shards": {"0": watermark}}
+    return watermark
+
+
+def _save_watermark(out_dir: Path, shard: int, updated_at: datetime, last_id: int, snapshot: str) -> None:
+    path = Path(out_dir) / WATERMARK_FILE
+    watermark = load_watermark(out_dir) or {"shards": {}}
+    watermark["shards"][str(shard)] = {
+        "updated_at": updated_at.isoformat(),
+        "id": last_id,
+        "snapshot": snapshot,
+    }
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(watermark))
+    os.replace(tmp, path)
+
+
+def _write_part(path: Path, table, fmt: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == PARQUET:
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def _write_chunk(rows: Sequence[Sequence[Any]], out_dir: Path, fmt: str,
+                 buckets: int, snapshot: str, shard: int, chunk_no: int) -> int:
+    partitions: Dict[tuple, List[Sequence[Any]]] = {}
+    for row in rows:
+        created = row[7] or row[8]
+        key = (created.date().isoformat() if created else "unknown", user_bucket(row[1], buckets))
+        partitions.setdefault(key, []).append(row)
+
+    schema = _schema()
+    ext = "parquet" if fmt == PARQUET else "arrow"
+    files = 0
+    for (day, bucket), part in partitions.items():
+        columns = list(zip(*part))[:len(schema)]
+        table = pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        )
+        path = out_dir / f"date={day}" / f"user_bucket={bucket:02d}" / f"part-{snapshot}-{shard:02d}-{chunk_no:05d}.{ext}"
+        _write_part(path, table, fmt)
+        files += 1
+    return files
+
+
+def export_snapshot(
+    engines: Union[Engine, Sequence[Engine]],
+    out_dir: str,
+    fmt: str = PARQUET,
+    chunk_size: int = 50_000,
+    buckets: int = 16,
+    full: bool = False,
+) -> Dict[str, Any]:
+    """Stream ``calculations`` of every engine (one per shard) into partitioned snapshot files.
+
+    Memory use is bounded by ``chunk_size`` rows. Unless ``full`` is set,
+    only rows past each shard's stored watermark are exported.
+    Returns a dict with the number of rows and files written.
+    """
+    _require_pyarrow()
+    if fmt not in (PARQUET, ARROW):
+        raise ValueError(f"Unknown snapshot format: {fmt}")
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    snapshot = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    if isinstance(engines, Engine):
+        engines = [engines]
+    watermark = None if full else load_watermark(out)
+
+    rows_written = files_written = 0
+    for shard, engine in enumerate(engines):
+        since = (watermark or {"shards": {}})["shards"].get(str(shard))
+        rows, files = _export_shard(engine, shard, since, out, fmt, chunk_size, buckets, snapshot)
+        rows_written += rows
+        files_written += files
+
+    return {"snapshot": snapshot, "rows": rows_written, "files": files_written}
+
+
+def _export_shard(engine: Engine, shard: int, watermark: Optional[Dict[str, Any]], out: Path,
+                  fmt: str, chunk_size: int, buckets: int, snapshot: str) -> Tuple[int, int]:
+    """Export one shard's rows past ``watermark``; returns (rows, files)."""
+    # NULLs sort first on SQLite and last on PostgreSQL, so never order by a nullable column
+    changed = func.coalesce(
+        Calculation.updated_at, Calculation.created_at, literal(_NO_TIME, DateTime), type_=DateTime
+    )
+    stmt = select(
+        Calculation.id,
+        Calculation.user_id,
+        Calculation.type,
+        Calculation.a,
+        Calculation.b,
+        Calculation.result,
+        Calculation.expression,
+        Calculation.created_at,
+        Calculation.updated_at,
+        changed,  # not written: only for the watermark
+    ).order_by(changed, Calculation.id)
+
+    if watermark:
+        since = datetime.fromisoformat(watermark["updated_at"])
+        stmt = stmt.where(or_(
+            changed > since,
+            and_(changed == since, Calculation.id > watermark["id"]),
+        ))
+
+    rows_written = files_written = 0
+    last = None
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        for chunk_no, chunk in enumerate(result.partitions(chunk_size)):
+            files_written += _write_chunk(chunk, out, fmt, buckets, snapshot, shard, chunk_no)
+            rows_written += len(chunk)
+            last = chunk[-1]
+
+    if last is not None:
+        _save_watermark(out, shard, last[9], last[0], snapshot)
+
+    return rows_written, files_written
+
+
+def _read_file(path: Path):
+    if path.suffix == ".arrow":
+        source = pa.memory_map(str(path), "r")
+        return pa.ipc.open_file(source).read_all()
+    return pq.read_table(path, memory_map=True)
+
+
+def read_snapshot(out_dir: str, latest_only: bool = True):
+    """Load every snapshot file under ``out_dir`` as one ``pyarrow.Table``.
+
+    Arrow IPC files are memory-mapped, so their buffers are not copied into
+    process memory. With ``latest_only`` the newest version of each
+    calculation id is kept when incremental snapshots overlap.
+    """
+    _require_pyarrow()
+    files = sorted(p for p in Path(out_dir).rglob("part-*") if p.suffix in (".arrow", ".parquet"))
+    if not files:
+        return _schema().empty_table()
+    table = pa.concat_tables([_read_file(p) for p in files])
+    if not latest_only or table.num_rows == 0:
+        return table
+
+    # With pyarrow.compute rather than NumPy, so pyarrow stays the only requirement
+    order = table.sort_by([("id", "ascending"), ("updated_at", "descending")])
+    ids = order.column("id").combine_chunks()
+    changed = pc.not_equal(ids.slice(1), ids.slice(0, len(ids) - 1))
+    keep = pa.concat_arrays([pa.array([True]), changed])
+    return order.filter(keep)
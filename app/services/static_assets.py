@@ -0,0 +1,164 @@
+"""Content-fingerprinted static files.
+
+At startup (or with ``python -m app.cli static-build``) every file under
+``app/static`` is hashed and given a fingerprinted name, so ``style.css`` is
+linked as ``/static/style.<hash>.css``. Templates get the URL from the
+``static_url()`` helper. Fingerprinted URLs never change content, so they are
+served with a one-year ``immutable`` cache lifetime; the plain URLs still work
+with ordinary revalidation.
+
+Text assets also get ``.gz`` (and, with the ``brotli`` package, ``.br``)
+siblings written once at build time. The server picks a sibling from the
+request's ``Accept-Encoding`` instead of compressing on every request.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Dict, List, Optional, Set
+
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+from app.middleware.compression import parse_accept_encoding
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.getenv("STATIC_DIR", "app/static")
+STATIC_URL_PREFIX = "/static"
+STATIC_PRECOMPRESS = os.getenv("STATIC_PRECOMPRESS", "1") == "1"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# (Content-Encoding, file suffix) in preference order
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_SUFFIXES = frozenset({".css", ".js", ".mjs", ".svg", ".html", ".json", ".map", ".txt", ".xml"})
+
+_HASH_LENGTH = 12
+
+
+def fingerprinted_name(path: str, digest: str) -> str:
+    """``css/site.css`` -> ``css/site.<digest>.css``."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:_HASH_LENGTH]}{ext}"
+
+
+def precompress(full_path: str) -> List[str]:
+    """Write missing or stale ``.gz``/``.br`` siblings; returns the encodings written."""
+    with open(full_path, "rb") as f:
+        data = f.read()
+    mtime = os.stat(full_path).st_mtime
+    written = []
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding == "br" and brotli is None:
+            continue
+        target = full_path + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime >= mtime:
+            continue
+        body = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+        if len(body) >= len(data):
+            continue
+        tmp = target + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, target)
+        written.append(encoding)
+    return written
+
+
+class AssetManifest:
+    """Maps logical static paths to their fingerprinted names and back."""
+
+    def __init__(self, directory: str = STATIC_DIR, prefix: str = STATIC_URL_PREFIX):
+        self.directory = directory
+        self.prefix = prefix
+        self.fingerprinted: Dict[str, str] = {}
+        self.logical: Dict[str, str] = {}
+        self.encoded: Set[str] = set()
+
+    def build(self, precompress_assets: bool = STATIC_PRECOMPRESS) -> "AssetManifest":
+        fingerprinted: Dict[str, str] = {}
+        for root, _, files in os.walk(self.directory):
+            for name in sorted(files):
+                if name.endswith((".gz", ".br", ".tmp")):
+                    continue
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, self.directory).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                fingerprinted[rel] = fingerprinted_name(rel, digest)
+                if precompress_assets and os.path.splitext(name)[1] in COMPRESSIBLE_SUFFIXES:
+                    try:
+                        precompress(full)
+                    except OSError as exc:  # e.g. a read-only deployment
+                        logger.warning("Could not precompress %s: %s", rel, exc)
+
+        encoded = set()
+        for rel in fingerprinted:
+            for _, suffix in PRECOMPRESSED:
+                sibling = os.path.join(self.directory, rel + suffix)
+                if os.path.exists(sibling) and os.stat(sibling).st_mtime >= os.stat(
+                    os.path.join(self.directory, rel)
+                ).st_mtime:
+                    encoded.add(rel + suffix)
+
+        self.fingerprinted = fingerprinted
+        self.logical = {v: k for k, v in fingerprinted.items()}
+        self.encoded = encoded
+        return self
+
+    def url(self, path: str) -> str:
+        """Public URL for a static file, fingerprinted when it is known."""
+        path = path.lstrip("/")
+        return f"{self.prefix}/{self.fingerprinted.get(path, path)}"
+
+    def logical_path(self, name: str) -> Optional[str]:
+        return self.logical.get(name.replace(os.sep, "/"))
+
+
+static_assets = AssetManifest()
+
+
+def static_url(path: str) -> str:
+    """Jinja helper: ``{{ static_url('style.css') }}``."""
+    return static_assets.url(path)
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """``StaticFiles`` that also serves fingerprinted names and precompressed siblings."""
+
+    def __init__(self, *, manifest: AssetManifest, **kwargs):
+        kwargs.setdefault("directory", manifest.directory)
+        super().__init__(**kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope):
+        logical = self.manifest.logical_path(path)
+        response = await self._precompressed(logical or path, scope)
+        if response is None:
+            response = await super().get_response(logical or path, scope)
+        if logical is not None and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    async def _precompressed(self, path: str, scope) -> Optional[FileResponse]:
+        path = path.replace(os.sep, "/")
+        if not any(path + suffix in self.manifest.encoded for _, suffix in PRECOMPRESSED):
+            return None
+        headers = dict(scope.get("headers") or [])
+        accepted = parse_accept_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        for encoding, suffix in PRECOMPRESSED:
+            if path + suffix in self.manifest.encoded and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                full_path = os.path.join(self.manifest.directory, path + suffix)
+                media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                return FileResponse(
+                    full_path,
+                    media_type=media_type,
+                    headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+                )
+        return None
@@ -0,0 +1,244 @@
+"""Access-token revocation (logout) checked on every authenticated request.
+
+Every access token carries a random ``jti``. Revoking one writes it to the
+``revoked_tokens`` deny-list with the token's expiry. Rows are pruned once
+that has passed, so the table only ever holds tokens that would still be
+accepted.
+
+Each worker keeps a Bloom filter of the deny-list in memory:
+
+- a token whose ``jti`` is not in the filter (every valid token, bar the
+  filter's false positives) is accepted without touching the database;
+- a hit is confirmed against the table, and the answer is cached, so a
+  false positive costs one query per worker, not one per request.
+
+A background thread loads revocations made by other workers
+(``id > last seen``) every ``REVOCATION_SYNC_SECONDS``, so a logout takes
+effect everywhere within that interval. Ids are assigned at insert time, so
+on PostgreSQL a lower id can commit after a higher one was already seen;
+each sync therefore re-scans the last ``REVOCATION_SYNC_LOOKBACK`` ids and
+adds the ones it has not seen yet. Every ``REVOCATION_PRUNE_SECONDS``
+it deletes expired rows and rebuilds the filter, since a Bloom filter
+cannot forget entries.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.revoked_token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "2"))
+REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "3600"))
+REVOCATION_SYNC_LOOKBACK = int(os.getenv("REVOCATION_SYNC_LOOKBACK", "1000"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+_CONFIRMED_CACHE_SIZE = 4096
+
+
+class BloomFilter:
+    """Set membership with no false negatives and ``error_rate`` false positives at ``capacity``."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationStore:
+    """Bloom filter in front of the persisted ``revoked_tokens`` deny-list."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        sync_interval: float = REVOCATION_SYNC_SECONDS,
+        prune_interval: float = REVOCATION_PRUNE_SECONDS,
+        capacity: int = REVOCATION_BLOOM_CAPACITY,
+        error_rate: float = REVOCATION_BLOOM_ERROR_RATE,
+        lookback: int = REVOCATION_SYNC_LOOKBACK,
+    ):
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lookback = lookback
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._count = 0
+        self._last_id = 0
+        # Ids already in the filter within ``lookback`` of ``_last_id``
+        self._seen_ids = set()
+        # jti -> revoked?, for filter hits already checked against the table
+        self._confirmed: "OrderedDict[str, bool]" = OrderedDict()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- checks ----------------------------------------------------------
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            return False
+        with self._lock:
+            cached = self._confirmed.get(jti)
+        if cached is not None:
+            return cached
+        db = self.session_factory()
+        try:
+            revoked = db.query(
+                db.query(RevokedToken).filter(RevokedToken.jti == jti).exists()
+            ).scalar()
+        finally:
+            db.close()
+        with self._lock:
+            self._confirmed[jti] = revoked
+            while len(self._confirmed) > _CONFIRMED_CACHE_SIZE:
+                self._confirmed.popitem(last=False)
+        return revoked
+
+    def revoke(self, jti: str, expires_at: datetime) -> None:
+        """Deny ``jti`` until ``expires_at`` (naive UTC) on every worker."""
+        db = self.session_factory()
+        row = RevokedToken(jti=jti, expires_at=expires_at)
+        try:
+            db.add(row)
+            db.commit()
+            row_id = row.id
+        except IntegrityError:
+            db.rollback()  # already revoked
+            row_id = None
+        finally:
+            db.close()
+        self._add(jti, row_id)
+
+    def _add(self, jti: str, row_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._bloom.add(jti)
+            self._count += 1
+            self._confirmed.pop(jti, None)
+            if row_id is not None:
+                self._seen_ids.add(row_id)
+
+    # -- sync with the table ---------------------------------------------
+
+    def load(self) -> None:
+        """Rebuild the filter from every unexpired revocation."""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            rows = db.query(RevokedToken.id, RevokedToken.jti).filter(RevokedToken.expires_at > now).all()
+            last_id = db.query(func.max(RevokedToken.id)).scalar() or 0
+        finally:
+            db.close()
+        # Leave headroom so the error rate holds while revocations keep arriving
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for _, jti in rows:
+            bloom.add(jti)
+        seen = {row_id for row_id, _ in rows if row_id > last_id - self.lookback}
+        with self._lock:
+            self._bloom, self._count, self._last_id, self._seen_ids = bloom, len(rows), last_id, seen
+            self._confirmed.clear()
+
+    def sync(self) -> int:
+        """Add revocations made since the last sync (by any worker); returns how many."""
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(RevokedToken.id, RevokedToken.jti)
+                .filter(
+                    RevokedToken.id > self._last_id - self.lookback,
+                    RevokedToken.expires_at > datetime.utcnow(),
+                )
+                .order_by(RevokedToken.id)
+                .all()
+            )
+        finally:
+            db.close()
+        new = [(row_id, jti) for row_id, jti in rows if row_id not in self._seen_ids]
+        for row_id, jti in new:
+            self._add(jti, row_id)
+        if rows:
+            self._last_id = max(self._last_id, rows[-1][0])
+        with self._lock:
+            self._seen_ids = {i for i in self._seen_ids if i > self._last_id - self.lookback}
+        if self._count > self._bloom.capacity:
+            self.load()
+        return len(new)
+
+    def prune(self) -> int:
+        """Delete revocations of tokens that have expired anyway, then rebuild the filter."""
+        db = self.session_factory()
+        try:
+            deleted = (
+                db.query(RevokedToken)
+                .filter(RevokedToken.expires_at <= datetime.utcnow())
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        self.load()
+        return deleted
+
+    # -- background thread -----------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.load()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-revocation-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        last_prune = time.monotonic()
+        while not self._stop.wait(self.sync_interval):
+            try:
+                if self.prune_interval > 0 and time.monotonic() - last_prune >= self.prune_interval:
+                    self.prune()
+                    last_prune = time.monotonic()
+                else:
+                    self.sync()
+            except Exception:
+                logger.exception("Token revocation sync failed")
+
+
+def _session():
+    from app.db import SessionLocal
+
+    return SessionLocal()
+
+
+revocations = RevocationStore(_session)
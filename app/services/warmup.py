@@ -0,0 +1,168 @@
+"""Warm a worker up before it takes traffic.
+
+A cold worker compiles templates, opens database connections, compiles
+SQL and initialises Argon2 and JWT on its first requests, which makes
+those requests much slower than steady state. ``run_warmup`` does all of
+that once, in a background thread started with the app:
+
+1. compile every template and render it with an empty context;
+2. open ``WARMUP_POOL_CONNECTIONS`` connections on every shard engine and
+   return them to the pool;
+3. run the hot queries (report, first list page, user lookup) once;
+4. hash and verify one password, and encode and decode one token.
+
+``GET /ready`` only reports the stored ``state``: 503 while warmup is in
+progress and 200 once it has finished, so probes never run it themselves.
+The time it took is exported as ``warmup_duration_seconds``. If warmup
+fails (e.g. the database was not reachable yet), the thread retries it every
+``WARMUP_RETRY_SECONDS``.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") not in ("0", "false", "False")
+WARMUP_POOL_CONNECTIONS = int(os.getenv("WARMUP_POOL_CONNECTIONS", "5"))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+# A user id that never exists: hot queries run their full plan and return nothing
+_NO_USER = -1
+
+_duration = metrics.gauge("warmup_duration_seconds", "Time the worker spent warming up before it was ready")
+_ready = metrics.gauge("warmup_ready", "1 once warmup has finished and the worker is ready for traffic")
+_ready.set(0)
+
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "warming up",
+            "warmup_seconds": self.seconds,
+            "steps": self.steps,
+            "error": self.error,
+        }
+
+
+    def start(self, enabled: bool = WARMUP_ENABLED, retry_seconds: float = WARMUP_RETRY_SECONDS) -> None:
+        """Warm up in a background thread, retrying until ready or stopped."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(enabled, retry_seconds), name="warmup", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, enabled: bool, retry_seconds: float) -> None:
+        while not run_warmup(enabled) and not self._stop.wait(retry_seconds):
+            pass
+
+
+state = WarmupState()
+
+
+def _templates() -> None:
+    from app.templating import templates
+
+    empty_report = {"total_count": 0, "average_result": None, "average_a": None,
+                    "average_b": None, "op_counts": {}, "recent": []}
+    context = {
+        "request": None,
+        "calculations": [],
+        "load_page": lambda: {"calculations": [], "next_page": None, "next_rows": None},
+        "load_report": lambda: empty_report,
+        "report": empty_report,
+    }
+    for name in templates.env.list_templates(extensions=["html"]):
+        template = templates.get_template(name)
+        try:
+            template.render(context)
+        except Exception:
+            # Compiled anyway; some pages need a context warmup can't fake
+            logger.debug("Warmup could not render %s", name, exc_info=True)
+
+
+def _pool() -> None:
+    from app.db import shard_map
+
+    for engine in shard_map.engines:
+        connections = [engine.connect() for _ in range(WARMUP_POOL_CONNECTIONS)]
+        for conn in connections:
+            conn.close()
+
+
+def _queries() -> None:
+    from app.db import shard_map
+    from app.models.user import User
+    from app.services.archive_service import calculations_in_window
+    from app.services.pagination import LIST_PAGE_SIZE
+    from app.services.report_service import generate_report
+
+    for factory in shard_map.sessionmakers:
+        db = factory()
+        try:
+            generate_report(db, user_id=_NO_USER)
+            calculations_in_window(db, _NO_USER, limit=LIST_PAGE_SIZE + 1)
+            db.query(User).filter(User.email == "warmup@invalid").first()
+        finally:
+            db.close()
+
+
+def _crypto() -> None:
+    from app.auth import create_access_token, decode_access_token, hash_password, verify_password
+
+    verify_password("warmup", hash_password("warmup"))
+    decode_access_token(create_access_token({"sub": "warmup@invalid"}))
+
+
+STEPS = (("templates", _templates), ("pool", _pool), ("queries", _queries), ("crypto", _crypto))
+
+
+def run_warmup(enabled: bool = WARMUP_ENABLED) -> bool:
+    """Run every warmup step once; returns whether the worker is now ready."""
+    if state.ready:
+        return True
+    if not state.lock.acquire(blocking=False):
+        return False  # another thread is warming up right now
+    try:
+        started = time.monotonic()
+        if enabled:
+            for name, step in STEPS:
+                step_started = time.monotonic()
+                try:
+                    step()
+                except Exception as exc:
+                    state.error = f"{name}: {type(exc).__name__}: {exc}".splitlines()[0]
+                    logger.exception("Warmup failed at %s", name)
+                    return False
+                state.steps[name] = round(time.monotonic() - step_started, 4)
+        state.seconds = round(time.monotonic() - started, 4)
+        state.error = None
+        state.ready = True
+        _duration.set(state.seconds)
+        _ready.set(1)
+        logger.info("Warmup finished in %.3fs", state.seconds)
+        return True
+    finally:
+        state.lock.release()
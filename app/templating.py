@@ -0,0 +1,64 @@
+"""The Jinja2 templates shared by every HTML route.
+
+``StreamingTemplateResponse`` sends a page while it renders instead of
+rendering it to one string first. The page head goes out as soon as it is
+rendered, and the rest follows in ``TEMPLATE_STREAM_CHUNK``-sized pieces. A
+view that hands the template a loader (e.g. ``load_page``) instead of
+ready-made rows runs its queries only when rendering reaches them, after the
+head has been sent. Time to first byte is then independent of the query,
+and memory is bounded by the chunk size rather than the page size.
+
+Rendering runs in the threadpool (Starlette iterates sync bodies there), so
+loaders may run blocking queries. Once the first chunk is sent, the status
+code is fixed. An error while rendering after that point truncates the page
+instead of returning a 500.
+"""
+import os
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Template
+
+from app.services.static_assets import static_url
+
+TEMPLATE_STREAM_CHUNK = int(os.getenv("TEMPLATE_STREAM_CHUNK", "16384"))
+
+templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_url
+
+
+def render_chunks(template: Template, context: Dict[str, Any], chunk_size: int = TEMPLATE_STREAM_CHUNK) -> Iterator[str]:
+    """``template.generate()`` output regrouped into chunks, flushing at ``</head>``."""
+    buffer, size, head_sent = [], 0, False
+    for piece in template.generate(context):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size or (not head_sent and "</head>" in piece):
+            yield "".join(buffer)
+            buffer, size, head_sent = [], 0, True
+    if buffer:
+        yield "".join(buffer)
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """An HTML response rendered incrementally from a template."""
+
+    def __init__(
+        self,
+        request: Request,
+        name: str,
+        context: Optional[Mapping[str, Any]] = None,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        chunk_size: int = TEMPLATE_STREAM_CHUNK,
+    ):
+        template = templates.get_template(name)
+        context = dict(context or {}, request=request)
+        super().__init__(
+            render_chunks(template, context, chunk_size),
+            status_code=status_code,
+            headers=headers,
+            media_type="text/html",
+        )
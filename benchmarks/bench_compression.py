@@ -0,0 +1,83 @@
+"""Bytes and CPU cost of response compression at typical list sizes.
+
+Renders ``calculations/list.html`` and the JSON list body for 10, 100, 1000
+and 10000 calculations, then compresses each with every installed codec at a
+few levels. Run from the repository root::
+
+    python benchmarks/bench_compression.py
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.middleware.compression import BrotliCodec, GzipCodec, ZstdCodec, brotli, zstandard  # noqa: E402
+from app.templating import templates  # noqa: E402
+
+SIZES = (10, 100, 1000, 10000)
+REPEAT = 5
+
+
+def _rows(n):
+    rng = random.Random(n)
+    start = datetime(2024, 1, 1)
+    ops = {"addition": lambda a, b: a + b, "subtraction": lambda a, b: a - b,
+           "multiplication": lambda a, b: a * b, "division": lambda a, b: a / b}
+    rows = []
+    for i in range(n):
+        op = rng.choice(list(ops))
+        a, b = round(rng.uniform(-1000, 1000), 2), round(rng.uniform(1, 1000), 2)
+        created = start + timedelta(seconds=i * 37)
+        rows.append(SimpleNamespace(id=i + 1, user_id=1, operation=op, operand_a=a, operand_b=b,
+                                    result=ops[op](a, b), created_at=created, updated_at=created))
+    return rows
+
+
+def _bodies(n):
+    rows = _rows(n)
+    # The page as the app renders it, with every row on it
+    html = templates.get_template("calculations/list.html").render(
+        load_page=lambda: {"calculations": rows, "next_page": None, "next_rows": None},
+        current_user=SimpleNamespace(email="bench@example.com"),
+    ).encode()
+    body = json.dumps([
+        {"id": r.id, "user_id": r.user_id, "type": r.operation, "a": r.operand_a, "b": r.operand_b,
+         "result": r.result, "created_at": r.created_at.isoformat(), "updated_at": r.updated_at.isoformat()}
+        for r in rows
+    ]).encode()
+    return {"html": html, "json": body}
+
+
+def _codecs():
+    codecs = [GzipCodec(1), GzipCodec(6), GzipCodec(9)]
+    if brotli is not None:
+        codecs += [BrotliCodec(1), BrotliCodec(4), BrotliCodec(11)]
+    if zstandard is not None:
+        codecs += [ZstdCodec(1), ZstdCodec(3), ZstdCodec(9)]
+    return codecs
+
+
+def _level(codec):
+    return getattr(codec, "level", getattr(codec, "quality", None))
+
+
+def main():
+    print(f"{'body':<6}{'rows':>7}{'codec':>7}{'level':>6}{'raw B':>11}{'out B':>10}{'ratio':>7}{'CPU ms':>9}")
+    for n in SIZES:
+        for kind, body in _bodies(n).items():
+            for codec in _codecs():
+                start = time.process_time()
+                for _ in range(REPEAT):
+                    out = codec.compress(body)
+                cpu_ms = (time.process_time() - start) / REPEAT * 1000
+                print(f"{kind:<6}{n:>7}{codec.name:>7}{_level(codec):>6}{len(body):>11}{len(out):>10}"
+                      f"{len(body) / len(out):>7.1f}{cpu_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
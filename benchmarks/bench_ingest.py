@@ -0,0 +1,80 @@
+"""Insert throughput with and without the write-behind ingestion queue.
+
+Concurrent writers insert calculations into a fresh SQLite file, once with a
+commit per insert (``INGEST_MODE=off``) and once group-committed through an
+``IngestQueue``, each writer waiting for its row (``INGEST_MODE=sync``).
+A lone writer waits out ``INGEST_FLUSH_INTERVAL_MS`` for every row, so
+group commit only pays off once several requests insert at the same time.
+Run from the repository root::
+
+    python benchmarks/bench_ingest.py
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.models.base_class import Base  # noqa: E402
+from app.models.calculation import Calculation  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.ingest_queue import IngestQueue  # noqa: E402
+
+WRITERS = (1, 8, 32)
+INSERTS = 2000
+
+
+def _values(i):
+    return {"user_id": 1, "a": float(i), "b": 2.0, "type": "add", "result": i + 2.0}
+
+
+def _database(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add(User(user_id=1, email="bench@example.com", hashed_password="x"))
+    db.commit()
+    db.close()
+    return engine, factory
+
+
+def _commit_each(factory):
+    def insert(i):
+        db = factory()
+        try:
+            db.add(Calculation(**_values(i)))
+            db.commit()
+        finally:
+            db.close()
+    return insert, lambda: None
+
+
+def _group_commit(factory):
+    queue = IngestQueue(session_factory=factory)
+    return (lambda i: queue.submit(_values(i)).result()), queue.stop
+
+
+def main():
+    print(f"{'mode':<8}{'writers':>8}{'inserts':>9}{'seconds':>9}{'rows/s':>10}")
+    for mode, setup in (("off", _commit_each), ("sync", _group_commit)):
+        for writers in WRITERS:
+            with tempfile.TemporaryDirectory() as tmp:
+                engine, factory = _database(os.path.join(tmp, "bench.db"))
+                insert, done = setup(factory)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(writers) as pool:
+                    list(pool.map(insert, range(INSERTS)))
+                elapsed = time.perf_counter() - start
+                done()
+                engine.dispose()
+            print(f"{mode:<8}{writers:>8}{INSERTS:>9}{elapsed:>9.2f}{INSERTS / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
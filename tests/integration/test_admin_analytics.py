@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import dependencies
+from app.db import SessionLocal, shard_map
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.analytics_rollup import DailyRollup
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services import analytics
+from app.services.analytics import refresh_rollups
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def users(db_session, monkeypatch):
+    """Two users with calculations over three days; the first one is an admin."""
+    admin = User(email="ops@example.com", hashed_password="x")
+    other = User(email="user@example.com", hashed_password="x")
+    db_session.add_all([admin, other])
+    db_session.commit()
+    now = datetime.utcnow()
+    for days_ago, user, op, result in [
+        (2, other, "add", 3.0), (1, other, "add", 5.0), (1, other, "mul", 2000.0),
+        (1, admin, "add", -4.0), (0, other, "div", 0.5), (0, admin, "add", 1.0), (0, admin, "add", 3.0),
+    ]:
+        db_session.add(Calculation(user_id=user.user_id, a=1, b=1, type=op, result=result,
+                                   created_at=now - timedelta(days=days_ago)))
+    db_session.commit()
+
+    monkeypatch.setattr(dependencies, "ADMIN_EMAILS", {"ops@example.com"})
+    analytics.cache.clear()
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: admin
+    yield admin, other
+    if previous is not None:
+        app.dependency_overrides[get_current_user] = previous
+    else:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_rollups_are_incremental(db_session, users):
+    assert refresh_rollups(shard_map.sessionmakers, SessionLocal) == 3
+    assert db_session.query(DailyRollup).count() == 6
+    # The next pass only rebuilds the trailing refresh window
+    assert refresh_rollups(shard_map.sessionmakers, SessionLocal) == analytics.ANALYTICS_REFRESH_DAYS
+
+
+def test_admin_analytics_endpoints(users):
+    admin, other = users
+    refresh_rollups(shard_map.sessionmakers, SessionLocal)
+
+    ops = client.get("/admin/analytics/operations?days=7").json()["operations"]
+    today_add = [o for o in ops if o["operation"] == "add"][-1]
+    assert today_add["count"] == 2 and today_add["mean"] == 2.0 and today_add["stddev"] == 1.0
+    assert (today_add["min"], today_add["max"]) == (1.0, 3.0)
+
+    top = client.get("/admin/analytics/users/top?days=7&n=1").json()["users"]
+    assert top == [{"rank": 1, "user_id": other.user_id, "email": "user@example.com", "count": 4, "active_days": 3}]
+    top_add = client.get("/admin/analytics/users/top?days=7&operation=add").json()["users"]
+    assert [(u["rank"], u["user_id"]) for u in top_add] == [(1, admin.user_id), (2, other.user_id)]
+
+    active = client.get("/admin/analytics/users/active?days=7").json()["days"]
+    assert [d["active_users"] for d in active] == [1, 2, 2]
+    assert [d["moving_average_7"] for d in active] == [1.0, 1.5, 1.667]
+
+    dist = client.get("/admin/analytics/results/distribution?days=7&operation=mul").json()
+    assert dist["days"][0]["counts"] == {"[1000, 1e+06)": 1}
+
+
+def test_answers_are_cached_until_the_next_rollup(db_session, users):
+    admin, _ = users
+    refresh_rollups(shard_map.sessionmakers, SessionLocal)
+    first = client.get("/admin/analytics/users/active?days=7").json()
+
+    db_session.add(Calculation(user_id=admin.user_id, a=1, b=1, type="add", result=2.0,
+                               created_at=datetime.utcnow() - timedelta(days=2)))
+    db_session.commit()
+    assert client.get("/admin/analytics/users/active?days=7").json() == first
+
+    refresh_rollups(shard_map.sessionmakers, SessionLocal, since=datetime.utcnow().date() - timedelta(days=2))
+    assert client.get("/admin/analytics/users/active?days=7").json()["days"][0]["active_users"] == 2
+
+
+def test_analytics_are_admin_only(users):
+    _, other = users
+    app.dependency_overrides[get_current_user] = lambda: other
+    assert client.get("/admin/analytics/operations").status_code == 403
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from app.db import SessionLocal
+from app.models.calculation import Calculation
+from app.models.calculation_archive import CalculationArchive
+from app.services.archive_service import archive_old_calculations, calculations_in_window
+from app.services.report_service import generate_report
+
+USER_ID = 5
+
+
+def _seed(db):
+    now = datetime.utcnow()
+    db.add_all([
+        Calculation(user_id=USER_ID, a=1, b=2, type="add", result=3, created_at=now - timedelta(days=400)),
+        Calculation(user_id=USER_ID, a=8, b=2, type="div", result=4, created_at=now - timedelta(days=200)),
+        Calculation(user_id=USER_ID, a=3, b=3, type="mul", result=9, created_at=now - timedelta(days=1)),
+        Calculation(user_id=USER_ID, a=5, b=1, type="add", result=6, created_at=now),
+    ])
+    db.commit()
+    return now
+
+
+def test_archival_keeps_report_totals_exact(db_session):
+    now = _seed(db_session)
+    before = generate_report(db_session, USER_ID)
+
+    cutoff = now - timedelta(days=30)
+    moved = archive_old_calculations([SessionLocal], cutoff, batch_size=1, pause=0)
+    assert moved == 2
+    assert db_session.query(Calculation).filter_by(user_id=USER_ID).count() == 2
+    assert db_session.query(CalculationArchive).filter_by(user_id=USER_ID).count() == 2
+
+    after = generate_report(db_session, USER_ID)
+    assert after["total_count"] == before["total_count"] == 4
+    assert after["op_counts"] == before["op_counts"]
+    assert after["average_result"] == before["average_result"]
+    assert after["average_a"] == before["average_a"]
+
+
+def test_window_reads_archive_only_when_needed(db_session):
+    now = _seed(db_session)
+    cutoff = now - timedelta(days=30)
+    archive_old_calculations([SessionLocal], cutoff, pause=0)
+
+    hot = calculations_in_window(db_session, USER_ID, cutoff=cutoff)
+    assert [c.result for c in hot] == [6, 9]
+
+    recent = calculations_in_window(db_session, USER_ID, since=now - timedelta(days=7), cutoff=cutoff)
+    assert [c.result for c in recent] == [6, 9]
+
+    everything = calculations_in_window(db_session, USER_ID, since=now - timedelta(days=500), cutoff=cutoff)
+    assert [c.result for c in everything] == [6, 9, 4, 3]
+
+    old_adds = calculations_in_window(
+        db_session, USER_ID, since=now - timedelta(days=500), cutoff=cutoff,
+        where=lambda m: [m.type == "add"],
+    )
+    assert [c.result for c in old_adds] == [6, 3]
@@ -20,4 +20,24 @@ def test_calculation_bread_flow():
 
     # NOTE: The test now runs AS DUMMY_USER
     r = client.post("/calculations/add", data=create_payload, follow_redirects=False)
-    assert r.status_code == 303
\ No newline at end of file
+    assert r.status_code == 303
+
+def test_expression_calculation_is_persisted(db_session):
+    from app.models.calculation import Calculation
+
+    r = client.post(
+        "/calculations/add",
+        data={"operand1": 2, "operand2": 3, "operation": "expr", "expression": "(a + b) * 2 ^ 2"},
+        follow_redirects=False,
+    )
+    assert r.status_code == 303
+    calc = db_session.query(Calculation).filter(Calculation.type == "expr").one()
+    assert calc.result == 20.0
+    assert calc.expression == "(a + b) * 2 ^ 2"
+
+    r = client.post(
+        "/calculations/add",
+        data={"operand1": 2, "operand2": 3, "operation": "expr", "expression": "a +"},
+        follow_redirects=False,
+    )
+    assert r.status_code == 400
@@ -0,0 +1,124 @@
+import io
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.db import engine, shard_map
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services.change_log import changes_since, encode_cursor, latest_seq, prune_changes
+from app.services.import_service import import_calculations
+from app.services.recompute_service import recompute_calculations
+
+client = TestClient(app)
+
+
+def _as_user(user_id):
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: User(id=user_id, email="t@t.com", hashed_password="x")
+    return previous
+
+
+def _restore(previous):
+    if previous is None:
+        app.dependency_overrides.pop(get_current_user, None)
+    else:
+        app.dependency_overrides[get_current_user] = previous
+
+
+def test_changes_since_cursor(db_session):
+    previous = _as_user(1)
+    try:
+        r = client.get("/calculations/changes")
+        assert r.json()["reset"] is True
+        cursor = r.json()["cursor"]
+
+        kept = Calculation(user_id=1, a=1, b=2, type="add", result=3)
+        dropped = Calculation(user_id=1, a=5, b=5, type="add", result=10)
+        db_session.add_all([kept, dropped, Calculation(user_id=2, a=1, b=1, type="add", result=2)])
+        db_session.commit()
+        kept.result = 4
+        db_session.commit()
+        db_session.delete(dropped)
+        db_session.commit()
+
+        body = client.get("/calculations/changes", params={"since": cursor}).json()
+        assert body["reset"] is False and body["has_more"] is False
+        by_id = {c["id"]: c for c in body["changes"]}
+        assert set(by_id) == {kept.id, dropped.id}
+        assert by_id[kept.id]["op"] == "insert" and by_id[kept.id]["calculation"]["result"] == 4
+        assert by_id[dropped.id] == {"seq": by_id[dropped.id]["seq"], "op": "delete",
+                                     "id": dropped.id, "calculation": None}
+
+        # Nothing new: same cursor back
+        again = client.get("/calculations/changes", params={"since": body["cursor"]}).json()
+        assert again == {"changes": [], "cursor": body["cursor"], "has_more": False, "reset": False}
+    finally:
+        _restore(previous)
+
+
+def test_changes_are_paginated(db_session):
+    for i in range(5):
+        db_session.add(Calculation(user_id=1, a=i, b=1, type="add", result=i + 1))
+        db_session.commit()
+
+    cursor, seen = encode_cursor(0, 0), []
+    while True:
+        page = changes_since(db_session, 1, 0, cursor, limit=2)
+        seen += [c["id"] for c in page["changes"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert len(seen) == 5 and len(set(seen)) == 5
+
+
+def test_unusable_cursor_resets(db_session):
+    db_session.add(Calculation(user_id=1, a=1, b=1, type="add", result=2))
+    db_session.commit()
+    current = latest_seq(db_session)
+
+    assert changes_since(db_session, 1, 0, "garbage")["reset"] is True
+    # The user's calculations now live on shard 1
+    assert changes_since(db_session, 1, 1, encode_cursor(0, current))["reset"] is True
+
+    db_session.add(Calculation(user_id=1, a=2, b=2, type="add", result=4))
+    db_session.commit()
+    prune_changes(db_session, datetime.utcnow() + timedelta(seconds=1))
+    db_session.add(Calculation(user_id=1, a=3, b=3, type="add", result=6))
+    db_session.commit()
+    assert changes_since(db_session, 1, 0, encode_cursor(0, current - 1))["reset"] is True
+
+
+def test_stale_cursor_resets_after_pruning_everything(db_session):
+    for i in range(3):
+        db_session.add(Calculation(user_id=1, a=i, b=1, type="add", result=i + 1))
+        db_session.commit()
+    stale = encode_cursor(0, latest_seq(db_session) - 2)
+    current = encode_cursor(0, latest_seq(db_session))
+
+    prune_changes(db_session, datetime.utcnow() + timedelta(seconds=1))
+    assert changes_since(db_session, 1, 0, stale)["reset"] is True
+    assert changes_since(db_session, 1, 0, current) == {
+        "changes": [], "cursor": current, "has_more": False, "reset": False,
+    }
+
+
+def test_bulk_paths_are_logged(db_session):
+    db_session.add(User(id=1, email="bulk@example.com", hashed_password="x"))
+    db_session.commit()
+    before = encode_cursor(0, latest_seq(db_session))
+    data = "user_id,a,b,type\n1,1,2,add\n1,3,4,mul\n"
+    import_calculations(io.StringIO(data), "csv", shard_map, transaction_rows=1)
+    page = changes_since(db_session, 1, 0, before)
+    assert [c["op"] for c in page["changes"]] == ["insert", "insert"]
+
+    db_session.query(Calculation).filter(Calculation.type == "mul").update({"result": 0})
+    db_session.commit()
+    cursor = page["cursor"]
+    stats = recompute_calculations([sessionmaker(bind=engine)], fix=True)
+    assert stats["fixed"] == 1
+    fixed = changes_since(db_session, 1, 0, cursor)["changes"]
+    assert [(c["op"], c["calculation"]["result"]) for c in fixed] == [("update", 12)]
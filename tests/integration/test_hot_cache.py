@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import SessionLocal
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services.archive_service import calculations_in_window
+from app.services.change_log import UPDATE, record_changes
+from app.services.hot_cache import HotUserCache, hot_cache
+from app.services.metrics import metrics
+from app.services.report_service import generate_report
+
+client = TestClient(app)
+
+OPERATIONS = ("add", "sub", "mul", "div")
+START = datetime(2026, 3, 1)
+
+
+def _seed(db, user, count, offset=0):
+    rows = [
+        Calculation(user_id=user.user_id, a=float(i), b=2.0, type=OPERATIONS[i % 4], result=float(i % 7),
+                    # Some rows share a timestamp, so the id breaks ties
+                    created_at=START + timedelta(minutes=(i // 3) * 10))
+        for i in range(offset, offset + count)
+    ]
+    db.add_all(rows)
+    db.commit()
+
+
+@pytest.fixture
+def user(db_session, monkeypatch):
+    """A user with 120 calculations and the shared cache turned on."""
+    user = User(email="hot@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    _seed(db_session, user, 120)
+    monkeypatch.setattr(hot_cache, "max_bytes", 1 << 20)
+    hot_cache.clear()
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield user
+    hot_cache.clear()
+    if previous is not None:
+        app.dependency_overrides[get_current_user] = previous
+    else:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+def _key(rows):
+    return [(r.id, r.a, r.b, r.type, r.result, r.expression, r.created_at) for r in rows]
+
+
+def _assert_pages_match(db, cache, user_id):
+    windows = [{}, {"since": START + timedelta(hours=1)}, {"until": START + timedelta(hours=2)}]
+    searches = [
+        ({}, None), ({"result": 3.0}, lambda m: [m.result == 3.0]),
+        ({"operation_like": "U"}, lambda m: [m.type.ilike("%U%")]),
+        ({"operation_like": "d_v"}, lambda m: [m.type.ilike("%d_v%")]),
+        ({"search_id": 7}, lambda m: [m.id == 7]),
+    ]
+    for window in windows:
+        for search, where in searches:
+            after = None
+            while True:
+                expected = calculations_in_window(db, user_id, where=where, after=after, limit=11, **window)
+                cached = cache.page(db, user_id, after=after, limit=11, **window, **search)
+                assert _key(cached) == _key(expected), (window, search, after)
+                if len(expected) < 11:
+                    break
+                after = (expected[9].created_at, expected[9].id)
+
+
+def test_pages_match_the_database(db_session, user):
+    _assert_pages_match(db_session, hot_cache, user.user_id)
+    assert hot_cache.users() == 1 and hot_cache.bytes > 0
+
+
+def test_writes_are_applied_in_place(db_session, user):
+    cache = HotUserCache(max_bytes=1 << 20)
+    assert len(cache.page(db_session, user.user_id, limit=500)) == 120
+    entry = cache._entries[user.user_id]
+    reloads = metrics.counter("hot_cache_requests_total", "").value(result="reload")
+
+    # Through the routes
+    client.post("/calculations/add", data={"operand1": "2", "operand2": "5", "operation": "mul"},
+                follow_redirects=False)
+    first = db_session.query(Calculation).order_by(Calculation.id).first()
+    client.post(f"/calculations/{first.id}/edit", data={"operand1": "1", "operand2": "1", "operation": "add"},
+                follow_redirects=False)
+    client.post(f"/calculations/{first.id + 1}/delete", follow_redirects=False)
+    # Through a bulk path that bypasses the ORM, from another session
+    other = SessionLocal()
+    try:
+        other.query(Calculation).filter(Calculation.id == first.id + 2).update({"result": 99.0})
+        record_changes(other.connection(), [(user.user_id, first.id + 2, UPDATE)])
+        _seed(other, user, 3, offset=120)
+        other.commit()
+    finally:
+        other.close()
+
+    db_session.expire_all()
+    _assert_pages_match(db_session, cache, user.user_id)
+    assert cache._entries[user.user_id] is entry and entry.n == 123
+    assert metrics.counter("hot_cache_requests_total", "").value(result="reload") == reloads
+    assert cache.page(db_session, user.user_id, result=99.0)[0].id == first.id + 2
+
+
+def test_least_recently_used_users_are_evicted(db_session, user):
+    other = User(email="cold@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+    _seed(db_session, other, 120)
+
+    cache = HotUserCache(max_bytes=1 << 20)
+    cache.page(db_session, user.user_id)
+    one_user = cache.bytes
+    cache.max_bytes = one_user + one_user // 2
+    cache.page(db_session, other.user_id)
+    assert list(cache._entries) == [other.user_id] and cache.bytes <= cache.max_bytes
+
+    # A user larger than the whole budget is answered but not kept
+    cache.max_bytes = 100
+    assert len(cache.page(db_session, user.user_id)) == 50
+    assert cache.users() == 0 and cache.bytes == 0
+
+
+def test_report_and_pages_are_served_from_the_cache(db_session, user, monkeypatch):
+    expected = generate_report(db_session, user.user_id)
+    monkeypatch.setattr(hot_cache, "max_bytes", 0)
+    assert generate_report(db_session, user.user_id) == expected
+
+    monkeypatch.setattr(hot_cache, "max_bytes", 1 << 20)
+    assert client.get("/calculations/report", headers={"accept": "application/json"}).json() == expected
+    page = client.get("/calculations/search?q=sub", headers={"accept": "text/html"}).text
+    assert page.count("<td>sub</td>") == 30
+    assert hot_cache.users() == 1
@@ -0,0 +1,78 @@
+import io
+import json
+from collections import Counter
+from datetime import datetime
+
+from app.db import engine, shard_map
+from app.models.calculation import Calculation
+from app.models.calculation_change import CalculationChange
+from app.models.user import User
+from app.services.import_service import CSV, JSONL, ExecutemanyLoader, import_calculations, validate_record
+
+CSV_INPUT = """user_id,a,b,type,expression,created_at
+1,1,2,add,,2024-01-02T03:04:05
+1,6,3,div,,
+1,2,0,div,,
+1,2,3,expr,(a + b) ^ 2,
+,4,4,mul,,
+1,-8,0.5,pow,,
+1,x,1,add,,
+404,1,1,add,,
+"""
+
+
+def _users(db, *user_ids):
+    db.add_all([User(id=uid, email=f"import{uid}@example.com", hashed_password="x") for uid in user_ids])
+    db.commit()
+
+
+def test_csv_import_loads_valid_rows_and_rejects_the_rest(db_session):
+    _users(db_session, 1)
+    rejects = io.StringIO()
+    stats = import_calculations(io.StringIO(CSV_INPUT), CSV, shard_map, batch_size=3, rejects=rejects)
+
+    assert stats["read"] == 8
+    assert stats["imported"] == 3
+    assert stats["rejected"] == 5
+    assert stats["rows_per_second"] > 0
+
+    rows = {c.type: c for c in db_session.query(Calculation).filter(Calculation.user_id == 1)}
+    assert rows["add"].result == 3 and rows["add"].created_at.year == 2024
+    assert rows["div"].result == 2
+    assert rows["expr"].result == 25 and rows["expr"].expression == "(a + b) ^ 2"
+
+    rejected_lines = sorted(json.loads(line)["line"] for line in rejects.getvalue().splitlines())
+    assert rejected_lines == [4, 6, 7, 8, 9]
+    assert json.loads(rejects.getvalue().splitlines()[-1])["error"] == "Unknown user_id 404"
+    assert db_session.query(Calculation).filter(Calculation.user_id == 404).count() == 0
+
+
+def test_jsonl_import_with_default_user(db_session):
+    _users(db_session, 5)
+    source = io.StringIO('{"a": 1, "b": 1, "operation": "sub"}\nnot json\n{"a": 7, "b": 2, "type": "mod"}\n')
+    stats = import_calculations(source, JSONL, shard_map, default_user_id=5)
+    assert (stats["imported"], stats["rejected"]) == (2, 1)
+    assert sorted(c.result for c in db_session.query(Calculation).filter(Calculation.user_id == 5)) == [0, 1]
+
+
+def test_explicit_user_id_zero_is_not_replaced_by_the_default():
+    now = datetime.utcnow()
+    assert validate_record({"user_id": 0, "a": 1, "b": 1, "type": "add"}, 5, now)["user_id"] == 0
+    assert validate_record({"user_id": "", "a": 1, "b": 1, "type": "add"}, 5, now)["user_id"] == 5
+
+
+def test_loader_logs_only_its_own_rows(db_session):
+    _users(db_session, 1)
+    row = {"user_id": 1, "operation": "add", "operand_a": 1, "operand_b": 1, "result": 2,
+           "expression": None, "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+    loader = ExecutemanyLoader(engine, transaction_rows=1)
+    loader.write([dict(row)])
+    # A live insert between two loader transactions is logged by the session hook
+    db_session.add(Calculation(user_id=1, a=5, b=5, type="add", result=10))
+    db_session.commit()
+    loader.write([dict(row), dict(row)])
+    loader.close()
+
+    logged = Counter(c.calculation_id for c in db_session.query(CalculationChange))
+    ids = [c.id for c in db_session.query(Calculation)]
+    assert len(ids) == 4 and all(logged[i] == 1 for i in ids)
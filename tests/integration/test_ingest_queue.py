@@ -0,0 +1,89 @@
+import queue
+from concurrent.futures import Future
+
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.routers import calculations as calculations_router
+from app.services import ingest_queue as ingest_module
+from app.services.ingest_queue import IngestQueue
+
+
+def _values(i):
+    return {"user_id": 7, "a": float(i), "b": 1.0, "type": "add", "result": i + 1.0}
+
+
+def test_queued_inserts_are_group_committed(db_session):
+    q = IngestQueue(batch_size=10, flush_interval=0.05)
+    try:
+        futures = [q.submit(_values(i)) for i in range(25)]
+        ids = [f.result(timeout=5) for f in futures]
+    finally:
+        q.stop()
+
+    assert len(set(ids)) == 25
+    rows = db_session.query(Calculation).filter(Calculation.user_id == 7).all()
+    assert len(rows) == 25
+    assert sorted(r.result for r in rows) == [i + 1.0 for i in range(25)]
+
+
+def test_stop_drains_pending_inserts(db_session):
+    # A long flush interval means nothing is committed until stop() drains
+    q = IngestQueue(batch_size=1000, flush_interval=60)
+    futures = [q.submit(_values(i)) for i in range(5)]
+    q.stop()
+
+    assert all(f.done() and f.exception() is None for f in futures)
+    assert db_session.query(Calculation).filter(Calculation.user_id == 7).count() == 5
+
+
+def test_bad_row_fails_alone(db_session):
+    q = IngestQueue(batch_size=10, flush_interval=0.05)
+    try:
+        good = q.submit(_values(1))
+        bad = q.submit({"user_id": 7, "a": 1.0, "b": 1.0, "type": "add", "result": None})
+        assert good.result(timeout=5) is not None
+        assert bad.exception(timeout=5) is not None
+    finally:
+        q.stop()
+
+
+def test_failed_queued_insert_is_a_clean_error(db_session, monkeypatch):
+    user = User(email="ingest@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    monkeypatch.setattr(ingest_module, "INGEST_MODE", "sync")
+    monkeypatch.setattr(calculations_router, "INGEST_MODE", "sync")
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+    form = {"operand1": "1", "operand2": "2", "operation": "add"}
+    try:
+        for error, status in [(IntegrityError("INSERT", {}, Exception("fk")), 400),
+                              (OperationalError("INSERT", {}, Exception("locked")), 503)]:
+            failed = Future()
+            failed.set_exception(error)
+            monkeypatch.setattr(ingest_module.ingest_queue, "submit", lambda values, timeout=None, f=failed: f)
+            r = client.post("/calculations/add", data=form, follow_redirects=False)
+            assert r.status_code == status
+
+        # A batch that never commits, or a queue that stays full, is a 503 after INGEST_WAIT_SECONDS
+        monkeypatch.setattr(calculations_router, "INGEST_WAIT_SECONDS", 0.05)
+        monkeypatch.setattr(ingest_module.ingest_queue, "submit", lambda values, timeout=None: Future())
+        assert client.post("/calculations/add", data=form, follow_redirects=False).status_code == 503
+
+        def full(values, timeout=None):
+            assert timeout == 0.05
+            raise queue.Full
+
+        monkeypatch.setattr(ingest_module.ingest_queue, "submit", full)
+        assert client.post("/calculations/add", data=form, follow_redirects=False).status_code == 503
+    finally:
+        if previous is not None:
+            app.dependency_overrides[get_current_user] = previous
+        else:
+            app.dependency_overrides.pop(get_current_user, None)
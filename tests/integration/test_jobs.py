@@ -0,0 +1,179 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import SessionLocal
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.job import Job
+from app.models.user import User
+from app.services import jobs
+from app.services.jobs import JobRunner, execute_job
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def user(db_session):
+    """A real user, authenticated for every request of the test."""
+    user = User(email="jobs@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield user
+    if previous is not None:
+        app.dependency_overrides[get_current_user] = previous
+    else:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def runner(tmp_path):
+    return JobRunner(SessionLocal, workers=0, results_dir=str(tmp_path))
+
+
+def _submit(kind, **params):
+    r = client.post("/jobs", json={"kind": kind, "params": params})
+    assert r.status_code == 202, r.text
+    assert r.headers["Location"] == f"/jobs/{r.json()['id']}"
+    return r.json()
+
+
+def test_compute_job_runs_and_result_downloads(db_session, user, runner):
+    calcs = [
+        {"a": 6, "b": 3, "type": "div"},
+        {"a": 1, "b": 0, "type": "div"},
+        {"a": 2, "b": 5, "type": "expr", "expression": "a * b + 1", "user_id": 999},
+    ]
+    job = _submit("compute", calculations=calcs, save=True)
+    assert job["status"] == "queued" and job["result_url"] is None
+
+    assert runner.run_once() == 1
+    job = client.get(f"/jobs/{job['id']}").json()
+    assert job["status"] == "succeeded" and job["progress"] == 1.0
+    assert job["detail"] == "2 computed, 1 rejected"
+
+    r = client.get(job["result_url"])
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0] == {"index": 0, "result": 2.0}
+    assert lines[1]["index"] == 1 and "error" in lines[1]
+    assert lines[2] == {"index": 2, "result": 11.0}
+    # Saved for the job's owner, whatever user_id the input carried
+    saved = db_session.query(Calculation.user_id, Calculation.result).order_by(Calculation.id).all()
+    assert saved == [(user.user_id, 2.0), (user.user_id, 11.0)]
+
+
+def test_requeued_compute_job_does_not_save_chunks_twice(db_session, user, runner, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_CHUNK_SIZE", 1)
+    job = _submit("compute", calculations=[{"a": i, "b": 1, "type": "add"} for i in range(3)], save=True)
+    # The first attempt stored the first chunk, then its worker died
+    db_session.add(Calculation(user_id=user.user_id, a=0, b=1, type="add", result=1.0))
+    db_session.query(Job).filter(Job.id == job["id"]).update(
+        {"status": "running", "attempts": 2, "saved_items": 1}
+    )
+    db_session.commit()
+
+    # A run that lost its claim stores nothing
+    assert execute_job(job["id"], 1, runner.results_dir) == "cancelled"
+    assert db_session.query(Calculation).count() == 1
+    db_session.query(Job).filter(Job.id == job["id"]).update({"status": "running"})
+    db_session.commit()
+
+    assert execute_job(job["id"], 2, runner.results_dir) == "succeeded"
+    db_session.expire_all()
+    assert sorted(r for (r,) in db_session.query(Calculation.result)) == [1.0, 2.0, 3.0]
+    assert db_session.get(Job, job["id"]).saved_items == 3
+    r = client.get(client.get(f"/jobs/{job['id']}").json()["result_url"])
+    assert [json.loads(line)["result"] for line in r.text.splitlines()] == [1.0, 2.0, 3.0]
+
+
+def test_export_job_matches_export_endpoint(db_session, user, runner):
+    for i in range(3):
+        db_session.add(Calculation(user_id=user.user_id, a=i, b=1, type="add", result=i + 1))
+    db_session.commit()
+
+    job = _submit("export", format="json")
+    runner.run_once()
+    job = client.get(f"/jobs/{job['id']}").json()
+    exported = client.get(job["result_url"]).json()
+    assert exported == client.get("/calculations/export").json()
+    assert [row["result"] for row in exported] == [1.0, 2.0, 3.0]
+
+
+def test_invalid_jobs_are_rejected(user, monkeypatch):
+    assert client.post("/jobs", json={"kind": "mine-bitcoin"}).status_code == 422
+    r = client.post("/jobs", json={"kind": "compute", "params": {"calculations": []}})
+    assert r.status_code == 400
+    r = client.post("/jobs", json={"kind": "export", "params": {"format": "xml"}})
+    assert r.status_code == 400
+
+    monkeypatch.setattr(jobs, "JOB_MAX_ACTIVE_PER_USER", 1)
+    _submit("report")
+    assert client.post("/jobs", json={"kind": "report"}).status_code == 429
+
+
+def test_running_jobs_are_limited_per_user(db_session, user, runner):
+    other = User(email="other@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+    busy = _submit("report")
+    waiting = _submit("report")
+    # The first job is running on another worker
+    db_session.query(Job).filter(Job.id == busy["id"]).update(
+        {"status": "running", "attempts": 1, "heartbeat_at": datetime.utcnow()}
+    )
+    db_session.add(Job(id="other", user_id=other.user_id, kind="report", params="{}", status="queued",
+                       progress=0.0, attempts=0, cancel_requested=False))
+    db_session.commit()
+
+    assert runner.run_once() == 1
+    db_session.expire_all()
+    assert db_session.get(Job, "other").status == "succeeded"
+    assert db_session.get(Job, waiting["id"]).status == "queued"
+
+
+def test_cancel_queued_and_running_jobs(db_session, user, runner):
+    queued = _submit("report")
+    r = client.post(f"/jobs/{queued['id']}/cancel")
+    assert r.json()["status"] == "cancelled"
+    assert runner.run_once() == 0
+
+    running = _submit("compute", calculations=[{"a": 1, "b": 2, "type": "add"}] * 10)
+    [(job_id, attempt, _)] = runner._claim(db_session)
+    client.post(f"/jobs/{running['id']}/cancel")
+    assert execute_job(job_id, attempt, runner.results_dir) == "cancelled"
+    job = client.get(f"/jobs/{running['id']}").json()
+    assert job["status"] == "cancelled"
+    assert client.get(f"/jobs/{running['id']}/result").status_code == 409
+
+
+def test_orphaned_jobs_are_recovered(db_session, user, runner):
+    orphan = _submit("report")
+    stale = datetime.utcnow() - timedelta(minutes=5)
+    db_session.query(Job).filter(Job.id == orphan["id"]).update(
+        {"status": "running", "attempts": 1, "heartbeat_at": stale}
+    )
+    db_session.commit()
+
+    # The worker that claimed it died: it is requeued and run again
+    assert runner.run_once() == 1
+    job = client.get(f"/jobs/{orphan['id']}").json()
+    assert job["status"] == "succeeded" and job["attempts"] == 2
+
+    # The lost run cannot overwrite the new one
+    assert execute_job(orphan["id"], 1, runner.results_dir) == "cancelled"
+    assert client.get(f"/jobs/{orphan['id']}").json()["status"] == "succeeded"
+
+    # Until it has used up its attempts
+    db_session.query(Job).filter(Job.id == orphan["id"]).update(
+        {"status": "running", "attempts": jobs.JOB_MAX_ATTEMPTS, "heartbeat_at": stale}
+    )
+    db_session.commit()
+    runner.run_once()
+    job = client.get(f"/jobs/{orphan['id']}").json()
+    assert job["status"] == "failed" and job["error"] == "Worker lost while running the job"
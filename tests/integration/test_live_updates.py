@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from app.db import engine
+from app.models.calculation import Calculation
+from app.services.live_updates import LiveUpdates, event_stream
+
+
+def _hub():
+    hub = LiveUpdates(report_loader=lambda user_id: {"total_count": user_id})
+    factory = sessionmaker(bind=engine)
+    hub.install(factory)
+    return hub, factory
+
+
+def _write(factory):
+    db = factory()
+    calc = Calculation(user_id=1, a=1, b=2, type="add", result=3)
+    db.add(calc)
+    db.add(Calculation(user_id=2, a=1, b=1, type="add", result=2))
+    db.commit()
+    calc.result = 4
+    db.commit()
+    db.delete(calc)
+    db.commit()
+    db.close()
+
+
+def test_committed_changes_reach_only_the_owner(db_session):
+    hub, factory = _hub()
+
+    async def scenario():
+        queue = hub.subscribe(1)
+        await asyncio.to_thread(_write, factory)
+        changes, reports = [], []
+        while len(changes) < 3 or not reports:
+            item = await asyncio.wait_for(queue.get(), 5)
+            (reports if item["event"] == "report" else changes).append(item)
+        hub.unsubscribe(1, queue)
+        return changes, reports
+
+    changes, reports = asyncio.run(scenario())
+    assert [item["event"] for item in changes] == ["created", "updated", "deleted"]
+    assert reports[0]["data"] == {"total_count": 1}
+    created = changes[0]
+    assert created["data"]["result"] == 3 and created["data"]["id"] is not None
+    assert hub.connections() == 0
+
+
+def test_rolled_back_changes_are_not_published(db_session):
+    hub, factory = _hub()
+
+    async def scenario():
+        queue = hub.subscribe(1)
+        db = factory()
+        db.add(Calculation(user_id=1, a=1, b=2, type="add", result=3))
+        db.flush()
+        db.rollback()
+        db.close()
+        await asyncio.sleep(0.05)
+        return queue.qsize()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_slow_stream_gets_resync():
+    hub = LiveUpdates(queue_size=2, report_loader=None)
+
+    async def scenario():
+        stream = event_stream(1, hub, heartbeat=0.01)
+        assert await stream.__anext__() == ": connected\n\n"
+        assert await stream.__anext__() == ": ping\n\n"
+        hub.deliver({"user_id": 1, "events": [{"event": "created", "data": {"id": i}} for i in range(3)]})
+        await asyncio.sleep(0)
+        frame = await stream.__anext__()
+        await stream.aclose()
+        return frame
+
+    frame = asyncio.run(scenario())
+    assert frame.startswith("event: resync\n")
+    assert hub.connections() == 0
+
+
+def test_sse_frame_format():
+    from app.services.live_updates import format_sse
+
+    frame = format_sse({"event": "created", "data": {"id": 1}})
+    assert frame == "event: created\ndata: " + json.dumps({"id": 1}) + "\n\n"
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import dependencies
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services.memory_profiler import memory_profiler
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def admin(db_session, monkeypatch):
+    """An admin with a few calculations; profiling is always stopped afterwards."""
+    admin = User(email="ops@example.com", hashed_password="x")
+    db_session.add(admin)
+    db_session.commit()
+    for i in range(5):
+        db_session.add(Calculation(user_id=admin.user_id, a=i, b=1, type="add", result=i + 1))
+    db_session.commit()
+
+    monkeypatch.setattr(dependencies, "ADMIN_EMAILS", {"ops@example.com"})
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: admin
+    yield admin
+    if memory_profiler.active:
+        memory_profiler.stop()
+    if previous is not None:
+        app.dependency_overrides[get_current_user] = previous
+    else:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_memory_profiling_reports_routes_and_allocations(admin):
+    r = client.post("/admin/diagnostics/memory/start?sample_rate=1")
+    assert r.status_code == 200 and r.json()["tracing"] is True
+
+    assert client.get("/calculations", headers={"accept": "text/html"}).status_code == 200
+    status = client.get("/admin/diagnostics/memory").json()
+    assert status["traced_bytes"] > 0
+    route = status["routes"]["GET /calculations"]
+    assert route["requests"] == 1 and route["samples"] == 1
+    assert route["identity_map_max"] == 5
+    assert route["peak_bytes_max"] > 0
+
+    keep = [bytearray(1024) for _ in range(1000)]  # noqa: F841 - grows the heap between snapshots
+    snapshot = client.post("/admin/diagnostics/memory/snapshot?top=5").json()
+    assert len(snapshot["top"]) == 5
+    assert any("test_memory_diagnostics.py:" in site["site"] for site in snapshot["top"])
+    assert client.post("/admin/diagnostics/memory/snapshot?group_by=module").status_code == 400
+
+    r = client.post("/admin/diagnostics/memory/stop")
+    assert r.json()["tracing"] is False
+    assert client.post("/admin/diagnostics/memory/snapshot").status_code == 409
+    # Requests are not accounted for once stopped
+    client.get("/calculations", headers={"accept": "text/html"})
+    assert client.get("/admin/diagnostics/memory").json()["routes"]["GET /calculations"]["requests"] == 1
+
+
+def test_memory_diagnostics_are_admin_only(db_session, admin):
+    other = User(email="user@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+    app.dependency_overrides[get_current_user] = lambda: other
+    assert client.post("/admin/diagnostics/memory/start").status_code == 403
+    assert memory_profiler.active is False
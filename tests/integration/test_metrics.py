@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+from app import dependencies
+from app.auth import create_access_token
+from app.main import app
+from app.models.user import User
+
+client = TestClient(app)
+
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_metrics_need_the_scrape_token_or_an_admin(db_session, monkeypatch):
+    db_session.add_all([User(email="ops@example.com", hashed_password="x"),
+                        User(email="someone@example.com", hashed_password="x")])
+    db_session.commit()
+    monkeypatch.setattr(dependencies, "ADMIN_EMAILS", {"ops@example.com"})
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "scrape-token")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=_bearer("wrong")).status_code == 401
+    assert client.get("/metrics", headers=_bearer(create_access_token({"sub": "someone@example.com"}))).status_code == 403
+
+    r = client.get("/metrics", headers=_bearer("scrape-token"))
+    assert r.status_code == 200 and "warmup_ready" in r.text
+    assert client.get("/metrics", headers=_bearer(create_access_token({"sub": "ops@example.com"}))).status_code == 200
+
+    # Without a token configured, only admins get in
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "")
+    assert client.get("/metrics", headers=_bearer("")).status_code == 401
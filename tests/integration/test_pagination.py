@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services.archive_service import calculations_in_window
+from app.services.pagination import decode_cursor, encode_cursor, split_page
+
+client = TestClient(app)
+
+
+def _seed(db, count, user_id=1):
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        # Pairs share a timestamp so the id tie-breaker matters
+        db.add(Calculation(user_id=user_id, a=i, b=1, type="add", result=i + 1,
+                           created_at=start + timedelta(minutes=i // 2)))
+    db.commit()
+
+
+def test_keyset_pages_cover_every_row_once(db_session):
+    _seed(db_session, 7)
+    seen, after = [], None
+    while True:
+        rows = calculations_in_window(db_session, 1, after=after, limit=3 + 1)
+        page, cursor = split_page(rows, 3)
+        seen += [c.id for c in page]
+        if cursor is None:
+            break
+        after = decode_cursor(cursor)
+
+    newest_first = [c.id for c in calculations_in_window(db_session, 1)]
+    assert seen == newest_first and len(seen) == 7
+
+
+def test_rows_without_created_at_page_last(db_session):
+    _seed(db_session, 3)
+    for i in range(3):
+        db_session.add(Calculation(user_id=1, a=i, b=1, type="add", result=i + 1))
+    db_session.flush()
+    db_session.query(Calculation).filter(Calculation.a < 3, Calculation.id > 3).update({"created_at": None})
+    db_session.commit()
+
+    seen, after = [], None
+    while True:
+        rows = calculations_in_window(db_session, 1, after=after, limit=2 + 1)
+        page, cursor = split_page(rows, 2)
+        seen += [c.id for c in page]
+        if cursor is None:
+            break
+        after = decode_cursor(cursor)
+
+    dated = [c.id for c in db_session.query(Calculation).filter(Calculation.created_at.isnot(None))
+             .order_by(Calculation.created_at.desc(), Calculation.id.desc())]
+    assert seen == dated + [6, 5, 4]
+    oldest_first = [c.id for c in calculations_in_window(db_session, 1, newest_first=False)]
+    assert oldest_first == list(reversed(seen))
+
+
+def test_cursor_round_trip():
+    at = datetime(2026, 3, 4, 5, 6, 7, 890)
+    assert decode_cursor(encode_cursor(at, 42)) == (at, 42)
+
+
+def test_rows_fragment_continues_list_and_search(db_session, monkeypatch):
+    monkeypatch.setattr("app.routers.calculations.LIST_PAGE_SIZE", 2)
+    _seed(db_session, 5)
+    _seed(db_session, 3, user_id=2)
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, email="t@t.com", hashed_password="x")
+    try:
+        first = calculations_in_window(db_session, 1, limit=2)
+        url = f"/calculations/rows?cursor={encode_cursor(first[-1].created_at, first[-1].id)}"
+        loaded = []
+        while url:
+            r = client.get(url)
+            assert r.status_code == 200 and "<form" not in r.text
+            loaded.append(r.text.count("<tr>"))
+            url = r.headers.get("X-Next-Rows")
+        assert loaded == [2, 1]
+
+        # Search by operation keeps its filter across pages
+        r = client.get(f"/calculations/rows?cursor={encode_cursor(first[0].created_at, first[0].id)}&q=add")
+        assert r.text.count("<tr>") == 2 and "q=add" in r.headers["X-Next-Rows"]
+
+        assert client.get("/calculations/rows?cursor=bogus").status_code == 400
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_current_user, None)
+        else:
+            app.dependency_overrides[get_current_user] = previous
+
+
+def test_html_pages_stream_first_page(db_session, monkeypatch):
+    monkeypatch.setattr("app.routers.calculations.LIST_PAGE_SIZE", 2)
+    _seed(db_session, 3)
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, email="t@t.com", hashed_password="x")
+    try:
+        r = client.get("/calculations", headers={"accept": "text/html"})
+        assert r.status_code == 200 and "content-length" not in r.headers
+        assert r.text.count("formaction=") == 2 and 'id="load-more"' in r.text
+
+        r = client.post("/calculations/search", data={"query": "add"}, headers={"accept": "text/html"})
+        assert r.status_code == 200 and r.text.count("formaction=") == 2 and "q=add" in r.text
+
+        r = client.get("/calculations/report", headers={"accept": "text/html"})
+        assert r.status_code == 200 and "Total Calculations:</strong> 3" in r.text
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_current_user, None)
+        else:
+            app.dependency_overrides[get_current_user] = previous
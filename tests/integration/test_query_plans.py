@@ -0,0 +1,235 @@
+"""Query-plan regression guard for the hot paths.
+
+Each hot path is requested against a seeded, ANALYZEd database while every
+SQL statement it runs is captured. The plan of each statement comes from
+``EXPLAIN QUERY PLAN`` on SQLite or ``EXPLAIN (COSTS OFF)`` on PostgreSQL.
+The test then checks three things:
+
+- the calculations tables are only reached through their primary key or an
+  index on ``user_id``, never scanned;
+- each hot path uses the index it is expected to;
+- the plans match ``query_plans/<dialect>.txt``. A change fails with a
+  unified diff; record the new plans with ``UPDATE_QUERY_PLANS=1``.
+"""
+import difflib
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.auth import create_access_token
+from app.db import engine
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services.pagination import encode_cursor
+
+PLANS_DIR = Path(__file__).parent / "query_plans"
+UPDATE = os.getenv("UPDATE_QUERY_PLANS") == "1"
+
+USERS = 20
+CALCULATIONS_PER_USER = 250
+OPERATIONS = ("add", "sub", "mul", "div", "pow", "mod")
+
+CALCULATION_TABLES = ("calculations", "calculations_archive")
+# Indexes that keep a calculations query within one user's rows (PostgreSQL names)
+USER_INDEXES = {
+    "calculations_pkey",
+    "calculations_archive_pkey",
+    "ix_calculations_user_created_id",
+    "ix_calculations_archive_user_created",
+}
+PRIMARY_KEY = {"sqlite": "INTEGER PRIMARY KEY", "postgresql": "calculations_pkey"}
+
+HTML = {"accept": "text/html"}
+JSON = {"accept": "application/json"}
+
+
+def hot_paths(calc_id, cursor):
+    """name -> (method, url, request kwargs, index the path must use)."""
+    page = "ix_calculations_user_created_id"
+    return {
+        "list": ("GET", "/calculations", {"headers": HTML}, page),
+        "list_json": ("GET", "/calculations", {"headers": JSON}, page),
+        "list_next_rows": ("GET", f"/calculations/rows?cursor={cursor}", {}, page),
+        "view": ("GET", f"/calculations/{calc_id}", {"headers": JSON}, "PRIMARY KEY"),
+        "edit_form": ("GET", f"/calculations/{calc_id}/edit", {"headers": HTML}, "PRIMARY KEY"),
+        "edit": ("POST", f"/calculations/{calc_id}/edit",
+                 {"data": {"operand1": "2", "operand2": "3", "operation": "mul"}}, "PRIMARY KEY"),
+        "delete": ("POST", f"/calculations/{calc_id}/delete", {}, "PRIMARY KEY"),
+        "search_id": ("POST", "/calculations/search", {"data": {"search_id": str(calc_id)}}, "PRIMARY KEY"),
+        "search_text": ("GET", "/calculations/search?q=ad", {"headers": HTML}, page),
+        "search_number": ("GET", "/calculations/search?q=3", {"headers": HTML}, page),
+        "report": ("GET", "/calculations/report", {"headers": JSON}, page),
+        "history": ("GET", "/calculations/history", {"headers": JSON}, page),
+        "user_lookup": ("GET", "/calculations/history", {"headers": JSON}, "ix_users_email"),
+    }
+
+
+@pytest.fixture
+def seeded(db_session):
+    """USERS users with CALCULATIONS_PER_USER calculations each over 90 days, ANALYZEd."""
+    users = [User(email=f"plan{i}@example.com", hashed_password="x") for i in range(USERS)]
+    db_session.add_all(users)
+    db_session.commit()
+    start = datetime(2026, 1, 1)
+    rows = [
+        {"user_id": user.user_id, "operation": OPERATIONS[i % len(OPERATIONS)], "operand_a": float(i),
+         "operand_b": float(i % 7 + 1), "result": float(i % 50),
+         "created_at": start + timedelta(minutes=i * 517 % 129600), "updated_at": start}
+        for user in users
+        for i in range(CALCULATIONS_PER_USER)
+    ]
+    db_session.execute(Calculation.__table__.insert(), rows)
+    db_session.commit()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return users[0]
+
+
+class StatementLog:
+    """Every single-row statement run on the engine while active, from any thread."""
+
+    def __init__(self):
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            return
+        with self._lock:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
+
+
+def explain(statement, parameters):
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect == "sqlite":
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            # Older SQLite versions say "SCAN TABLE x"
+            return [re.sub(r"\b(SCAN|SEARCH) TABLE ", r"\1 ", row[3]) for row in rows]
+        rows = conn.exec_driver_sql("EXPLAIN (COSTS OFF) " + statement, parameters).all()
+        return [row[0].strip() for row in rows]
+
+
+def full_scans(plan):
+    """Plan lines that read a calculations table other than through a user's rows."""
+    bad = []
+    for line in plan:
+        if engine.dialect.name == "sqlite":
+            match = re.match(r"(SCAN|SEARCH) (\w+)", line)
+            if match and match.group(2) in CALCULATION_TABLES:
+                if match.group(1) == "SCAN" or not ("PRIMARY KEY" in line or "user_id=" in line):
+                    bad.append(line)
+        else:
+            match = re.search(r"(Seq Scan|Scan using (\w+)) on (\w+)", line)
+            if match and match.group(3) in CALCULATION_TABLES:
+                if match.group(1) == "Seq Scan" or match.group(2) not in USER_INDEXES:
+                    bad.append(line)
+    return bad
+
+
+def compact(sql):
+    """One line, without the ``AS table_column`` labels SQLAlchemy adds to every column."""
+    sql = " ".join(sql.split())
+    return re.sub(r"\b(\w+)\.(\w+) AS \1_\2\b", r"\1.\2", sql)
+
+
+def capture(seeded_user, calc_id, cursor):
+    """name -> [(sql, plan lines)] for every hot path."""
+    client = TestClient(app, raise_server_exceptions=False)
+    previous = app.dependency_overrides.get(get_current_user)
+    token = create_access_token({"sub": seeded_user.email})
+    plans = {}
+    try:
+        for name, (method, url, kwargs, _) in hot_paths(calc_id, cursor).items():
+            if name == "user_lookup":
+                # Only this path authenticates for real, so the lookup is not repeated everywhere
+                app.dependency_overrides.pop(get_current_user, None)
+                kwargs = dict(kwargs, headers={**kwargs.get("headers", {}), "Authorization": f"Bearer {token}"})
+            else:
+                app.dependency_overrides[get_current_user] = lambda: seeded_user
+            with StatementLog() as log:
+                client.request(method, url, follow_redirects=False, **kwargs)
+            statements = log.statements
+            if name == "user_lookup":
+                statements = [s for s in statements if re.search(r"\bFROM users\b", s[0])]
+            plans[name] = [(compact(sql), explain(sql, params)) for sql, params in statements]
+    finally:
+        if previous is not None:
+            app.dependency_overrides[get_current_user] = previous
+        else:
+            app.dependency_overrides.pop(get_current_user, None)
+    return plans
+
+
+def render(plans):
+    lines = []
+    for name in sorted(plans):
+        lines.append(f"== {name} ==")
+        for sql, plan in plans[name]:
+            lines.append(sql)
+            lines.extend(f"    {line}" for line in plan)
+    return "\n".join(lines) + "\n"
+
+
+def test_full_scans_are_reported(db_session):
+    plan = explain("SELECT id FROM calculations WHERE operation LIKE ?", ("%ad%",))
+    assert full_scans(plan) == plan
+    assert full_scans(explain("SELECT id FROM calculations WHERE user_id = ?", (1,))) == []
+
+
+def test_hot_paths_use_their_indexes(seeded):
+    # A row from the middle of the user's list, so the next-page cursor has rows on both sides
+    with engine.connect() as conn:
+        calc_id, created_at = conn.execute(
+            text("SELECT id, created_at FROM calculations WHERE user_id = :u ORDER BY created_at DESC, id DESC "
+                 "LIMIT 1 OFFSET :n"),
+            {"u": seeded.user_id, "n": CALCULATIONS_PER_USER // 2},
+        ).one()
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    plans = capture(seeded, calc_id, encode_cursor(created_at, calc_id))
+
+    dialect = engine.dialect.name
+    problems = []
+    for name, (_, _, _, expected) in hot_paths(calc_id, "").items():
+        lines = [line for _, plan in plans[name] for line in plan]
+        if not plans[name]:
+            problems.append(f"{name}: ran no queries")
+        expected = PRIMARY_KEY[dialect] if expected == "PRIMARY KEY" else expected
+        if not any(expected in line for line in lines):
+            problems.append(f"{name}: expected a plan using {expected}")
+        for sql, plan in plans[name]:
+            for line in full_scans(plan):
+                problems.append(f"{name}: {line}\n    {sql}")
+    assert not problems, "Query plan problems:\n" + "\n".join(problems)
+
+    golden = PLANS_DIR / f"{dialect}.txt"
+    current = render(plans)
+    if UPDATE:
+        PLANS_DIR.mkdir(exist_ok=True)
+        golden.write_text(current)
+        return
+    if not golden.exists():
+        pytest.fail(f"No recorded plans for {dialect}: run with UPDATE_QUERY_PLANS=1 to record {golden}")
+    expected_text = golden.read_text()
+    if current != expected_text:
+        diff = "".join(difflib.unified_diff(
+            expected_text.splitlines(keepends=True), current.splitlines(keepends=True),
+            fromfile=str(golden), tofile="current plans",
+        ))
+        pytest.fail("Query plans changed (re-record with UPDATE_QUERY_PLANS=1 if intended):\n" + diff)
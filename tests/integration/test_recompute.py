@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from app.db import SessionLocal
+from app.models.calculation import Calculation
+from app.services.calculation_math import compute_result, compute_results
+from app.services import recompute_service
+from app.services.recompute_service import recompute_calculations
+
+
+def _seed(db):
+    db.add_all([
+        Calculation(user_id=1, a=2, b=3, type="add", result=5),
+        Calculation(user_id=1, a=2, b=3, type="pow", result=9),          # wrong: 8
+        Calculation(user_id=1, a=-7, b=3, type="mod", result=-1),        # wrong: floored mod is 2
+        Calculation(user_id=1, a=1, b=0, type="div", result=0),          # no valid result
+        Calculation(user_id=1, a=2, b=3, type="expr", expression="a * b + 1", result=7),
+    ])
+    db.commit()
+
+
+def test_scalar_and_vectorized_semantics_agree():
+    np = pytest.importorskip("numpy")
+    ops = ["add", "sub", "mul", "div", "pow", "mod", "mod", "expr", "div"]
+    a = [1.5, 4.0, 3.0, 9.0, 2.0, -7.0, 7.0, 2.0, 1.0]
+    b = [2.0, 1.0, 3.0, 2.0, 0.5, 3.0, -3.0, 5.0, 0.0]
+    exprs = [None] * 7 + ["(a + b) ^ 2", None]
+    out = compute_results(ops, a, b, exprs)
+    for i in range(len(ops) - 1):
+        assert out[i] == pytest.approx(compute_result(ops[i], a[i], b[i], exprs[i]))
+    assert np.isnan(out[-1])
+
+
+def test_overflow_has_no_result_in_either_form():
+    np = pytest.importorskip("numpy")
+    ops = ["add", "mul", "pow", "expr", "sub"]
+    a = [1e308, 1e200, 10.0, 1e200, float("inf")]
+    b = [1e308, 1e200, 400.0, 1e200, 1.0]
+    exprs = [None, None, None, "a * b", None]
+    assert np.isnan(compute_results(ops, a, b, exprs)).all()
+    for i in range(len(ops)):
+        with pytest.raises(ValueError):
+            compute_result(ops[i], a[i], b[i], exprs[i])
+
+
+def test_recompute_reports_then_fixes(db_session, tmp_path):
+    _seed(db_session)
+    checkpoint = tmp_path / "checkpoint.json"
+    report = tmp_path / "report.jsonl"
+
+    with open(report, "w") as f:
+        stats = recompute_calculations([SessionLocal], chunk_size=2, checkpoint=str(checkpoint), report=f)
+    assert stats == {"scanned": 5, "mismatched": 2, "uncomputable": 1, "fixed": 0, "skipped": 0}
+    lines = [json.loads(line) for line in report.read_text().splitlines()]
+    assert {(r["operation"], r["expected"]) for r in lines} == {("pow", 8.0), ("mod", 2.0), ("div", None)}
+
+    # A finished run deletes its checkpoint, so the next run scans everything
+    assert not checkpoint.exists()
+    assert recompute_calculations([SessionLocal], checkpoint=str(checkpoint))["scanned"] == 5
+
+    stats = recompute_calculations([SessionLocal], chunk_size=2, fix=True)
+    assert stats["fixed"] == 2
+    db_session.expire_all()
+    results = {c.type: c.result for c in db_session.query(Calculation)}
+    assert results["pow"] == 8.0 and results["mod"] == 2.0 and results["div"] == 0
+
+
+def test_recompute_in_process_pool(db_session):
+    _seed(db_session)
+    stats = recompute_calculations([SessionLocal], chunk_size=2, workers=2)
+    assert stats["scanned"] == 5 and stats["mismatched"] == 2
+
+
+def test_recompute_resumes_from_an_interrupted_checkpoint(db_session, tmp_path):
+    _seed(db_session)
+    ids = sorted(c.id for c in db_session.query(Calculation))
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"shards": {"0": {"last_id": ids[2], "done": False}}}))
+
+    messages = []
+    stats = recompute_calculations([SessionLocal], checkpoint=str(checkpoint), log=messages.append)
+    assert stats["scanned"] == 2
+    assert f"shard 0: resuming from id {ids[2]} (checkpoint {checkpoint})" in messages
+    assert not checkpoint.exists()
+
+
+def test_fix_skips_rows_edited_after_the_scan(db_session, monkeypatch):
+    _seed(db_session)
+    scan = recompute_service.scan_chunks
+
+    def scan_then_edit(db, after_id, chunk_size):
+        for chunk in scan(db, after_id, chunk_size):
+            # The user edits the pow row after it was read, before its fix is applied
+            other = SessionLocal()
+            calc = other.query(Calculation).filter(Calculation.type == "pow").one()
+            calc.a, calc.result = 3, 27
+            other.commit()
+            other.close()
+            yield chunk
+
+    monkeypatch.setattr(recompute_service, "scan_chunks", scan_then_edit)
+    stats = recompute_calculations([SessionLocal], fix=True)
+    assert (stats["fixed"], stats["skipped"]) == (1, 1)
+    db_session.expire_all()
+    results = {c.type: c.result for c in db_session.query(Calculation)}
+    assert results["pow"] == 27 and results["mod"] == 2.0
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token, hash_password
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+
+client = TestClient(app)
+
+
+def _login(db_session, email="fresh@example.com"):
+    db_session.add(User(email=email, hashed_password=hash_password("pw")))
+    db_session.commit()
+    r = client.post("/users/login", json={"email": email, "password": "pw"})
+    assert r.status_code == 200
+    return r.json()
+
+
+def _report(access_token):
+    previous = app.dependency_overrides.pop(get_current_user, None)
+    try:
+        return client.get("/calculations/report", headers={"Authorization": f"Bearer {access_token}"})
+    finally:
+        if previous is not None:
+            app.dependency_overrides[get_current_user] = previous
+
+
+def test_refresh_rotates_and_detects_reuse(db_session):
+    first = _login(db_session)
+    assert db_session.query(RefreshToken).one().token_hash != first["refresh_token"]
+
+    r = client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert r.status_code == 200
+    second = r.json()
+    assert second["refresh_token"] != first["refresh_token"]
+    assert _report(second["access_token"]).status_code == 200
+
+    # Replaying the rotated token revokes the whole family
+    r = client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert r.status_code == 401 and r.json()["detail"] == "Refresh token reuse detected"
+    assert client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]}).status_code == 401
+    assert _report(second["access_token"]).status_code == 401
+
+
+def test_browser_refresh_uses_cookies(db_session):
+    db_session.add(User(email="cookie@example.com", hashed_password=hash_password("pw")))
+    db_session.commit()
+    browser = TestClient(app)
+    browser.post("/login", data={"username": "cookie@example.com", "password": "pw"}, follow_redirects=False)
+    old_refresh = browser.cookies.get("refresh_token", path="/auth")
+    assert old_refresh
+
+    r = browser.post("/auth/refresh")
+    assert r.status_code == 200
+    assert browser.cookies.get("refresh_token", path="/auth") == r.json()["refresh_token"] != old_refresh
+
+
+def test_expired_page_load_refreshes_and_returns(db_session):
+    db_session.add(User(email="expired@example.com", hashed_password=hash_password("pw")))
+    db_session.commit()
+    browser = TestClient(app)
+    browser.post("/login", data={"username": "expired@example.com", "password": "pw"}, follow_redirects=False)
+    old_refresh = browser.cookies.get("refresh_token", path="/auth")
+    expired = create_access_token({"sub": "expired@example.com"}, expires_delta=timedelta(minutes=-1))
+    browser.cookies.set("access_token", f"Bearer {expired}", domain="testserver.local")
+
+    previous = app.dependency_overrides.pop(get_current_user, None)
+    try:
+        r = browser.get("/calculations/report?x=1", headers={"accept": "text/html"}, follow_redirects=False)
+        assert r.status_code == 303
+        assert r.headers["location"] == "/auth/refresh?next=%2Fcalculations%2Freport%3Fx%3D1"
+
+        r = browser.get(r.headers["location"], follow_redirects=False)
+        assert r.status_code == 303 and r.headers["location"] == "/calculations/report?x=1"
+        assert browser.cookies.get("refresh_token", path="/auth") != old_refresh
+        assert browser.get("/calculations/report", headers={"accept": "text/html"}).status_code == 200
+
+        # API clients still get the 401, and a spent refresh cookie ends at the login page
+        assert browser.get("/calculations/report", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+        browser.cookies.set("refresh_token", old_refresh, domain="testserver.local", path="/auth")
+        r = browser.get("/auth/refresh?next=/calculations", follow_redirects=False)
+        assert r.status_code == 303 and r.headers["location"] == "/login"
+    finally:
+        if previous is not None:
+            app.dependency_overrides[get_current_user] = previous
+
+
+def test_logout_ends_the_refresh_session(db_session):
+    tokens = _login(db_session, "bye@example.com")
+    previous = app.dependency_overrides.pop(get_current_user, None)
+    try:
+        client.get("/users/logout", headers={"Authorization": f"Bearer {tokens['access_token']}"},
+                   follow_redirects=False)
+    finally:
+        if previous is not None:
+            app.dependency_overrides[get_current_user] = previous
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
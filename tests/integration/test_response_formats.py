@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.calculation import Calculation
+from app.models.user import User
+from app.services.response_formats import COLUMNAR_MEDIA_TYPE
+
+DUMMY_USER = User(id=1, email="test@test.com", hashed_password="hashed")
+
+
+@pytest.fixture
+def client(db_session):
+    db_session.add_all([
+        Calculation(user_id=1, a=1, b=2, type="add", result=3),
+        Calculation(user_id=1, a=6, b=3, type="div", result=2),
+        Calculation(user_id=2, a=9, b=9, type="mul", result=81),
+    ])
+    db_session.commit()
+    previous = app.dependency_overrides.get(get_current_user)
+    app.dependency_overrides[get_current_user] = lambda: DUMMY_USER
+    yield TestClient(app)
+    if previous is None:
+        app.dependency_overrides.pop(get_current_user, None)
+    else:
+        app.dependency_overrides[get_current_user] = previous
+
+
+def test_list_columnar_json(client):
+    r = client.get("/calculations", headers={"accept": COLUMNAR_MEDIA_TYPE})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith(COLUMNAR_MEDIA_TYPE)
+    body = json.loads(r.content)
+    assert sorted(body["result"]) == [2.0, 3.0]
+    assert len(body["id"]) == len(body["a"]) == len(body["type"]) == 2
+
+
+def test_export_default_json(client):
+    r = client.get("/calculations/export")
+    assert r.status_code == 200
+    rows = r.json()
+    assert [row["type"] for row in rows] == ["add", "div"]
+
+
+def test_history_msgpack_decodes_zero_copy(client):
+    msgpack = pytest.importorskip("msgpack")
+    np = pytest.importorskip("numpy")
+
+    r = client.get("/calculations/history", headers={"accept": "application/msgpack"})
+    assert r.status_code == 200
+    doc = msgpack.unpackb(r.content, raw=False)
+    assert doc["length"] == 2
+    results = np.frombuffer(doc["result"], dtype=doc["dtypes"]["result"])
+    assert sorted(results.tolist()) == [2.0, 3.0]
+    created = np.frombuffer(doc["created_at"], dtype=doc["dtypes"]["created_at"])
+    assert created.dtype.kind == "M"
+
+
+def test_null_timestamps_stay_null(client, db_session):
+    msgpack = pytest.importorskip("msgpack")
+    np = pytest.importorskip("numpy")
+    db_session.query(Calculation).filter(Calculation.result == 2).update({"updated_at": None})
+    db_session.commit()
+
+    body = client.get("/calculations/export", headers={"accept": COLUMNAR_MEDIA_TYPE}).json()
+    assert body["updated_at"][body["result"].index(2.0)] is None
+
+    r = client.get("/calculations/export", headers={"accept": "application/msgpack"})
+    doc = msgpack.unpackb(r.content, raw=False)
+    updated = np.frombuffer(doc["updated_at"], dtype=doc["dtypes"]["updated_at"])
+    row = np.frombuffer(doc["result"], dtype="<f8").tolist().index(2.0)
+    assert np.isnat(updated[row]) and not np.isnat(updated[1 - row])
+    assert doc["nulls"] == {"updated_at": [row]}
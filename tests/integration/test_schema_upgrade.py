@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, inspect, text
+
+from app.db.schema import upgrade_schema
+from app.models.calculation import Calculation
+
+# calculations as created before the expression column existed
+OLD_SCHEMA = [
+    "CREATE TABLE users (user_id INTEGER NOT NULL, email VARCHAR NOT NULL, password VARCHAR NOT NULL, "
+    "PRIMARY KEY (user_id))",
+    "CREATE TABLE calculations (id INTEGER NOT NULL, user_id INTEGER NOT NULL, operation VARCHAR(20) NOT NULL, "
+    "operand_a FLOAT NOT NULL, operand_b FLOAT NOT NULL, result FLOAT NOT NULL, created_at DATETIME, "
+    "updated_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (user_id) ON DELETE CASCADE)",
+    "INSERT INTO users VALUES (1, 'old@example.com', 'x')",
+    "INSERT INTO calculations (id, user_id, operation, operand_a, operand_b, result) VALUES (1, 1, 'add', 1, 2, 3)",
+]
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def test_missing_columns_and_indexes_are_added(old_engine):
+    upgrade_schema(old_engine)
+    inspector = inspect(old_engine)
+    assert "expression" in {c["name"] for c in inspector.get_columns("calculations")}
+    expected = {index.name for index in Calculation.__table__.indexes}
+    assert expected <= {i["name"] for i in inspector.get_indexes("calculations")}
+    with old_engine.connect() as conn:
+        assert conn.execute(text("SELECT result, expression FROM calculations")).one() == (3.0, None)
+
+    # Running it again changes nothing
+    upgrade_schema(old_engine)
+
+
+def test_missing_not_null_column_needs_a_migration(old_engine):
+    with old_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE extra (id INTEGER PRIMARY KEY)"))
+    metadata = MetaData()
+    Table("extra", metadata, Column("id", Integer, primary_key=True), Column("size", Integer, nullable=False))
+    with pytest.raises(RuntimeError, match="extra.size"):
+        upgrade_schema(old_engine, metadata)
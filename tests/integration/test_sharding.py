@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from app.db.schema import prepare_shard, upgrade_schema
+from app.db.sharding import SHARD_ID_RANGE, ShardMap
+from app.models.calculation import Calculation
+from app.services import shard_rebalance
+from app.services.shard_rebalance import move_user
+
+
+@pytest.fixture
+def shards(tmp_path):
+    engines = [
+        create_engine(f"sqlite:///{tmp_path}/shard{i}.db", connect_args={"check_same_thread": False})
+        for i in range(2)
+    ]
+    upgrade_schema(engines[0])
+    prepare_shard(engines[1], 1)
+    return ShardMap(engines, sessionmaker(bind=engines[0]), directory_ttl=0)
+
+
+def test_hash_placement_is_stable_and_directory_overrides(shards):
+    placements = {uid: shards.shard_for(uid) for uid in range(1, 50)}
+    assert set(placements.values()) == {0, 1}
+    assert placements == {uid: shards.shard_for(uid) for uid in range(1, 50)}
+
+    uid = next(u for u, s in placements.items() if s == 0)
+    shards.assign(uid, 1)
+    assert shards.shard_for(uid) == 1
+
+
+def test_move_user_copies_rows_and_clears_source(shards):
+    user_id = next(u for u in range(1, 50) if shards.shard_for(u) == 0)
+    src = shards.session_for(user_id)
+    src.add_all([
+        Calculation(user_id=user_id, a=i, b=1, type="add", result=i + 1) for i in range(5)
+    ])
+    src.add(Calculation(user_id=user_id + 1000, a=1, b=1, type="add", result=2))
+    src.commit()
+    ids = sorted(c.id for c in src.query(Calculation).filter_by(user_id=user_id))
+    src.close()
+
+    stats = move_user(shards, user_id, 1, chunk_size=2, settle_seconds=0)
+    assert stats["copied"] == 5 and stats["deleted"] == 5
+    assert shards.shard_for(user_id) == 1
+
+    moved = shards.session_for(user_id)
+    assert sorted(c.result for c in moved.query(Calculation).filter_by(user_id=user_id)) == [1, 2, 3, 4, 5]
+    # Moved rows keep their ids; new rows on the target come from its own range
+    assert sorted(c.id for c in moved.query(Calculation).filter_by(user_id=user_id)) == ids
+    new = Calculation(user_id=user_id, a=9, b=1, type="add", result=10)
+    moved.add(new)
+    moved.commit()
+    assert new.id > SHARD_ID_RANGE
+    moved.close()
+
+    source = shards.sessionmakers[0]()
+    assert source.query(Calculation).filter_by(user_id=user_id).count() == 0
+    # Other users on the source shard are untouched
+    assert source.query(Calculation).filter_by(user_id=user_id + 1000).count() == 1
+    source.close()
+
+
+def test_secondary_shard_holds_only_calculation_tables(shards):
+    shard = inspect(shards.engines[1])
+    assert "users" not in shard.get_table_names()
+    assert "calculations" in shard.get_table_names()
+    assert shard.get_foreign_keys("calculations") == []
+
+
+def test_move_to_sqlite_shard_refuses_ids_from_a_higher_range(shards):
+    user_id = next(u for u in range(1, 50) if shards.shard_for(u) == 1)
+    db = shards.session_for(user_id)
+    db.add(Calculation(user_id=user_id, a=1, b=1, type="add", result=2))
+    db.commit()
+    db.close()
+
+    with pytest.raises(ValueError):
+        move_user(shards, user_id, 0, settle_seconds=0)
+    assert shards.shard_for(user_id) == 1
+
+
+def test_move_skips_rows_deleted_on_the_target_during_the_settle(shards, monkeypatch):
+    user_id = next(u for u in range(1, 50) if shards.shard_for(u) == 0)
+    src = shards.session_for(user_id)
+    src.add_all([Calculation(user_id=user_id, a=i, b=1, type="add", result=i + 1) for i in range(2)])
+    src.commit()
+    edited, removed = sorted(c.id for c in src.query(Calculation))
+    src.close()
+
+    def settle(seconds):
+        # A worker that has not seen the flip edits the source copy of a row that
+        # the user, already routed to the target, deletes there
+        db = shards.sessionmakers[0]()
+        db.get(Calculation, removed).result = 99
+        db.commit()
+        db.close()
+        db = shards.sessionmakers[1]()
+        db.delete(db.get(Calculation, removed))
+        db.commit()
+        db.close()
+
+    monkeypatch.setattr(shard_rebalance.time, "sleep", settle)
+    stats = move_user(shards, user_id, 1, settle_seconds=0)
+    assert stats["deleted"] == 2
+
+    moved = shards.sessionmakers[1]()
+    assert [c.id for c in moved.query(Calculation).filter_by(user_id=user_id)] == [edited]
+    moved.close()
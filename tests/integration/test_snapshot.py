@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import engine
+from app.db.schema import prepare_shard
+from app.models.calculation import Calculation
+
+pa = pytest.importorskip("pyarrow")
+
+from app.services.snapshot_service import export_snapshot, load_watermark, read_snapshot  # noqa: E402
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_incremental_snapshot_round_trip(db_session, tmp_path, fmt):
+    db_session.add_all([
+        Calculation(user_id=1, a=1, b=2, type="add", result=3),
+        Calculation(user_id=2, a=4, b=2, type="div", result=2),
+    ])
+    db_session.commit()
+
+    first = export_snapshot(engine, str(tmp_path), fmt=fmt, chunk_size=1)
+    assert first["rows"] == 2
+    assert load_watermark(tmp_path) is not None
+
+    # Nothing changed -> nothing exported
+    assert export_snapshot(engine, str(tmp_path), fmt=fmt)["rows"] == 0
+
+    calc = db_session.query(Calculation).filter(Calculation.user_id == 1).first()
+    calc.a, calc.result = 10, 12
+    db_session.add(Calculation(user_id=3, a=2, b=2, type="mul", result=4))
+    db_session.commit()
+
+    assert export_snapshot(engine, str(tmp_path), fmt=fmt)["rows"] == 2
+
+    table = read_snapshot(str(tmp_path))
+    assert table.num_rows == 3
+    assert sorted(table.column("result").to_pylist()) == [2.0, 4.0, 12.0]
+    assert read_snapshot(str(tmp_path), latest_only=False).num_rows == 4
+
+
+def test_snapshot_covers_every_shard(db_session, tmp_path):
+    shard = create_engine(f"sqlite:///{tmp_path / 'shard1.db'}")
+    prepare_shard(shard, 1)
+    db_session.add(Calculation(user_id=1, a=1, b=2, type="add", result=3))
+    db_session.commit()
+    other = sessionmaker(bind=shard)()
+    other.add(Calculation(user_id=2, a=4, b=2, type="div", result=2))
+    other.commit()
+
+    out = tmp_path / "snap"
+    assert export_snapshot([engine, shard], str(out))["rows"] == 2
+    assert set(load_watermark(out)["shards"]) == {"0", "1"}
+    assert sorted(read_snapshot(str(out)).column("user_id").to_pylist()) == [1, 2]
+
+    # Each shard resumes from its own watermark
+    other.add(Calculation(user_id=2, a=5, b=5, type="mul", result=25))
+    other.commit()
+    other.close()
+    assert export_snapshot([engine, shard], str(out))["rows"] == 1
+    assert read_snapshot(str(out)).num_rows == 3
+
+
+def test_rows_without_updated_at_are_exported_once(db_session, tmp_path):
+    db_session.add_all([
+        Calculation(user_id=1, a=1, b=2, type="add", result=3),
+        Calculation(user_id=2, a=4, b=2, type="div", result=2),
+    ])
+    db_session.commit()
+    # Legacy rows: no updated_at, and one without created_at either
+    db_session.query(Calculation).update({"updated_at": None})
+    db_session.query(Calculation).filter(Calculation.user_id == 2).update({"created_at": None})
+    db_session.commit()
+
+    assert export_snapshot(engine, str(tmp_path))["rows"] == 2
+    assert load_watermark(tmp_path) is not None
+    assert export_snapshot(engine, str(tmp_path))["rows"] == 0
+
+    db_session.add(Calculation(user_id=3, a=2, b=2, type="mul", result=4))
+    db_session.commit()
+    db_session.query(Calculation).filter(Calculation.user_id == 3).update({"updated_at": None})
+    db_session.commit()
+    assert export_snapshot(engine, str(tmp_path))["rows"] == 1
+    assert read_snapshot(str(tmp_path)).num_rows == 3
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token, decode_access_token, hash_password
+from app.db import SessionLocal
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.revoked_token import RevokedToken
+from app.models.user import User
+from app.services.token_revocation import BloomFilter, RevocationStore, revocations
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def real_auth():
+    """Authenticate with real tokens for this test, whatever other modules override."""
+    previous = app.dependency_overrides.pop(get_current_user, None)
+    yield
+    if previous is not None:
+        app.dependency_overrides[get_current_user] = previous
+
+
+def test_logout_revokes_the_token(db_session, real_auth):
+    db_session.add(User(email="out@example.com", hashed_password=hash_password("pw")))
+    db_session.commit()
+    revocations.load()
+
+    r = client.post("/login", data={"username": "out@example.com", "password": "pw"}, follow_redirects=False)
+    token = r.cookies["access_token"].strip('"').split(" ", 1)[1]
+    headers = {"Authorization": f"Bearer {token}", "accept": "application/json"}
+    assert client.get("/calculations/report", headers=headers).status_code == 200
+
+    r = client.get("/users/logout", follow_redirects=False)
+    assert r.status_code == 303
+    assert "access_token" not in client.cookies
+
+    r = client.get("/calculations/report", headers=headers)
+    assert r.status_code == 401 and r.json()["detail"] == "Token has been revoked"
+    # Another token for the same user is unaffected
+    fresh = create_access_token({"sub": "out@example.com"})
+    assert client.get("/calculations/report", headers={"Authorization": f"Bearer {fresh}"}).status_code == 200
+
+
+def test_revocations_reach_other_workers_and_expire(db_session):
+    worker_a, worker_b = RevocationStore(SessionLocal), RevocationStore(SessionLocal)
+    worker_a.load()
+    worker_b.load()
+
+    jti = decode_access_token(create_access_token({"sub": "x"}))["jti"]
+    worker_a.revoke(jti, datetime.utcnow() + timedelta(minutes=5))
+    assert worker_a.is_revoked(jti)
+    assert not worker_b.is_revoked(jti)
+    assert worker_b.sync() == 1 and worker_b.is_revoked(jti)
+
+    worker_a.revoke("expired", datetime.utcnow() - timedelta(seconds=1))
+    assert worker_a.prune() == 1
+    assert db_session.query(RevokedToken.jti).all() == [(jti,)]
+    assert worker_a.is_revoked(jti) and not worker_a.is_revoked("expired")
+
+
+def test_sync_picks_up_a_lower_id_committed_late(db_session):
+    worker = RevocationStore(SessionLocal)
+    worker.load()
+    expires = datetime.utcnow() + timedelta(minutes=5)
+
+    db_session.add(RevokedToken(id=5, jti="committed-first", expires_at=expires))
+    db_session.commit()
+    assert worker.sync() == 1
+    # id 3 was allocated earlier but its transaction committed after the sync
+    db_session.add(RevokedToken(id=3, jti="committed-late", expires_at=expires))
+    db_session.commit()
+    assert worker.sync() == 1 and worker.is_revoked("committed-late")
+    assert worker.sync() == 0
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    items = [f"token-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
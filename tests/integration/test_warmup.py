@@ -0,0 +1,47 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import dependencies
+from app.main import app
+from app.services import warmup
+
+client = TestClient(app)
+
+
+def test_ready_only_after_background_warmup(db_session, monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "scrape-token")
+    attempts, release = [], threading.Event()
+
+    def slow_pool():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("database not up yet")
+        release.wait(5)
+
+    monkeypatch.setattr(warmup, "STEPS", (("pool", slow_pool),) + warmup.STEPS[2:])
+    warmup.state.start(enabled=True, retry_seconds=0.01)
+    try:
+        deadline = time.monotonic() + 5
+        while len(attempts) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Failed once, retried, and still in progress: the probe reports it without running it
+        r = client.get("/ready")
+        assert r.status_code == 503
+        assert r.json()["status"] == "warming up" and r.json()["error"].startswith("pool:")
+        assert len(attempts) == 2
+    finally:
+        release.set()
+        warmup.state.stop()
+
+    r = client.get("/ready")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "ready" and set(body["steps"]) == {"pool", "queries", "crypto"}
+    assert len(attempts) == 2
+
+    metrics = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).text
+    assert f"warmup_duration_seconds {body['warmup_seconds']:g}" in metrics
+    assert "warmup_ready 1" in metrics
@@ -22,3 +22,15 @@ def test_calculation_create_invalid_type_string():
 
     with pytest.raises(ValidationError):
         StringCalcCreate(a=1, b=2, type="power")
+
+
+def test_calculation_create_expression():
+    obj = CalculationCreate(a=1, b=2, type=CalculationType.EXPR, expression=" (a + b) * 3 ")
+    assert obj.expression == "(a + b) * 3"
+
+
+def test_calculation_create_expression_invalid():
+    with pytest.raises(ValidationError):
+        CalculationCreate(a=1, b=2, type=CalculationType.EXPR)
+    with pytest.raises(ValidationError):
+        CalculationCreate(a=1, b=0, type=CalculationType.EXPR, expression="a / b")
@@ -0,0 +1,85 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.compression import (
+    CompressionMiddleware,
+    GzipCodec,
+    available_codecs,
+    choose_codec,
+)
+
+BIG = b"<tr><td>add</td><td>1</td><td>2</td><td>3</td></tr>\n" * 200
+
+
+def _client(**kwargs):
+    app = FastAPI()
+
+    @app.get("/big")
+    def big():
+        return Response(BIG, media_type="text/html")
+
+    @app.get("/small")
+    def small():
+        return Response(b"tiny", media_type="text/html")
+
+    @app.get("/encoded")
+    def encoded():
+        return Response(gzip.compress(BIG), media_type="text/html", headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BIG[:1000], BIG[1000:]]), media_type="text/html")
+
+    app.add_middleware(CompressionMiddleware, enabled=True, **kwargs)
+    return TestClient(app)
+
+
+def test_choose_codec_honours_q_values():
+    codecs = available_codecs()
+    assert choose_codec("gzip", codecs).name == "gzip"
+    assert choose_codec("br;q=0, gzip;q=0.5", codecs).name == "gzip"
+    assert choose_codec("identity", codecs) is None
+    assert choose_codec("", codecs) is None
+
+
+def test_large_body_is_gzipped():
+    r = _client().get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert int(r.headers["content-length"]) < len(BIG)
+    assert r.content == BIG
+
+
+def test_large_body_compressed_in_thread():
+    r = _client(thread_threshold=1).get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.content == BIG
+
+
+def test_small_and_precompressed_bodies_pass_through():
+    client = _client()
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.content == b"tiny"
+
+    encoded = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert encoded.content == BIG
+
+
+def test_stream_is_compressed_incrementally():
+    r = _client(codecs=[GzipCodec()]).get("/stream", headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "content-length" not in r.headers
+    assert r.content == BIG
+
+
+def test_brotli_preferred_when_installed():
+    pytest.importorskip("brotli")
+    r = _client().get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "br"
+    assert r.content == BIG
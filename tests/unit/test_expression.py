@@ -0,0 +1,54 @@
+import math
+
+import pytest
+
+from app.services.expression import ExpressionError, cache_info, compile_expression, evaluate
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 + 2 * 3", 7.0),
+    ("(1 + 2) * 3", 9.0),
+    ("2 ^ 3 ^ 2", 512.0),
+    ("2 ** 3", 8.0),
+    ("-2 ^ 2", -4.0),
+    ("2 ^ -1", 0.5),
+    ("7 % 4 - -1", 4.0),
+    ("sqrt(16) + abs(-2)", 6.0),
+    ("1.5e2 / .5", 300.0),
+])
+def test_evaluate_literals(text, expected):
+    assert evaluate(text) == pytest.approx(expected)
+
+
+def test_variables_are_bound():
+    plan = compile_expression("(a + b) * c ^ d")
+    assert plan.variables == ("a", "b", "c", "d")
+    assert plan.evaluate({"a": 1, "b": 2, "c": 2, "d": 3}) == 24.0
+    with pytest.raises(ExpressionError, match="Unbound"):
+        plan.evaluate({"a": 1})
+
+
+@pytest.mark.parametrize("text", [
+    "", "1 +", "(1 + 2", "1 + 2)", "2 3", "__import__('os')", "a.b", "sqrt 4", "1 / 0", "(-1) ^ 0.5",
+])
+def test_rejects_bad_expressions(text):
+    with pytest.raises(ExpressionError):
+        evaluate(text, {"a": 1})
+
+
+def test_plans_are_cached_by_normalized_text():
+    first = compile_expression("(a+b)*2")
+    hits = cache_info().hits
+    assert compile_expression(" ( a + b ) * 2 ") is first
+    assert cache_info().hits == hits + 1
+
+
+def test_batch_matches_scalar():
+    np = pytest.importorskip("numpy")
+    plan = compile_expression("(a + b) * 2 ^ c - a % 3")
+    a = np.array([1.0, 2.0, 5.5])
+    b = np.array([0.5, -1.0, 2.0])
+    out = plan.evaluate_batch({"a": a, "b": b, "c": 2})
+    expected = [plan.evaluate({"a": x, "b": y, "c": 2}) for x, y in zip(a, b)]
+    assert out.tolist() == pytest.approx(expected)
+    assert math.isinf(compile_expression("a / b").evaluate_batch({"a": [1.0], "b": [0.0]})[0])
@@ -0,0 +1,102 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.middleware.rate_limit import MemoryBucketStore, RateLimitMiddleware
+
+
+def test_bucket_refills_lazily():
+    store = MemoryBucketStore()
+    assert store.take_sync("k", rate=1, burst=2, now=0) == 0
+    assert store.take_sync("k", rate=1, burst=2, now=0) == 0
+    assert store.take_sync("k", rate=1, burst=2, now=0) == 1.0
+    assert store.take_sync("k", rate=1, burst=2, now=1.0) == 0
+
+
+def test_idle_buckets_expire():
+    store = MemoryBucketStore(idle_ttl=10)
+    store.take_sync("a", 1, 1, now=0)
+    store.take_sync("b", 1, 1, now=5)
+    store.take_sync("c", 1, 1, now=12)
+    assert len(store) == 2
+
+
+def _client(**limits):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.get("/login")
+    def login_page():
+        return {"ok": True}
+
+    @app.post("/login")
+    def login():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, store=MemoryBucketStore(), enabled=True, **limits)
+    return TestClient(app)
+
+
+def test_returns_429_with_retry_after():
+    client = _client(default="1/2", expensive="0.1/1")
+    assert client.get("/ping").status_code == 200
+    assert client.get("/ping").status_code == 200
+    r = client.get("/ping")
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "1"
+
+    # Expensive routes have their own, stricter bucket
+    assert client.post("/login").status_code == 200
+    r = client.post("/login")
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) == 10
+
+
+def test_only_submitting_the_login_form_is_expensive():
+    client = _client(default="10/10", expensive="0.1/1")
+    assert client.post("/login").status_code == 200
+    assert client.get("/login").status_code == 200
+    assert client.get("/login").status_code == 200
+    assert client.post("/login").status_code == 429
+
+
+def test_concurrency_cap_reject_refunds_the_token():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    limiter = RateLimitMiddleware(app, store=MemoryBucketStore(), default="0.001/1", max_concurrent=0, enabled=True)
+    client = TestClient(limiter)
+    assert client.get("/ping").status_code == 429
+    assert client.get("/ping").status_code == 429
+
+    limiter.max_concurrent = 1
+    assert client.get("/ping").status_code == 200
+
+
+def test_authenticated_users_get_their_own_bucket():
+    client = _client(default="1/1")
+    assert client.get("/ping").status_code == 200
+    assert client.get("/ping").status_code == 429
+
+    token = create_access_token({"sub": "someone@example.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/ping", headers=headers).status_code == 200
+    assert client.get("/ping", headers=headers).status_code == 429
+
+
+def test_off_unless_opted_in():
+    app = FastAPI()
+
+    @app.post("/login")
+    def login():
+        return {"ok": True}
+
+    # No enabled=True: the default follows RATE_LIMIT_ENABLED, which is unset here
+    client = TestClient(RateLimitMiddleware(app, store=MemoryBucketStore(), expensive="0.1/1"))
+    assert [client.post("/login").status_code for _ in range(3)] == [200] * 3
@@ -0,0 +1,42 @@
+import time
+
+from sqlalchemy import create_engine
+
+from app.db.routing import ReadRouter
+
+
+def test_no_replicas_always_uses_primary():
+    router = ReadRouter()
+    assert router.replica_session(1) is None
+
+
+def test_reads_go_to_replica_until_user_writes():
+    replica = create_engine("sqlite://")
+    router = ReadRouter([replica], stickiness=0.05)
+
+    session = router.replica_session(1)
+    assert session is not None and session.get_bind() is replica
+    session.close()
+
+    router.note_write(1)
+    assert router.replica_session(1) is None
+    # Other users are unaffected by user 1's write
+    other = router.replica_session(2)
+    assert other is not None
+    other.close()
+
+    time.sleep(0.06)
+    again = router.replica_session(1)
+    assert again is not None
+    again.close()
+
+
+def test_replicas_are_used_round_robin():
+    first, second = create_engine("sqlite://"), create_engine("sqlite://")
+    router = ReadRouter([first, second])
+    binds = []
+    for _ in range(4):
+        s = router.replica_session(None)
+        binds.append(s.get_bind())
+        s.close()
+    assert binds == [first, second, first, second]
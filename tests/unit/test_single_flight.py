@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.metrics import Registry
+from app.services.single_flight import SingleFlight, _requests
+
+
+def test_concurrent_sync_callers_share_one_computation():
+    flight = SingleFlight(enabled=True)
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return {"total": 42}
+
+    key = flight.key(1, "test-sync", limit=5)
+    before = _requests.value(endpoint="test-sync", role="coalesced")
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, key, compute)
+        started.wait(5)
+        followers = [pool.submit(flight.do, key, compute) for _ in range(3)]
+        while flight._calls[key].waiters < 3:
+            pass
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert runs == [1]
+    assert all(r is results[0] for r in results)
+    assert _requests.value(endpoint="test-sync", role="coalesced") - before == 3
+    assert flight.in_flight() == 0
+    # Finished flights are not cached
+    assert flight.do(key, lambda: "fresh") == "fresh"
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight(enabled=True)
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    key = flight.key(1, "test-error")
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, key, fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, key, fail)
+        while flight._calls[key].waiters < 1:
+            pass
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+
+
+def test_async_callers_share_one_task():
+    flight = SingleFlight(enabled=True)
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "report"
+
+    async def scenario():
+        key = flight.key(1, "test-async")
+        return await asyncio.gather(*(flight.do_async(key, compute) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["report"] * 5
+    assert runs == [1]
+
+
+def test_keys_normalize_params_and_follow_writes():
+    flight = SingleFlight(enabled=True)
+    assert flight.key(1, "list", since=None, a=1, b=2) == flight.key(1, "list", b=2, a=1)
+    before = flight.key(1, "report")
+    flight.note_write(1)
+    assert flight.key(1, "report") != before
+    assert flight.key(2, "report") == flight.key(2, "report")
+
+
+def test_metrics_render_prometheus_text():
+    registry = Registry()
+    hits = registry.counter("hits_total", "Hits")
+    hits.inc(endpoint="report", role="leader")
+    hits.inc(2, endpoint="report", role="coalesced")
+    registry.gauge("busy", "Busy", read=lambda: 3)
+    text = registry.render()
+    assert '# TYPE hits_total counter' in text
+    assert 'hits_total{endpoint="report",role="coalesced"} 2' in text
+    assert "busy 3" in text
@@ -0,0 +1,53 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.static_assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    AssetManifest,
+    FingerprintedStaticFiles,
+)
+
+CSS = b"body { color: #333; }\n" * 100
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    (tmp_path / "site.css").write_bytes(CSS)
+    return AssetManifest(str(tmp_path)).build(precompress_assets=True)
+
+
+def _client(manifest):
+    app = FastAPI()
+    app.mount("/static", FingerprintedStaticFiles(manifest=manifest), name="static")
+    return TestClient(app)
+
+
+def test_url_is_fingerprinted_and_stable(manifest, tmp_path):
+    url = manifest.url("site.css")
+    assert url.startswith("/static/site.") and url.endswith(".css") and url != "/static/site.css"
+    assert AssetManifest(str(tmp_path)).build().url("site.css") == url
+    assert manifest.url("missing.js") == "/static/missing.js"
+
+
+def test_fingerprinted_url_is_immutable(manifest):
+    client = _client(manifest)
+    r = client.get(manifest.url("site.css"), headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert r.content == CSS
+
+    plain = client.get("/static/site.css", headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "immutable" not in plain.headers.get("cache-control", "")
+
+
+def test_precompressed_sibling_is_chosen(manifest, tmp_path):
+    assert gzip.decompress((tmp_path / "site.css.gz").read_bytes()) == CSS
+    r = _client(manifest).get(manifest.url("site.css"), headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["content-type"].startswith("text/css")
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert r.content == CSS
@@ -0,0 +1,25 @@
+from jinja2 import Environment
+
+from app.templating import render_chunks
+
+PAGE = Environment().from_string(
+    "<html><head><title>t</title></head><body>"
+    "{% set rows = load() %}{% for r in rows %}<p>{{ r }}</p>{% endfor %}</body></html>"
+)
+
+
+def test_head_is_flushed_before_the_data_is_loaded():
+    loaded = []
+
+    def load():
+        loaded.append(True)
+        return range(100)
+
+    chunks = render_chunks(PAGE, {"load": load}, chunk_size=64)
+    head = next(chunks)
+    assert "</head>" in head and not loaded
+
+    rest = list(chunks)
+    assert loaded and len(rest) > 1
+    assert all(len(c) < 64 + 16 for c in rest)
+    assert head + "".join(rest) == PAGE.render(load=lambda: range(100))